@@ -1,9 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import os
+import time
 from dotenv import load_dotenv
 from routes.quiz import quiz_bp
 from routes.chatbot import chatbot_bp
+from services.chat_sessions import chat_sessions
+from services.admission import (
+    API_KEY_HEADER, USER_ID_HEADER, RateLimitedError, priority_for, request_cost, reset_priority, set_priority
+)
+from services.gemini_service import (
+    admission_control, answer_index, chatbot_cache, gemini_breaker, inflight_calls, model_router,
+    outbound_limiter, response_store
+)
+from services.quiz_analyzer import enrichment_queue, load_quiz_table
+from services.resilience import DEADLINE_HEADER, parse_timeout_header, reset_deadline, set_deadline
+from utils.context_compactor import compaction_stats
+from utils.metrics import REQUEST_LATENCY, register_stats, render_metrics
 
 # Load environment variables
 load_dotenv()
@@ -16,14 +29,86 @@ CORS(app)  # Enable CORS for all routes
 app.register_blueprint(quiz_bp, url_prefix='/api/quiz')
 app.register_blueprint(chatbot_bp, url_prefix='/api/chatbot')
 
+# Table mode serves from a file built at deploy time; refuse to start without it
+load_quiz_table()
+
+# Component stats exported as gauges on /metrics
+register_stats({
+    'outbound': outbound_limiter.stats,
+    'circuit': gemini_breaker.stats,
+    'models': model_router.stats,
+    'cache': chatbot_cache.stats,
+    'store': lambda: response_store.stats() if response_store is not None else None,
+    'coalescing': inflight_calls.stats,
+    'compaction': compaction_stats,
+    'sessions': chat_sessions.stats,
+    'answerIndex': lambda: answer_index.stats() if answer_index is not None else None,
+    'enrichmentQueue': enrichment_queue.stats,
+    'admission': admission_control.stats
+})
+
+# Model calls made for a request stop waiting once the caller has given up
+@app.before_request
+def start_deadline():
+    g.request_started = time.perf_counter()
+    g.deadline_token = set_deadline(parse_timeout_header(request.headers.get(DEADLINE_HEADER)))
+
+# Rate limits per client and user, with quiz/onboarding in a higher lane than chat
+@app.before_request
+def admit_request():
+    priority = priority_for(request.path)
+    if priority is None:
+        return
+    g.priority_token = set_priority(priority)
+    client_key = request.headers.get(API_KEY_HEADER) or request.remote_addr
+    cost = request_cost(request.path, request.get_json(silent=True)) if request.method == 'POST' else 1
+    admission_control.admit(priority, client_key, request.headers.get(USER_ID_HEADER), cost)
+
+@app.after_request
+def record_latency(response):
+    # Streaming responses are timed to their headers, not to the last event
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def end_deadline(exc):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        reset_deadline(token)
+    token = g.pop('priority_token', None)
+    if token is not None:
+        reset_priority(token)
+
 # Health check route
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'service': 'ghoomo-ai-service'
+        'service': 'ghoomo-ai-service',
+        'outbound': outbound_limiter.stats(),
+        'circuit': gemini_breaker.stats()
     }), 200
 
+# Prometheus scrape endpoint
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+# Rejected by admission control: tell the caller when to come back
+@app.errorhandler(RateLimitedError)
+def handle_rate_limited(e):
+    response = jsonify({
+        'success': False,
+        'error': str(e),
+        'message': 'Too many requests, please retry later'
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -0,0 +1,288 @@
+"""
+ASGI entry point for the AI service
+
+The Gemini-bound endpoints (/api/quiz/analyze, /api/chatbot/ask and
+/api/chatbot/ask/batch) are served natively on the event loop, so one process can hold hundreds of
+concurrent model calls; outbound concurrency is still capped by the
+shared outbound limiter. Every other route is served by the Flask app.
+Both honour the caller's X-Request-Timeout-Ms deadline.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5001 --workers 2
+"""
+import json
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+from routes.chatbot import batch_queries_error
+from services.chat_sessions import InvalidContextError, SessionNotFoundError, chat_sessions
+from services.admission import (
+    API_KEY_HEADER, BATCH_ROUTES, USER_ID_HEADER, RateLimitedError, priority_for, request_cost, reset_priority,
+    set_priority
+)
+from services.gemini_service import ERROR_SUGGESTIONS, GeminiService, admission_control
+from services.job_queue import CallbackNotAllowedError
+from services.outbound_limiter import OverloadedError
+from services.quiz_analyzer import QuizAnalyzer
+from services.resilience import DEADLINE_HEADER, deadline_scope, parse_timeout_header, run_blocking
+from utils.metrics import REQUEST_LATENCY
+
+flask_application = WsgiToAsgi(app)
+
+def header(headers, name):
+    """Value of a request header from a dict of ASGI headers, or None"""
+    value = headers.get(name.lower().encode("ascii"))
+    return value.decode("latin-1") if value else None
+
+
+async def read_json(receive):
+    """Read the whole request body and parse it as JSON (None if invalid)"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+def replay_body(payload):
+    """receive callable delivering an already read JSON body again"""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    return receive
+
+
+async def send_json(send, status, payload, headers=None):
+    """Send a JSON response, with the same CORS header the Flask app adds"""
+    body = json.dumps(payload).encode("utf-8")
+    response_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("ascii")),
+        (b"access-control-allow-origin", b"*")
+    ]
+    for name, value in (headers or {}).items():
+        response_headers.append((name.lower().encode("ascii"), str(value).encode("ascii")))
+
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def analyze_quiz(scope, receive, send):
+    """Analyze quiz responses to determine travel persona"""
+    try:
+        data = await read_json(receive)
+
+        if not data or not isinstance(data, dict):
+            return await send_json(send, 400, {
+                'success': False,
+                'error': 'Invalid request data'
+            })
+
+        responses = data.get('responses')
+        if not responses:
+            return await send_json(send, 400, {
+                'success': False,
+                'error': 'No responses provided'
+            })
+
+        # Deferred mode: answer with the local persona now, enrich in the background
+        if data.get('async'):
+            analysis = await run_blocking(QuizAnalyzer.analyze_deferred, responses, data.get('callbackUrl'))
+            return await send_json(send, 202 if analysis['jobId'] else 200, analysis)
+
+        analysis = await QuizAnalyzer.analyze_responses_async(responses)
+        return await send_json(send, 200, analysis)
+
+    except CallbackNotAllowedError as e:
+        return await send_json(send, 400, {
+            'success': False,
+            'error': str(e)
+        })
+
+    except Exception as e:
+        return await send_json(send, 500, {
+            'success': False,
+            'error': str(e)
+        })
+
+
+async def ask_chatbot(scope, receive, send):
+    """Get a response from the chatbot"""
+    try:
+        data = await read_json(receive)
+
+        if not data or not isinstance(data, dict):
+            return await send_json(send, 400, {
+                'success': False,
+                'error': 'Invalid request data'
+            })
+
+        query = data.get('query')
+        if not query:
+            return await send_json(send, 400, {
+                'success': False,
+                'error': 'No query provided'
+            })
+
+        # Get optional context, inline or from the caller's session
+        context = await run_blocking(chat_sessions.resolve_context, data)
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        use_cache = not (data.get('noCache') or 'no-cache' in headers.get('cache-control', ''))
+
+        response = await GeminiService.get_chatbot_response_async(query, context, use_cache=use_cache)
+        return await send_json(send, 200, response)
+
+    except SessionNotFoundError as e:
+        return await send_json(send, 404, {
+            'success': False,
+            'error': str(e)
+        })
+
+    except InvalidContextError as e:
+        return await send_json(send, 400, {
+            'success': False,
+            'error': str(e)
+        })
+
+    except RateLimitedError as e:
+        return await send_json(send, 429, {
+            'success': False,
+            'error': str(e),
+            'response': "You're asking questions faster than I can answer. Please try again in a moment.",
+            'suggestions': []
+        }, headers={'Retry-After': e.retry_after})
+
+    except OverloadedError as e:
+        return await send_json(send, 503, {
+            'success': False,
+            'error': str(e),
+            'response': "I'm getting a lot of questions right now. Please try again in a moment.",
+            'suggestions': []
+        }, headers={'Retry-After': e.retry_after})
+
+    except Exception as e:
+        return await send_json(send, 500, {
+            'success': False,
+            'error': str(e),
+            'response': "I'm having trouble processing your request right now. Please try again later.",
+            'suggestions': list(ERROR_SUGGESTIONS)
+        })
+
+
+async def ask_chatbot_batch(scope, receive, send):
+    """Answer several questions sharing one context in a single request"""
+    try:
+        data = await read_json(receive)
+
+        if not data or not isinstance(data, dict):
+            return await send_json(send, 400, {
+                'success': False,
+                'error': 'Invalid request data'
+            })
+
+        queries = data.get('queries')
+        error = batch_queries_error(queries)
+        if error:
+            return await send_json(send, 400, {
+                'success': False,
+                'error': error
+            })
+
+        context = await run_blocking(chat_sessions.resolve_context, data)
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        use_cache = not (data.get('noCache') or 'no-cache' in headers.get('cache-control', ''))
+
+        results = await GeminiService.get_chatbot_responses_async(queries, context, use_cache=use_cache)
+        return await send_json(send, 200, {
+            'success': True,
+            'count': len(results),
+            'results': results
+        })
+
+    except SessionNotFoundError as e:
+        return await send_json(send, 404, {
+            'success': False,
+            'error': str(e)
+        })
+
+    except InvalidContextError as e:
+        return await send_json(send, 400, {
+            'success': False,
+            'error': str(e)
+        })
+
+    except Exception as e:
+        return await send_json(send, 500, {
+            'success': False,
+            'error': str(e)
+        })
+
+
+ASYNC_ROUTES = {
+    ("POST", "/api/quiz/analyze"): analyze_quiz,
+    ("POST", "/api/chatbot/ask"): ask_chatbot,
+    ("POST", "/api/chatbot/ask/batch"): ask_chatbot_batch
+}
+
+
+async def application(scope, receive, send):
+    """Dispatch Gemini-bound routes to native handlers and the rest to Flask"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http":
+        route = scope["path"].rstrip("/") or "/"
+        handler = ASYNC_ROUTES.get((scope["method"], route))
+        if handler is not None:
+            headers = dict(scope["headers"])
+            timeout = parse_timeout_header(header(headers, DEADLINE_HEADER))
+            priority = priority_for(route)
+            client_key = header(headers, API_KEY_HEADER) or (scope.get("client") or ("",))[0]
+            started = time.perf_counter()
+            status = {"code": 500}
+
+            async def send_and_record(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                await send(message)
+
+            cost = 1
+            if route in BATCH_ROUTES:
+                # The cost depends on the body: read it here and hand it on to the handler
+                payload = await read_json(receive)
+                cost = request_cost(route, payload)
+                receive = replay_body(payload)
+
+            priority_token = set_priority(priority)
+            try:
+                admission_control.admit(priority, client_key, header(headers, USER_ID_HEADER), cost)
+                with deadline_scope(timeout):
+                    return await handler(scope, receive, send_and_record)
+            except RateLimitedError as e:
+                return await send_json(send_and_record, 429, {
+                    'success': False,
+                    'error': str(e),
+                    'message': 'Too many requests, please retry later'
+                }, headers={'Retry-After': e.retry_after})
+            finally:
+                reset_priority(priority_token)
+                REQUEST_LATENCY.labels(route, scope["method"], status["code"]).observe(time.perf_counter() - started)
+
+    return await flask_application(scope, receive, send)
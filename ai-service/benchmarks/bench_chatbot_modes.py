@@ -0,0 +1,61 @@
+"""
+Benchmark the chatbot call modes against a stub model
+
+Compares wall-clock latency of GeminiService.get_chatbot_response in
+sequential, concurrent, fused and local-suggestions mode without touching
+the Gemini API.
+
+Usage:
+    python benchmarks/bench_chatbot_modes.py [--latency 0.8] [--requests 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import gemini_service
+from services.gemini_service import GeminiService
+from services.model_router import ModelRouter
+from services.stub_model import StubModel
+from services.suggestion_engine import suggestion_engine
+
+
+def run(mode, requests):
+    stub = gemini_service.model_router.model("stub")
+    calls_before = stub.calls
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        result = GeminiService.get_chatbot_response("Best time to visit Goa?", {"location": "Goa"},
+                                                    mode=mode, use_cache=False)
+        timings.append(time.perf_counter() - start)
+        assert result["success"], result
+    return timings, (stub.calls - calls_before) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.8, help='stub model latency per call, in seconds')
+    parser.add_argument('--requests', type=int, default=20, help='requests per mode')
+    args = parser.parse_args()
+
+    stub = StubModel(latency=f"fixed:{args.latency}")
+    gemini_service.model_router = ModelRouter(lambda name: stub)
+
+    print(f"stub latency {args.latency * 1000:.0f} ms, {args.requests} requests per mode")
+    print(f"{'mode':<12}{'p50 ms':>10}{'max ms':>10}{'calls':>8}")
+    for mode in ("sequential", "concurrent", "fused", "local"):
+        timings, calls = run(mode, args.requests)
+        print(f"{mode:<12}{statistics.median(timings) * 1000:>10.1f}{max(timings) * 1000:>10.1f}{calls:>8.1f}")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        suggestion_engine.suggest("Best time to visit Goa?", {"location": "Goa"})
+    print(f"local suggestion engine: {(time.perf_counter() - start) * 1000:.1f} us per call")
+
+
+if __name__ == '__main__':
+    main()
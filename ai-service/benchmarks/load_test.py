@@ -0,0 +1,254 @@
+"""
+Load test the AI service request path against the stub model backend
+
+Drives the Flask app (in process, or a running server with --url) with a
+fixed number of concurrent clients per scenario and reports throughput
+and p50/p95/p99 latency. In process, the model is the offline stub
+(GEMINI_BACKEND=stub) with a fixed latency, so the numbers measure the
+service's own overhead and concurrency behaviour, not the Gemini API.
+
+Each scenario is run --runs times and the median of each figure is
+reported, so one scheduling hiccup doesn't decide the result.
+
+Baselines live in benchmarks/baselines.json. --check fails (exit 1) when
+a scenario's p95 or throughput is worse than its baseline by more than
+--tolerance; p95 may also exceed it by --slack-ms, since a relative
+margin on a sub-millisecond p95 is smaller than the timer noise.
+--update-baseline records the current run.
+
+Usage:
+    python benchmarks/load_test.py [--scenarios quiz,chat] [--concurrency 16]
+        [--requests 400] [--latency 0.05] [--runs 3] [--check | --update-baseline]
+    python benchmarks/load_test.py --url http://localhost:5001 --scenarios chat
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+ACTIVITIES = ["food_tasting", "outdoor_adventure", "museums_history", "shopping_markets", "beaches_relaxation"]
+PACES = ["fast_paced", "balanced", "slow_relaxed"]
+DESTINATIONS = ["Goa", "Jaipur", "Kerala", "Manali", "Varanasi", "Rishikesh", "Udaipur", "Leh"]
+
+
+def quiz_request(i):
+    """Distinct response sets, so no analysis is served from a store"""
+    return 'POST', '/api/quiz/analyze', {
+        'responses': {
+            'preferred_activities': [ACTIVITIES[i % 5], ACTIVITIES[(i // 5) % 5]],
+            'travel_pace': PACES[(i // 25) % 3],
+            'budget_preference': ['budget', 'mid_range', 'luxury'][(i // 75) % 3]
+        }
+    }
+
+
+def chat_request(i):
+    """Uncached questions: every request goes through the model path"""
+    return 'POST', '/api/chatbot/ask', {
+        'query': f"What should I do on day {i % 7 + 1} in {DESTINATIONS[i % len(DESTINATIONS)]}? (#{i})",
+        'context': {'location': DESTINATIONS[i % len(DESTINATIONS)]},
+        'noCache': True
+    }
+
+
+def chat_cached_request(i):
+    """A handful of repeated questions: measures the cache hit path"""
+    destination = DESTINATIONS[i % 4]
+    return 'POST', '/api/chatbot/ask', {
+        'query': f"Best time to visit {destination}?",
+        'context': {'location': destination}
+    }
+
+
+def questions_request(i):
+    return 'GET', '/api/quiz/questions', None
+
+
+SCENARIOS = {
+    'questions': questions_request,
+    'quiz': quiz_request,
+    'chat': chat_request,
+    'chat_cached': chat_cached_request
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def make_client_factory(url):
+    """Per-thread request function: Flask test client in process, or HTTP to url"""
+    if url:
+        import requests
+
+        def http_client():
+            session = requests.Session()
+
+            def send(method, path, payload):
+                return session.request(method, url.rstrip('/') + path, json=payload, timeout=30).status_code
+            return send
+        return http_client
+
+    from app import app
+
+    def test_client():
+        client = app.test_client()
+
+        def send(method, path, payload):
+            return client.open(path, method=method, json=payload).status_code
+        return send
+    return test_client
+
+
+def run_scenario(name, client_factory, concurrency, total):
+    """
+    Run one scenario
+
+    Returns:
+        dict: Request count, errors, throughput and latency percentiles (ms)
+    """
+    build_request = SCENARIOS[name]
+    local = threading.local()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i):
+        if not hasattr(local, 'send'):
+            local.send = client_factory()
+        method, path, payload = build_request(i)
+        start = time.perf_counter()
+        try:
+            status = local.send(method, path, payload)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status is None or status >= 400:
+                errors[0] += 1
+
+    # Warm up imports, lazy tables and connections outside the measurement
+    for i in range(min(concurrency, total)):
+        one(total + i)
+    latencies.clear()
+    errors[0] = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors[0],
+        'throughput': round(total / wall, 1),
+        'p50': round(percentile(latencies, 50) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2)
+    }
+
+
+def median_result(runs):
+    """Per-figure median of several runs of a scenario (errors: the worst run)"""
+    result = {'requests': runs[0]['requests'], 'errors': max(run['errors'] for run in runs)}
+    for key in ('throughput', 'p50', 'p95', 'p99'):
+        result[key] = round(statistics.median(run[key] for run in runs), 2)
+    return result
+
+
+def compare(name, result, baseline, tolerance, slack_ms):
+    """Regression messages for one scenario (empty if within tolerance)"""
+    problems = []
+    if result['p95'] > baseline['p95'] * (1 + tolerance) + slack_ms:
+        problems.append(f"{name}: p95 {result['p95']} ms vs baseline {baseline['p95']} ms")
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        problems.append(f"{name}: throughput {result['throughput']} req/s vs baseline {baseline['throughput']} req/s")
+    if result['errors'] > baseline.get('errors', 0):
+        problems.append(f"{name}: {result['errors']} errors vs baseline {baseline.get('errors', 0)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenario names')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=400, help='requests per scenario')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub model latency per call, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='stub model error rate')
+    parser.add_argument('--runs', type=int, default=3, help='runs per scenario; the median is reported')
+    parser.add_argument('--url', help='load test a running server instead of the in-process app')
+    parser.add_argument('--check', action='store_true', help='compare against baselines.json')
+    parser.add_argument('--update-baseline', action='store_true', help='write this run to baselines.json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed regression, as a fraction')
+    parser.add_argument('--slack-ms', type=float, default=2.0, help='absolute p95 slack on top of the tolerance')
+    args = parser.parse_args()
+
+    config = {
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'latency': args.latency,
+        'errorRate': args.error_rate,
+        'runs': args.runs
+    }
+    if not args.url:
+        # Must be set before the service modules are imported
+        os.environ['GEMINI_BACKEND'] = 'stub'
+        os.environ['GEMINI_STUB_LATENCY'] = f"fixed:{args.latency}"
+        os.environ['GEMINI_STUB_ERROR_RATE'] = str(args.error_rate)
+        os.environ.setdefault('GEMINI_STORE_PATH', '')
+        os.environ.setdefault('CHATBOT_ANSWER_INDEX_PATH', '')
+
+    client_factory = make_client_factory(args.url)
+    results = {}
+
+    print(f"{args.url or 'in-process, stub model'}: concurrency {args.concurrency}, "
+          f"{args.requests} requests per scenario, model latency {args.latency * 1000:.0f} ms")
+    print(f"{'scenario':<14}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name in args.scenarios.split(','):
+        result = median_result([
+            run_scenario(name, client_factory, args.concurrency, args.requests)
+            for _ in range(max(1, args.runs))
+        ])
+        results[name] = result
+        print(f"{name:<14}{result['throughput']:>9.1f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+              f"{result['p99']:>10.2f}{result['errors']:>8}")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'config': config, 'scenarios': results}, f, indent=2)
+            f.write('\n')
+        print(f"Baselines written to {BASELINE_PATH}")
+
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+        if baselines['config'] != config:
+            print(f"Warning: baselines were recorded with {baselines['config']}")
+
+        problems = []
+        for name, result in results.items():
+            if name in baselines['scenarios']:
+                problems += compare(name, result, baselines['scenarios'][name], args.tolerance, args.slack_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("No regressions against baselines")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,83 @@
-from flask import Blueprint, request, jsonify
-from services.gemini_service import GeminiService
+import hmac
+import json
+import os
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.gemini_service import (
+    DEFAULT_SUGGESTIONS, ERROR_SUGGESTIONS, GeminiService, answer_index, chatbot_cache, inflight_calls, model_router, response_store
+)
+from services.chat_sessions import InvalidContextError, SessionNotFoundError, chat_sessions
+from services.admission import RateLimitedError
+from services.outbound_limiter import OverloadedError
+from utils.context_compactor import compaction_stats
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
+# Largest number of questions accepted by the batch endpoint
+MAX_BATCH_QUERIES = int(os.environ.get('CHATBOT_BATCH_MAX_SIZE', 20))
+
+# Key required to approve answers into the answer index (approval is off when unset)
+ADMIN_API_KEY = os.environ.get('CHATBOT_ADMIN_API_KEY')
+ADMIN_KEY_HEADER = 'X-Admin-Key'
+
+def overloaded_response(error):
+    """503 telling the caller to back off when no model call slot is free"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'response': "I'm getting a lot of questions right now. Please try again in a moment.",
+        'suggestions': []
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def rate_limited_response(error):
+    """429 telling the caller to back off when its rate or the Gemini budget is used up"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'response': "You're asking questions faster than I can answer. Please try again in a moment.",
+        'suggestions': []
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def batch_queries_error(queries):
+    """Validation error for the questions of a batch request, or None if they are usable"""
+    if not isinstance(queries, list) or not queries:
+        return 'No queries provided'
+    if len(queries) > MAX_BATCH_QUERIES:
+        return f'Batch too large (max {MAX_BATCH_QUERIES} queries)'
+    invalid = next((i for i, query in enumerate(queries) if not isinstance(query, str) or not query.strip()), None)
+    if invalid is not None:
+        return f'Invalid query at index {invalid}'
+    return None
+
+def is_admin_request():
+    """Whether the request carries the admin key"""
+    supplied = request.headers.get(ADMIN_KEY_HEADER, '')
+    return bool(ADMIN_API_KEY) and hmac.compare_digest(supplied.encode(), ADMIN_API_KEY.encode())
+
+def session_not_found_response(error):
+    """404 for an unknown or expired chat session"""
+    return jsonify({
+        'success': False,
+        'error': str(error)
+    }), 404
+
+def invalid_context_response(error):
+    """400 for a context or session patch that is not an object"""
+    return jsonify({
+        'success': False,
+        'error': str(error)
+    }), 400
+
 @chatbot_bp.route('/ask', methods=['POST'])
 def ask_chatbot():
     """Get a response from the chatbot"""
     try:
         data = request.json
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({
                 'success': False,
                 'error': 'Invalid request data'
@@ -22,22 +90,225 @@ def ask_chatbot():
                 'error': 'No query provided'
             }), 400
         
-        # Get optional context
-        context = data.get('context', {})
+        # Get optional context, inline or from the caller's session
+        context = chat_sessions.resolve_context(data)
+        
+        # Allow callers to skip the response cache for this request
+        use_cache = not (data.get('noCache') or 'no-cache' in request.headers.get('Cache-Control', ''))
         
         # Get response from Gemini
-        response = GeminiService.get_chatbot_response(query, context)
+        response = GeminiService.get_chatbot_response(query, context, use_cache=use_cache)
         
         return jsonify(response), 200
     
+    except SessionNotFoundError as e:
+        return session_not_found_response(e)
+    
+    except InvalidContextError as e:
+        return invalid_context_response(e)
+    
+    except RateLimitedError as e:
+        return rate_limited_response(e)
+    
+    except OverloadedError as e:
+        return overloaded_response(e)
+    
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e),
             'response': "I'm having trouble processing your request right now. Please try again later.",
-            'suggestions': [
-                "What are popular destinations in India?",
-                "How can I plan a budget trip?",
-                "What should I pack for my trip?"
-            ]
-        }), 500
\ No newline at end of file
+            'suggestions': list(ERROR_SUGGESTIONS)
+        }), 500
+
+@chatbot_bp.route('/ask/batch', methods=['POST'])
+def ask_chatbot_batch():
+    """Answer several questions sharing one context in a single request"""
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid request data'
+            }), 400
+        
+        queries = data.get('queries')
+        error = batch_queries_error(queries)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        context = chat_sessions.resolve_context(data)
+        use_cache = not (data.get('noCache') or 'no-cache' in request.headers.get('Cache-Control', ''))
+        
+        results = GeminiService.get_chatbot_responses(queries, context, use_cache=use_cache)
+        
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'results': results
+        }), 200
+    
+    except SessionNotFoundError as e:
+        return session_not_found_response(e)
+    
+    except InvalidContextError as e:
+        return invalid_context_response(e)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@chatbot_bp.route('/stream', methods=['POST'])
+def stream_chatbot():
+    """Stream a chatbot answer as Server-Sent Events"""
+    data = request.json
+    
+    if not data or not isinstance(data, dict):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid request data'
+        }), 400
+    
+    query = data.get('query')
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': 'No query provided'
+        }), 400
+    
+    try:
+        context = chat_sessions.resolve_context(data)
+    except SessionNotFoundError as e:
+        return session_not_found_response(e)
+    except InvalidContextError as e:
+        return invalid_context_response(e)
+    
+    use_cache = not (data.get('noCache') or 'no-cache' in request.headers.get('Cache-Control', ''))
+    
+    try:
+        events = GeminiService.stream_chatbot_response(query, context, use_cache=use_cache)
+    except RateLimitedError as e:
+        # Refused before any header is sent, so the caller still gets a 429 with Retry-After
+        return rate_limited_response(e)
+    
+    def generate():
+        try:
+            for event, payload in events:
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            # Runs when the client disconnects too, cancelling generation upstream
+            events.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@chatbot_bp.route('/sessions', methods=['POST'])
+def create_session():
+    """Start a chat session holding the itinerary and preferences"""
+    data = request.json
+    
+    if not isinstance(data, dict) or not isinstance(data.get('context', {}), dict):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid request data'
+        }), 400
+    
+    session_id = chat_sessions.create(data.get('context', {}))
+    return jsonify({
+        'success': True,
+        'sessionId': session_id
+    }), 201
+
+@chatbot_bp.route('/sessions/<session_id>', methods=['PATCH'])
+def patch_session(session_id):
+    """Apply a JSON merge patch to a session's context"""
+    data = request.json
+    
+    if not isinstance(data, dict) or not isinstance(data.get('patch'), dict):
+        return jsonify({
+            'success': False,
+            'error': 'No patch provided'
+        }), 400
+    
+    try:
+        chat_sessions.patch(session_id, data['patch'])
+    except SessionNotFoundError as e:
+        return session_not_found_response(e)
+    
+    return jsonify({
+        'success': True,
+        'sessionId': session_id
+    }), 200
+
+@chatbot_bp.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """End a chat session"""
+    if not chat_sessions.delete(session_id):
+        return session_not_found_response(SessionNotFoundError("Session not found or expired"))
+    
+    return jsonify({
+        'success': True
+    }), 200
+
+@chatbot_bp.route('/answers', methods=['POST'])
+def approve_answer():
+    """Add an approved question/answer pair to the local answer index"""
+    if answer_index is None:
+        return jsonify({
+            'success': False,
+            'error': 'Answer index is not enabled'
+        }), 404
+    
+    # Approved answers are served to every user, so only admins may add them
+    if not is_admin_request():
+        return jsonify({
+            'success': False,
+            'error': 'Admin key required'
+        }), 403
+    
+    data = request.json
+    
+    if not isinstance(data, dict) or not data.get('question') or not data.get('answer'):
+        return jsonify({
+            'success': False,
+            'error': 'Question and answer are required'
+        }), 400
+    
+    suggestions = data.get('suggestions') or list(DEFAULT_SUGGESTIONS)
+    if not isinstance(suggestions, list):
+        return jsonify({
+            'success': False,
+            'error': 'Suggestions must be a list'
+        }), 400
+    
+    answer_id = answer_index.add(data['question'], data['answer'], suggestions, data.get('location', ''))
+    return jsonify({
+        'success': True,
+        'id': answer_id
+    }), 201
+
+@chatbot_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get chatbot response cache and request coalescing counters"""
+    return jsonify({
+        'success': True,
+        'cache': chatbot_cache.stats(),
+        'store': response_store.stats() if response_store is not None else None,
+        'coalescing': inflight_calls.stats(),
+        'compactedContexts': compaction_stats(),
+        'sessions': chat_sessions.stats(),
+        'answerIndex': answer_index.stats() if answer_index is not None else None,
+        'models': model_router.stats()
+    }), 200
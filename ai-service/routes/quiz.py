@@ -1,22 +1,24 @@
 from flask import Blueprint, request, jsonify
-from services.quiz_analyzer import QuizAnalyzer
+import os
+from services.job_queue import CallbackNotAllowedError
+from services.quiz_analyzer import QuizAnalyzer, enrichment_queue
+from utils.static_payload import StaticPayload
 
 quiz_bp = Blueprint('quiz', __name__)
 
+# Largest number of response sets accepted by the batch endpoint
+MAX_BATCH_SIZE = int(os.environ.get('QUIZ_BATCH_MAX_SIZE', 10000))
+
+# The public questions don't change while the process runs: serialize them once
+questions_payload = StaticPayload({
+    'success': True,
+    'questions': QuizAnalyzer.get_quiz_questions()
+})
+
 @quiz_bp.route('/questions', methods=['GET'])
 def get_quiz_questions():
     """Get the travel persona quiz questions"""
-    try:
-        questions = QuizAnalyzer.get_quiz_questions()
-        return jsonify({
-            'success': True,
-            'questions': questions
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return questions_payload.response(request)
 
 @quiz_bp.route('/analyze', methods=['POST'])
 def analyze_quiz():
@@ -37,11 +39,90 @@ def analyze_quiz():
                 'error': 'No responses provided'
             }), 400
         
+        # Deferred mode: answer with the local persona now, enrich in the background
+        if data.get('async'):
+            analysis = QuizAnalyzer.analyze_deferred(responses, data.get('callbackUrl'))
+            return jsonify(analysis), 202 if analysis['jobId'] else 200
+        
         analysis = QuizAnalyzer.analyze_responses(responses)
         return jsonify(analysis), 200
     
+    except CallbackNotAllowedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@quiz_bp.route('/analyze/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Poll a deferred quiz enrichment job"""
+    job = enrichment_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    }), 200
+
+@quiz_bp.route('/analyze/jobs', methods=['GET'])
+def get_analysis_queue_stats():
+    """Get enrichment queue counters"""
+    return jsonify({
+        'success': True,
+        'queue': enrichment_queue.stats()
+    }), 200
+
+@quiz_bp.route('/analyze/batch', methods=['POST'])
+def analyze_quiz_batch():
+    """Score many quiz response sets at once (rule-based, no Gemini calls)"""
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid request data'
+            }), 400
+        
+        responses_list = data.get('responses')
+        if not isinstance(responses_list, list) or not responses_list:
+            return jsonify({
+                'success': False,
+                'error': 'No responses provided'
+            }), 400
+        
+        if len(responses_list) > MAX_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large (max {MAX_BATCH_SIZE} response sets)'
+            }), 400
+        
+        invalid = next((i for i, responses in enumerate(responses_list) if not isinstance(responses, dict)), None)
+        if invalid is not None:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid response set at index {invalid}'
+            }), 400
+        
+        analyses = QuizAnalyzer.analyze_batch(responses_list)
+        return jsonify({
+            'success': True,
+            'count': len(analyses),
+            'analyses': analyses
+        }), 200
+    
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
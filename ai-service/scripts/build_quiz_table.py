@@ -0,0 +1,48 @@
+"""
+Build the precomputed quiz answer-space table
+
+Enumerates every canonical combination of answers to QuizAnalyzer.QUESTIONS
+and writes the lookup table used by QUIZ_ANALYSIS_MODE=table. With --enrich,
+each distinct profile is sent to Gemini once and the enriched analysis is
+stored in place of the rule-based one.
+
+Run it at deploy time, and again whenever the quiz weights change. A
+worker in table mode that finds no table, or one built for other weights,
+builds one itself at startup, but without the Gemini enrichment.
+
+Usage:
+    python scripts/build_quiz_table.py [--output PATH] [--enrich]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.gemini_service import GeminiService
+from services.quiz_analyzer import QuizAnalyzer
+from services.quiz_table import QuizTable
+
+
+def enrich_with_gemini(responses):
+    result = GeminiService.analyze_quiz_responses(responses)
+    return result["analysis"] if result["success"] else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='table file (defaults to QUIZ_TABLE_PATH)')
+    parser.add_argument('--enrich', action='store_true', help='enrich each profile with one Gemini call')
+    args = parser.parse_args()
+
+    table = QuizTable(QuizAnalyzer, path=args.output)
+    start = time.perf_counter()
+    summary = table.build(enrich=enrich_with_gemini if args.enrich else None)
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Mine intent co-occurrence statistics for the local suggestion engine
+
+Reads a JSONL chat log with one turn per line, e.g.
+    {"sessionId": "abc", "query": "Best street food in Delhi?", "timestamp": 1700000000}
+and counts, within each session, which intent the next question has
+after a question of a given intent. Turns are ordered by timestamp (or
+file order). The counts are written as JSON for SuggestionEngine.
+
+Usage:
+    python scripts/mine_suggestion_stats.py chat_log.jsonl [--output PATH] [--min-count 2]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.suggestion_engine import DEFAULT_STATS_PATH, detect_intents
+
+
+def read_sessions(path):
+    """Group logged questions by session, in time order"""
+    sessions = defaultdict(list)
+    with open(path) as f:
+        for position, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                turn = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(turn, dict) or not turn.get("query"):
+                continue
+            session_id = turn.get("sessionId") or turn.get("userId") or "anonymous"
+            sessions[session_id].append((turn.get("timestamp", position), turn["query"]))
+
+    for turns in sessions.values():
+        turns.sort(key=lambda turn: turn[0])
+        yield [query for _, query in turns]
+
+
+def mine(path, min_count=1):
+    """Count intent transitions between consecutive questions of a session"""
+    transitions = defaultdict(lambda: defaultdict(int))
+    turns_seen = 0
+
+    for queries in read_sessions(path):
+        turns_seen += len(queries)
+        intents = [(detect_intents(q) or ["general"])[0] for q in queries]
+        for current, following in zip(intents, intents[1:]):
+            if following != "general":
+                transitions[current][following] += 1
+
+    return {
+        "turns": turns_seen,
+        "transitions": {
+            current: {following: n for following, n in counts.items() if n >= min_count}
+            for current, counts in transitions.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help='JSONL chat log')
+    parser.add_argument('--output', default=DEFAULT_STATS_PATH, help='statistics file to write')
+    parser.add_argument('--min-count', type=int, default=1, help='drop transitions seen fewer times')
+    args = parser.parse_args()
+
+    stats = mine(args.log, args.min_count)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+
+    print(f"{stats['turns']} turns, {sum(len(v) for v in stats['transitions'].values())} transitions -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
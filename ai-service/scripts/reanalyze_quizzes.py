@@ -0,0 +1,197 @@
+"""
+Re-analyze stored quiz submissions offline
+
+Streams a JSONL file of submissions, one per line, e.g.
+    {"id": "user-42", "responses": {"preferred_activities": ["food_tasting"], ...}}
+through the rule-based scoring of QuizAnalyzer (the current QUESTIONS
+weights) in chunks spread over a process pool, and writes one result per
+line, in input order:
+    {"id": "user-42", "line": 1, "analysis": {...}, "source": "local"}
+
+Only a bounded number of chunks is in flight at a time, so memory stays
+flat whatever the input size. With --enrich, each result is also sent to
+Gemini, paced by a token bucket (--rate calls per second); failed calls
+keep the local analysis. With --checkpoint, progress is recorded after
+every chunk and a rerun resumes after the last chunk written.
+
+Usage:
+    python scripts/reanalyze_quizzes.py submissions.jsonl results.jsonl
+        [--workers 4] [--chunk-size 2000] [--checkpoint results.ckpt]
+        [--enrich --rate 5 --enrich-workers 8]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.quiz_analyzer import QuizAnalyzer
+from utils.rate_limit import TokenBucket
+
+
+def read_chunks(path, chunk_size, skip_lines=0):
+    """Yield (first line number, raw lines) chunks, after skipping already processed lines"""
+    with open(path) as f:
+        for _ in islice(f, skip_lines):
+            pass
+        line_number = skip_lines + 1
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            yield line_number, lines
+            line_number += len(lines)
+
+
+def analyze_chunk(first_line, lines):
+    """
+    Worker: parse and score one chunk
+
+    Args:
+        first_line (int): Line number of the first line
+        lines (list): Raw JSONL lines
+
+    Returns:
+        tuple: (one result dict per non-blank line, responses of the
+        scored results in the same order)
+    """
+    results = []
+    valid = []
+    for line_number, line in enumerate(lines, start=first_line):
+        line = line.strip()
+        if not line:
+            continue
+        result = {"id": None, "line": line_number}
+        results.append(result)
+        try:
+            submission = json.loads(line)
+        except ValueError:
+            result["error"] = "Invalid JSON"
+            continue
+        responses = submission.get("responses") if isinstance(submission, dict) else None
+        if not isinstance(responses, dict) or not responses:
+            result["error"] = "No responses"
+            continue
+        result["id"] = submission.get("id", submission.get("userId"))
+        valid.append((result, responses))
+
+    analyses = QuizAnalyzer.analyze_batch([responses for _, responses in valid])
+    for (result, _), analysis in zip(valid, analyses):
+        result["analysis"] = analysis
+        result["source"] = "local"
+    return results, [responses for _, responses in valid]
+
+
+def make_enricher(rate):
+    """Gemini enrichment of one result, paced by a shared token bucket"""
+    from services.gemini_service import GeminiService
+
+    bucket = TokenBucket(rate)
+
+    def enrich(item):
+        result, responses = item
+        bucket.acquire()
+        gemini_analysis = GeminiService.analyze_quiz_responses(responses)
+        if gemini_analysis["success"]:
+            result["analysis"] = gemini_analysis["analysis"]
+            result["source"] = "gemini"
+    return enrich
+
+
+def load_checkpoint(path, input_path):
+    """Lines done and output size recorded by a previous run (zeros if none)"""
+    if not path or not os.path.exists(path):
+        return 0, 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('input')}")
+    return checkpoint["linesDone"], checkpoint["outputBytes"]
+
+
+def save_checkpoint(path, input_path, lines_done, output_bytes):
+    """Record progress atomically, so a crash leaves the previous checkpoint intact"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({
+            "input": os.path.abspath(input_path),
+            "linesDone": lines_done,
+            "outputBytes": output_bytes
+        }, f)
+    os.replace(temp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='JSONL file of quiz submissions')
+    parser.add_argument('output', help='JSONL file of results')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='scoring processes')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='submissions per chunk')
+    parser.add_argument('--checkpoint', help='progress file for resuming an interrupted run')
+    parser.add_argument('--enrich', action='store_true', help='also enrich every result with Gemini')
+    parser.add_argument('--rate', type=float, default=5.0, help='Gemini calls per second when enriching')
+    parser.add_argument('--enrich-workers', type=int, default=8, help='concurrent Gemini calls when enriching')
+    args = parser.parse_args()
+
+    lines_done, output_bytes = load_checkpoint(args.checkpoint, args.input)
+    if lines_done:
+        print(f"Resuming after line {lines_done}")
+
+    output = open(args.output, 'a+b' if lines_done else 'wb')
+    # Drop anything written after the last checkpoint
+    output.truncate(output_bytes)
+    output.seek(output_bytes)
+
+    enrich = make_enricher(args.rate) if args.enrich else None
+    enrich_pool = ThreadPoolExecutor(max_workers=args.enrich_workers) if enrich else None
+    counts = {"results": 0, "errors": 0, "gemini": 0}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, output:
+        pending = deque()
+        chunks = read_chunks(args.input, args.chunk_size, skip_lines=lines_done)
+        max_pending = args.workers * 2
+
+        def submit_next():
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append((chunk[0] + len(chunk[1]) - 1, pool.submit(analyze_chunk, *chunk)))
+
+        for _ in range(max_pending):
+            submit_next()
+
+        while pending:
+            last_line, future = pending.popleft()
+            submit_next()
+            results, responses = future.result()
+
+            if enrich_pool is not None:
+                scored = [result for result in results if "analysis" in result]
+                list(enrich_pool.map(enrich, zip(scored, responses)))
+
+            for result in results:
+                output.write((json.dumps(result) + "\n").encode("utf-8"))
+                counts["results"] += 1
+                counts["errors"] += "error" in result
+                counts["gemini"] += result.get("source") == "gemini"
+            output.flush()
+
+            if args.checkpoint:
+                os.fsync(output.fileno())
+                save_checkpoint(args.checkpoint, args.input, last_line, output.tell())
+
+    if enrich_pool is not None:
+        enrich_pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"{counts['results']} results ({counts['errors']} errors, {counts['gemini']} enriched) "
+          f"in {elapsed:.1f}s -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
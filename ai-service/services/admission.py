@@ -0,0 +1,287 @@
+"""
+Admission control for incoming requests and outbound Gemini calls
+
+Every API request is classed into a priority lane by its route:
+    interactive - quiz questions/analysis and session setup (onboarding)
+    chat        - chatbot questions
+    background  - bulk work (batch analysis, enrichment jobs, scripts)
+
+and admitted against token buckets per user (X-User-Id, sent by the Node
+server for the signed-in user) and, when ADMISSION_KEY_RATE is set, per
+client (the X-API-Key header, or the caller's address). A batch request
+costs one token per question. Each model call then draws from a
+process-wide Gemini budget of calls per second and tokens per minute.
+GEMINI_QPS / GEMINI_TPM are the account quota: each process gets an equal
+share of it, split over GEMINI_BUDGET_WORKERS processes (by default
+gunicorn's WEB_CONCURRENCY, else 1). Set it to the total number of
+serving processes, across hosts, so together they stay within the quota.
+
+Lanes share the buckets, but a lower lane may not take the last part of
+a bucket: chat stops at ADMISSION_CHAT_RESERVE of the capacity and
+background work at ADMISSION_BACKGROUND_RESERVE, so a burst of chat
+cannot starve quiz analysis. Rejections raise RateLimitedError with the
+seconds until the request would fit, for a fast 429 with Retry-After.
+
+A rate of 0 disables the corresponding bucket. The per-client limit is
+off by default: all traffic from the Node tier arrives from one address
+without an API key, so it would act as a global cap. The Gemini budget is
+off unless GEMINI_QPS / GEMINI_TPM are set, as the quota is account specific.
+"""
+import contextvars
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from services.outbound_limiter import OverloadedError
+from utils.context_compactor import count_tokens
+from utils.rate_limit import TokenBucket
+
+API_KEY_HEADER = "X-API-Key"
+USER_ID_HEADER = "X-User-Id"
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_CHAT = "chat"
+PRIORITY_BACKGROUND = "background"
+
+# Fraction of each bucket a lane must leave for the lanes above it
+LANE_RESERVES = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_CHAT: float(os.environ.get("ADMISSION_CHAT_RESERVE", 0.2)),
+    PRIORITY_BACKGROUND: float(os.environ.get("ADMISSION_BACKGROUND_RESERVE", 0.5))
+}
+
+# Route prefix -> lane, first match wins; unmatched routes (health, metrics) are not limited
+ROUTE_PRIORITIES = [
+    ("/api/quiz/analyze/batch", PRIORITY_BACKGROUND),
+    ("/api/quiz/", PRIORITY_INTERACTIVE),
+    ("/api/chatbot/sessions", PRIORITY_INTERACTIVE),
+    ("/api/chatbot/", PRIORITY_CHAT)
+]
+
+# Routes whose body holds several questions, each charged as one request
+BATCH_ROUTES = {"/api/chatbot/ask/batch": "queries"}
+
+# Expected output tokens charged per model call on top of the prompt
+OUTPUT_TOKEN_ESTIMATE = int(os.environ.get("ADMISSION_OUTPUT_TOKENS", 400))
+
+# Lane of the current request; work outside a request (jobs, scripts) is background
+_priority = contextvars.ContextVar("request_priority", default=PRIORITY_BACKGROUND)
+
+
+class RateLimitedError(OverloadedError):
+    """Raised when a request or model call is over its rate budget"""
+
+
+def priority_for(path):
+    """
+    Lane of a request path
+
+    Args:
+        path (str): Request path
+
+    Returns:
+        str or None: Lane, or None if the route is not admission controlled
+    """
+    for prefix, priority in ROUTE_PRIORITIES:
+        if path.startswith(prefix):
+            return priority
+    return None
+
+
+def request_cost(path, payload):
+    """
+    Admission tokens a request costs: one per question of a batch, otherwise one
+
+    Args:
+        path (str): Request path
+        payload: Parsed JSON body (None if absent or invalid)
+
+    Returns:
+        int: Tokens to charge
+    """
+    field = BATCH_ROUTES.get(path.rstrip("/"))
+    if field and isinstance(payload, dict) and isinstance(payload.get(field), list):
+        return max(1, len(payload[field]))
+    return 1
+
+
+def set_priority(priority):
+    """Set the lane for the current context; returns a token for reset_priority"""
+    return _priority.set(priority)
+
+
+def reset_priority(token):
+    _priority.reset(token)
+
+
+def current_priority():
+    """Lane of the current request"""
+    return _priority.get()
+
+
+class ClientBuckets:
+    """One token bucket per client key, the least recently seen dropped beyond max_clients"""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        """
+        Args:
+            rate (float): Requests per second per client (0 disables the limit)
+            burst (float): Bucket capacity
+            max_clients (int): Buckets kept at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        """Bucket of a client, or None if limiting is off or there is no key"""
+        if not self.rate or not key:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class AdmissionController:
+    """Per-client request limits and the global Gemini budget, with priority lanes"""
+
+    def __init__(self, key_rate=0, key_burst=100, user_rate=1, user_burst=5,
+                 gemini_qps=0, gemini_tpm=0, reserves=None):
+        """
+        Args:
+            key_rate (float): Requests per second per API key / client address
+                (0 = unlimited)
+            key_burst (float): Burst per API key / client address
+            user_rate (float): Requests per second per user
+            user_burst (float): Burst per user
+            gemini_qps (float): Model calls per second for the process (0 = unlimited)
+            gemini_tpm (float): Model tokens per minute for the process (0 = unlimited)
+            reserves (dict): Lane -> fraction of each bucket it must leave free
+        """
+        self.clients = ClientBuckets(key_rate, key_burst)
+        self.users = ClientBuckets(user_rate, user_burst)
+        self.gemini_calls = TokenBucket(gemini_qps, max(1.0, gemini_qps)) if gemini_qps else None
+        self.gemini_tokens = TokenBucket(gemini_tpm / 60, gemini_tpm) if gemini_tpm else None
+        self.reserves = reserves or LANE_RESERVES
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = {}
+
+    def _take(self, charges, priority, what):
+        """
+        Spend from several buckets at once, or from none of them
+
+        Args:
+            charges (list): (bucket or None, tokens) pairs
+            priority (str): Lane of the caller
+            what (str): Name of the limit, for the error
+
+        Raises:
+            RateLimitedError: If any bucket can't cover its charge
+        """
+        reserve = self.reserves.get(priority, 0.0)
+        charges = [(bucket, tokens) for bucket, tokens in charges if bucket is not None]
+        with self._lock:
+            wait = max([bucket.wait_time(tokens, reserve * bucket.capacity) for bucket, tokens in charges] or [0])
+            if wait:
+                key = f"{what}:{priority}"
+                self.rejected[key] = self.rejected.get(key, 0) + 1
+                raise RateLimitedError(
+                    f"Rate limit exceeded ({what}, {priority} lane)",
+                    retry_after=max(1, math.ceil(wait))
+                )
+            # Nothing else spends from these buckets while the lock is held
+            for bucket, tokens in charges:
+                bucket.try_acquire(tokens)
+
+    def admit(self, priority, client_key, user_id=None, cost=1):
+        """
+        Admit an incoming request
+
+        Args:
+            priority (str): Lane of the request
+            client_key (str): API key or client address
+            user_id (str): End user the request is made for, if known
+            cost (int): Tokens the request costs (see request_cost)
+
+        Raises:
+            RateLimitedError: If the client or user is over its limit
+        """
+        self._take([
+            (self.clients.bucket(client_key), cost),
+            (self.users.bucket(user_id), cost)
+        ], priority, "client")
+        with self._lock:
+            self.admitted += 1
+
+    def charge_model_call(self, prompt):
+        """
+        Charge one model call to the Gemini budget, in the current request's lane
+
+        Args:
+            prompt (str): Prompt about to be sent
+
+        Raises:
+            RateLimitedError: If the call doesn't fit in the budget
+        """
+        if self.gemini_calls is None and self.gemini_tokens is None:
+            return
+        self._take([
+            (self.gemini_calls, 1),
+            (self.gemini_tokens, count_tokens(prompt) + OUTPUT_TOKEN_ESTIMATE)
+        ], current_priority(), "gemini")
+
+    def stats(self):
+        """
+        Get admission counters
+
+        Returns:
+            dict: Admitted requests, rejections per limit and lane, tracked
+            clients and remaining Gemini budget
+        """
+        with self._lock:
+            rejected = dict(self.rejected)
+        return {
+            "admitted": self.admitted,
+            "rejected": rejected,
+            "clients": len(self.clients),
+            "users": len(self.users),
+            "geminiCallsAvailable": round(self.gemini_calls.available(), 2) if self.gemini_calls else None,
+            "geminiTokensAvailable": round(self.gemini_tokens.available()) if self.gemini_tokens else None
+        }
+
+
+def budget_workers():
+    """Processes sharing the Gemini quota: GEMINI_BUDGET_WORKERS, else WEB_CONCURRENCY, else 1"""
+    raw = os.environ.get("GEMINI_BUDGET_WORKERS") or os.environ.get("WEB_CONCURRENCY") or 1
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        print(f"Ignoring invalid Gemini budget worker count: {raw}")
+        return 1
+
+
+def create_admission_controller():
+    """Build the controller from ADMISSION_* and this process's share of GEMINI_QPS / GEMINI_TPM"""
+    workers = budget_workers()
+    return AdmissionController(
+        key_rate=float(os.environ.get("ADMISSION_KEY_RATE", 0)),
+        key_burst=float(os.environ.get("ADMISSION_KEY_BURST", 100)),
+        user_rate=float(os.environ.get("ADMISSION_USER_RATE", 1)),
+        user_burst=float(os.environ.get("ADMISSION_USER_BURST", 5)),
+        gemini_qps=float(os.environ.get("GEMINI_QPS", 0)) / workers,
+        gemini_tpm=float(os.environ.get("GEMINI_TPM", 0)) / workers
+    )
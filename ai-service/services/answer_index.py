@@ -0,0 +1,323 @@
+"""
+Local retrieval tier for frequently asked travel questions
+
+Approved question/answer pairs are kept in a SQLite FTS5 index. Before a
+chatbot question goes to Gemini, the index is searched with BM25; the best
+candidates are re-scored with a normalized token-overlap similarity and,
+above CHATBOT_ANSWER_INDEX_THRESHOLD, the stored answer is served directly.
+
+The static fallback suggestions offered by the chatbot are seeded with
+curated answers; they only match the suggestion itself (or a rewording
+with the same words), so a question about a specific destination still
+goes to the model.
+
+The index file is opened memory-mapped by every worker (shared through the
+OS page cache rather than a copy per process) and grows incrementally as
+answers are approved.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from utils.cache import normalize_query
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at", "for",
+    "and", "or", "i", "me", "my", "we", "our", "you", "your", "it", "its", "do", "does", "did",
+    "can", "could", "should", "would", "will", "what", "which", "how", "when", "where", "who",
+    "any", "some", "there", "this", "that", "with", "about", "from", "please", "tell", "us"
+}
+
+# Candidates fetched by BM25 before re-scoring
+CANDIDATES = 5
+
+# Bytes of the index file mapped into memory
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Curated answers to the static fallback suggestions (DEFAULT_SUGGESTIONS and
+# ERROR_SUGGESTIONS of the Gemini service), seeded into every index
+STATIC_ANSWERS = [
+    {
+        "question": "What are the best times to visit?",
+        "answer": (
+            "It depends on where you're headed! Most of India is at its best from October to March, "
+            "when the weather is pleasant for sightseeing. The hills (Himachal, Uttarakhand, Sikkim) "
+            "are lovely from March to June, and Ladakh from June to September. Monsoon (June to "
+            "September) brings lush landscapes and lower prices, but heavy rain on the coasts. "
+            "Tell me your destination and I'll be more specific."
+        ),
+        "suggestions": ["What should I pack for my trip?", "How's the local transportation?",
+                        "Any safety tips I should know?"]
+    },
+    {
+        "question": "How's the local transportation?",
+        "answer": (
+            "Getting around is part of the adventure! Trains connect most cities and are best "
+            "booked early on IRCTC. Within cities, use the metro where there is one, app cabs "
+            "(Uber, Ola) or autos; agree on the fare or insist on the meter for autos. For short "
+            "hops between nearby towns, state buses are cheap and frequent. Tell me your "
+            "destination for local tips."
+        ),
+        "suggestions": ["How can I plan a budget trip?", "Any safety tips I should know?",
+                        "What are the best times to visit?"]
+    },
+    {
+        "question": "Any safety tips I should know?",
+        "answer": (
+            "Most travellers have a smooth trip with a few basics: keep copies of your ID, use "
+            "app cabs or prepaid taxi counters at night, keep valuables out of sight in crowded "
+            "places, and drink bottled or filtered water. Be wary of unofficial guides and "
+            "'closed today' scams near big sights, and share your itinerary with someone back "
+            "home. Emergency number: 112."
+        ),
+        "suggestions": ["How's the local transportation?", "What should I pack for my trip?",
+                        "What are popular destinations in India?"]
+    },
+    {
+        "question": "What are popular destinations in India?",
+        "answer": (
+            "Bahut saare options! Rajasthan (Jaipur, Udaipur, Jaisalmer) for forts and palaces, "
+            "Goa for beaches, Kerala for backwaters and Ayurveda, Varanasi for spirituality, "
+            "Himachal and Ladakh for mountains, and Delhi-Agra for the Taj Mahal and Mughal "
+            "history. Tell me what kind of trip you like and I'll narrow it down."
+        ),
+        "suggestions": ["What are the best times to visit?", "How can I plan a budget trip?",
+                        "What should I pack for my trip?"]
+    },
+    {
+        "question": "How can I plan a budget trip?",
+        "answer": (
+            "India is great on a budget! Travel by sleeper or 3AC trains and book ahead, stay in "
+            "hostels, homestays or dharamshalas, eat at busy local dhabas and street stalls, and "
+            "visit in the shoulder season for lower prices. Many temples, ghats and markets are "
+            "free to explore. A comfortable budget trip is possible on about 1,500-2,500 rupees a day."
+        ),
+        "suggestions": ["How's the local transportation?", "What are popular destinations in India?",
+                        "Any safety tips I should know?"]
+    },
+    {
+        "question": "What should I pack for my trip?",
+        "answer": (
+            "Pack light, breathable cotton clothes, plus a layer for AC trains and evenings. Carry "
+            "modest clothing (covering shoulders and knees) for temples, comfortable walking shoes "
+            "and slip-ons, sunscreen, a hat, a refillable bottle, basic medicines and a power bank. "
+            "Add a light jacket for the hills or winter in the north, and an umbrella in monsoon."
+        ),
+        "suggestions": ["What are the best times to visit?", "Any safety tips I should know?",
+                        "How can I plan a budget trip?"]
+    }
+]
+
+
+def content_tokens(text):
+    """Meaningful tokens of a question (normalized, stopwords removed)"""
+    return [t for t in normalize_query(text).split() if t not in STOPWORDS]
+
+
+def similarity(query_tokens, candidate_tokens):
+    """Cosine similarity between two token sets, 0 to 1"""
+    query_set = set(query_tokens)
+    candidate_set = set(candidate_tokens)
+    if not query_set or not candidate_set:
+        return 0.0
+    return len(query_set & candidate_set) / math.sqrt(len(query_set) * len(candidate_set))
+
+
+class AnswerIndex:
+    """BM25 index of approved chatbot answers"""
+
+    def __init__(self, path, threshold=0.8):
+        """
+        Args:
+            path (str): SQLite index file
+            threshold (float): Minimum similarity to answer from the index
+        """
+        self.path = path
+        self.threshold = threshold
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection()
+
+    def _connection(self):
+        """Get this thread's connection (reopened after a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY,"
+            " question TEXT NOT NULL,"
+            " normalized TEXT NOT NULL,"
+            " location TEXT NOT NULL DEFAULT '',"
+            " answer TEXT NOT NULL,"
+            " suggestions TEXT NOT NULL,"
+            " approved_at REAL NOT NULL,"
+            " min_similarity REAL NOT NULL DEFAULT 0,"
+            " UNIQUE (normalized, location))"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+        if "min_similarity" not in columns:
+            # Index files created before per-entry thresholds existed
+            conn.execute("ALTER TABLE answers ADD COLUMN min_similarity REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts USING fts5(terms)")
+        conn.commit()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def add(self, question, answer, suggestions, location="", min_similarity=0.0):
+        """
+        Add or replace an approved answer
+
+        Args:
+            question (str): Question as asked
+            answer (str): Approved answer
+            suggestions (list): Follow-up suggestions served with the answer
+            location (str): Destination the answer is about ('' if general)
+            min_similarity (float): Similarity this entry needs to be served,
+                on top of the index threshold
+
+        Returns:
+            int: Row id of the entry
+        """
+        normalized = normalize_query(question)
+        location = normalize_query(location or "")
+        conn = self._connection()
+        with conn:
+            existing = conn.execute(
+                "SELECT id FROM answers WHERE normalized = ? AND location = ?", (normalized, location)
+            ).fetchone()
+            if existing:
+                conn.execute("DELETE FROM answers WHERE id = ?", existing)
+                conn.execute("DELETE FROM answers_fts WHERE rowid = ?", existing)
+
+            cursor = conn.execute(
+                "INSERT INTO answers (question, normalized, location, answer, suggestions, approved_at, min_similarity)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (question, normalized, location, answer, json.dumps(suggestions), time.time(), min_similarity)
+            )
+            conn.execute(
+                "INSERT INTO answers_fts (rowid, terms) VALUES (?, ?)",
+                (cursor.lastrowid, " ".join(content_tokens(question)))
+            )
+        return cursor.lastrowid
+
+    def seed_static_answers(self):
+        """
+        Add the curated answers to the static fallback suggestions
+
+        Entries already in the index (e.g. re-approved with a better answer)
+        are left alone.
+
+        Returns:
+            int: Entries added
+        """
+        added = 0
+        conn = self._connection()
+        for entry in STATIC_ANSWERS:
+            exists = conn.execute(
+                "SELECT 1 FROM answers WHERE normalized = ? AND location = ''",
+                (normalize_query(entry["question"]),)
+            ).fetchone()
+            if not exists:
+                # Exact match only: a question naming a destination should reach the model
+                self.add(entry["question"], entry["answer"], entry["suggestions"], min_similarity=1.0)
+                added += 1
+        return added
+
+    def search(self, question, location=""):
+        """
+        Find an approved answer close enough to a question
+
+        Args:
+            question (str): User's question
+            location (str): Current destination; answers for other
+                destinations are never returned
+
+        Returns:
+            dict or None: {"question", "answer", "suggestions", "similarity"}
+        """
+        tokens = content_tokens(question)
+        if not tokens:
+            self.misses += 1
+            return None
+
+        match = " OR ".join(f'"{t}"' for t in set(tokens))
+        try:
+            rows = self._connection().execute(
+                "SELECT a.normalized, a.question, a.answer, a.suggestions, a.min_similarity"
+                " FROM answers_fts f JOIN answers a ON a.id = f.rowid"
+                " WHERE answers_fts MATCH ? AND a.location IN ('', ?)"
+                " ORDER BY bm25(answers_fts) LIMIT ?",
+                (match, normalize_query(location or ""), CANDIDATES)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching answer index: {str(e)}")
+            self.misses += 1
+            return None
+
+        best = None
+        for normalized, stored_question, answer, suggestions, min_similarity in rows:
+            score = similarity(tokens, content_tokens(normalized))
+            # Rounded so exact-match entries aren't missed on float error
+            if round(score, 6) >= max(self.threshold, min_similarity) and (best is None or score > best["similarity"]):
+                best = {
+                    "question": stored_question,
+                    "answer": answer,
+                    "suggestions": json.loads(suggestions),
+                    "similarity": round(score, 4)
+                }
+
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def stats(self):
+        """
+        Get index counters (hits and misses are per process)
+
+        Returns:
+            dict: Entry count, threshold and counters
+        """
+        try:
+            size = self._connection().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        return {
+            "path": self.path,
+            "size": size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def create_answer_index():
+    """
+    Build the index from the environment
+
+    Returns:
+        AnswerIndex or None when CHATBOT_ANSWER_INDEX_PATH is not set
+    """
+    path = os.environ.get("CHATBOT_ANSWER_INDEX_PATH")
+    if not path:
+        return None
+    index = AnswerIndex(path, threshold=float(os.environ.get("CHATBOT_ANSWER_INDEX_THRESHOLD", 0.8)))
+    try:
+        index.seed_static_answers()
+    except sqlite3.Error as e:
+        # Another worker is seeding the same file at the same time
+        print(f"Error seeding answer index: {str(e)}")
+    return index
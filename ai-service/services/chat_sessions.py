@@ -0,0 +1,205 @@
+"""
+Server-side chat sessions
+
+A session holds the chatbot context (location, itinerary, userPreferences)
+so clients create it once and then send only {sessionId, query}, plus an
+optional JSON merge patch (RFC 7386) when something changes. Sessions
+expire after CHAT_SESSION_IDLE_TTL seconds without use.
+
+Sessions live in a bounded in-process store by default, or on a
+Redis-compatible server when CHAT_SESSION_URL is set, so every worker
+sees the same sessions.
+"""
+import json
+import os
+import uuid
+
+from utils.cache import TTLCache
+
+
+class SessionNotFoundError(Exception):
+    """Raised for unknown or expired session ids"""
+
+
+class InvalidContextError(ValueError):
+    """Raised for a context or session patch that is not a JSON object"""
+
+
+def merge_patch(target, patch):
+    """
+    Apply a JSON merge patch (RFC 7386)
+
+    Args:
+        target: Current value
+        patch: Patch; null members delete keys, objects merge recursively,
+            anything else replaces
+
+    Returns:
+        Patched value (target is not modified)
+    """
+    if not isinstance(patch, dict):
+        return patch
+
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+class InMemorySessionBackend:
+    """Sessions in a bounded LRU; reads refresh the idle expiry"""
+
+    def __init__(self, maxsize=10000, idle_ttl=3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=idle_ttl)
+
+    def save(self, session_id, context):
+        self._cache.set(session_id, context)
+
+    def load(self, session_id):
+        context = self._cache.get(session_id)
+        if context is not None:
+            self._cache.set(session_id, context)
+        return context
+
+    def delete(self, session_id):
+        return self._cache.pop(session_id)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RedisSessionBackend:
+    """Sessions as JSON strings on a Redis-compatible server; reads refresh the TTL"""
+
+    KEY_PREFIX = "ghoomo:session:"
+
+    def __init__(self, url, idle_ttl=3600):
+        # Optional dependency: only needed when a shared backend is configured
+        import redis
+
+        self.idle_ttl = int(idle_ttl)
+        self._client = redis.Redis.from_url(url)
+
+    def save(self, session_id, context):
+        self._client.set(self.KEY_PREFIX + session_id, json.dumps(context), ex=self.idle_ttl)
+
+    def load(self, session_id):
+        key = self.KEY_PREFIX + session_id
+        pipeline = self._client.pipeline()
+        pipeline.get(key)
+        pipeline.expire(key, self.idle_ttl)
+        raw, _ = pipeline.execute()
+        return json.loads(raw) if raw else None
+
+    def delete(self, session_id):
+        return bool(self._client.delete(self.KEY_PREFIX + session_id))
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+class SessionStore:
+    """Create, read, patch and delete chat sessions"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, context):
+        """
+        Start a session
+
+        Args:
+            context (dict): Chatbot context
+
+        Returns:
+            str: Session id
+        """
+        session_id = uuid.uuid4().hex
+        self.backend.save(session_id, context or {})
+        return session_id
+
+    def get(self, session_id):
+        """
+        Get a session's context
+
+        Raises:
+            SessionNotFoundError: If the session is unknown or expired
+        """
+        context = self.backend.load(session_id) if session_id else None
+        if context is None:
+            raise SessionNotFoundError("Session not found or expired")
+        return context
+
+    def patch(self, session_id, patch):
+        """
+        Apply a merge patch to a session's context
+
+        Args:
+            session_id (str): Session id
+            patch (dict): JSON merge patch
+
+        Returns:
+            dict: Updated context
+
+        Raises:
+            SessionNotFoundError: If the session is unknown or expired
+            InvalidContextError: If the patch is not an object (it would
+                replace the whole context)
+        """
+        if not isinstance(patch, dict):
+            raise InvalidContextError("Session patch must be a JSON object")
+        context = merge_patch(self.get(session_id), patch)
+        self.backend.save(session_id, context)
+        return context
+
+    def delete(self, session_id):
+        """End a session; returns False if it did not exist"""
+        return self.backend.delete(session_id)
+
+    def resolve_context(self, data):
+        """
+        Chatbot context for a request body
+
+        Uses the session's context (patched first if the body carries a
+        patch) when sessionId is present, otherwise the inline context.
+
+        Args:
+            data (dict): Request body
+
+        Returns:
+            dict: Chatbot context
+
+        Raises:
+            SessionNotFoundError: If sessionId is unknown or expired
+            InvalidContextError: If the context or patch is not an object
+        """
+        session_id = data.get('sessionId')
+        if not session_id:
+            context = data.get('context') or {}
+            if not isinstance(context, dict):
+                raise InvalidContextError("Context must be a JSON object")
+            return context
+
+        if data.get('patch') is not None:
+            return self.patch(session_id, data['patch'])
+        return self.get(session_id)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def create_session_store():
+    """Build the session store from CHAT_SESSION_URL, CHAT_SESSION_MAX and CHAT_SESSION_IDLE_TTL"""
+    idle_ttl = float(os.environ.get("CHAT_SESSION_IDLE_TTL", 3600))
+    url = os.environ.get("CHAT_SESSION_URL")
+    if url:
+        backend = RedisSessionBackend(url, idle_ttl=idle_ttl)
+    else:
+        backend = InMemorySessionBackend(maxsize=int(os.environ.get("CHAT_SESSION_MAX", 10000)), idle_ttl=idle_ttl)
+    return SessionStore(backend)
+
+
+chat_sessions = create_session_store()
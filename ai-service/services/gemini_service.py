@@ -1,32 +1,420 @@
-import google.generativeai as genai
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import json
+from utils.cache import TTLCache, normalize_query, hash_payload
+from utils.response_store import create_response_store
+from utils.single_flight import SingleFlight
+from utils.context_compactor import compact_context, detect_focus
+from services.outbound_limiter import OverloadedError, SlotLease, create_outbound_limiter
+from services.admission import RateLimitedError, create_admission_controller
+from services.answer_index import create_answer_index
+from services.suggestion_engine import suggestion_engine
+from services.model_router import ModelRouter, load_routes
+from services.stub_model import create_stub_factory
+from services.resilience import (
+    DeadlineExceededError, bind_context, create_circuit_breaker, deadline_passed, run_blocking, time_remaining
+)
+from utils.json_extract import extract_json
+from utils.metrics import (
+    FALLBACKS, GEMINI_ERRORS, JSON_PARSE_RESULTS, PROMPT_CHARS, RESPONSE_CHARS, STAGE_LATENCY,
+    WASTED_MODEL_CALLS, stage, timed_stage
+)
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+# Model backend: the Gemini API, or an offline stub for load tests (see services/stub_model.py)
+GEMINI_BACKEND = os.environ.get("GEMINI_BACKEND", "gemini").lower()
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def gemini_model_factory(name):
+    """
+    Create a Gemini model, importing and configuring the client on first use
+
+    google.generativeai is slow to import and its gRPC channel should not be
+    created before gunicorn forks (--preload), so neither happens at import.
+
+    Args:
+        name (str): Model name
+
+    Returns:
+        genai.GenerativeModel: Model object
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                
+                # Configure Gemini API
+                genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+                _genai = genai
+    return _genai.GenerativeModel(name)
+
+
+def client_timeout_supported():
+    """
+    Whether model calls take a per-call timeout (request_options)
+
+    The stub always does; google-generativeai only from the release that
+    added request_options to generate_content.
+    """
+    if GEMINI_BACKEND == "stub":
+        return True
+    try:
+        import inspect
+        from google.generativeai import GenerativeModel
+        return "request_options" in inspect.signature(GenerativeModel.generate_content).parameters
+    except Exception:
+        return False
+
+
+model_factory = create_stub_factory() if GEMINI_BACKEND == "stub" else gemini_model_factory
+
+# Global cap on concurrent model calls in this process, with a bounded wait queue
+outbound_limiter = create_outbound_limiter()
+
+# Picks a model per call type and prompt size, and fails over when one is slow or erroring.
+# Every call it runs holds a limiter slot until it returns (abandoned ones included), so it
+# needs no more threads than there are slots. Client timeout support is checked on first use.
+model_router = ModelRouter(
+    model_factory,
+    routes=load_routes(),
+    max_workers=outbound_limiter.max_concurrent,
+    client_timeout=client_timeout_supported
+)
+
+# How the chatbot answer and its follow-up suggestions are produced:
+#   sequential - two model calls, one after the other (original behaviour)
+#   concurrent - the same two calls, issued in parallel
+#   fused      - a single call returning answer and suggestions as JSON
+#   local      - a single call for the answer, suggestions from the local engine
+CHATBOT_CALL_MODE = os.environ.get("CHATBOT_CALL_MODE", "concurrent").lower()
+
+# Minify and prune the itinerary/preferences to a token budget before prompting
+CHATBOT_CONTEXT_COMPACTION = os.environ.get("CHATBOT_CONTEXT_COMPACTION", "true").lower() in ("1", "true", "yes")
+
+
+# Cache of successful chatbot answers, keyed on normalized question + context
+chatbot_cache = TTLCache(
+    maxsize=int(os.environ.get("CHATBOT_CACHE_SIZE", 2048)),
+    ttl=float(os.environ.get("CHATBOT_CACHE_TTL", 6 * 3600))
+)
+
+# Shared pool for the side calls issued alongside a request's own (e.g. the
+# follow-up suggestions); every call needs a limiter slot, so more threads
+# than slots would only queue
+_executor = ThreadPoolExecutor(
+    max_workers=outbound_limiter.max_concurrent,
+    thread_name_prefix="gemini"
+)
+
+# Per-client request limits and the Gemini QPS/TPM budget, with priority lanes
+admission_control = create_admission_controller()
+
+# Fails model calls fast while Gemini is erroring, so callers fall back locally
+gemini_breaker = create_circuit_breaker("gemini")
+
+# Identical prompts in flight at the same time share one upstream call. The shared
+# call runs on its own pool, outside any request's context: it gets the
+# GEMINI_CALL_TIMEOUT cap rather than one caller's deadline, and each caller
+# stops waiting at its own. Sized so that waiting happens in the limiter's queue.
+inflight_calls = SingleFlight(
+    timeout_error=DeadlineExceededError,
+    executor=ThreadPoolExecutor(
+        max_workers=outbound_limiter.max_concurrent + outbound_limiter.max_queue,
+        thread_name_prefix="gemini-shared"
+    )
+)
+
+# Optional on-disk store shared by all workers (enabled by GEMINI_STORE_PATH)
+response_store = create_response_store()
+
+# Optional index of approved answers checked before the model (CHATBOT_ANSWER_INDEX_PATH)
+answer_index = create_answer_index()
+
+DEFAULT_SUGGESTIONS = [
+    "What are the best times to visit?",
+    "How's the local transportation?",
+    "Any safety tips I should know?"
+]
+
+ERROR_SUGGESTIONS = [
+    "What are popular destinations in India?",
+    "How can I plan a budget trip?",
+    "What should I pack for my trip?"
+]
+
+
+# Shapes of the structured replies, in the schema subset Gemini accepts for
+# constrained decoding; the same schema is spelled out in the prompt
+QUIZ_ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "primaryPersona": {"type": "STRING"},
+        "secondaryPersona": {"type": "STRING"},
+        "interests": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "budgetSensitivity": {"type": "STRING", "enum": ["high", "medium", "low"]},
+        "preferredActivities": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "travelPace": {"type": "STRING", "enum": ["fast", "moderate", "slow"]}
+    },
+    "required": ["primaryPersona", "interests", "budgetSensitivity", "preferredActivities", "travelPace"]
+}
+
+FOLLOW_UP_SCHEMA = {
+    "type": "ARRAY",
+    "items": {"type": "STRING"}
+}
+
+FUSED_REPLY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "response": {"type": "STRING"},
+        "suggestions": {"type": "ARRAY", "items": {"type": "STRING"}}
+    },
+    "required": ["response", "suggestions"]
+}
+
+# Ask the API for schema-constrained JSON where the installed client supports it
+GEMINI_STRUCTURED_OUTPUT = os.environ.get("GEMINI_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+_structured_output_supported = None
+
+
+def structured_output_supported():
+    """
+    Whether model calls can carry a response schema
+
+    Needs the Gemini backend and a google-generativeai release whose
+    GenerationConfig has response_schema; older clients reject the field.
+    """
+    global _structured_output_supported
+    if _structured_output_supported is None:
+        supported = False
+        if GEMINI_STRUCTURED_OUTPUT and GEMINI_BACKEND == "gemini":
+            try:
+                import dataclasses
+                from google.generativeai.types import GenerationConfig
+                supported = "response_schema" in {field.name for field in dataclasses.fields(GenerationConfig)}
+            except Exception:
+                supported = False
+        _structured_output_supported = supported
+    return _structured_output_supported
+
+
+def _schema_instruction(schema):
+    """Prompt text asking for a reply that matches a schema"""
+    return (
+        "Reply with only JSON (no markdown, no text around it) matching this schema: "
+        + json.dumps(schema, separators=(",", ":"))
+    )
+
+
+def _parse_model_json(text, call_type, schema):
+    """
+    Extract the JSON value of a structured model reply, recording the outcome
+
+    Args:
+        text (str): Raw model output (a finished reply: a value cut off
+            before its end is not accepted)
+        call_type (str): Kind of call, for the metrics
+        schema (dict): Response schema the value must match
+
+    Returns:
+        Parsed JSON value
+
+    Raises:
+        ValueError: If no value matching the schema could be extracted
+    """
+    with stage("json_extract", call_type):
+        try:
+            value, repaired = extract_json(text, schema)
+        except ValueError:
+            JSON_PARSE_RESULTS.labels(call_type, "failed").inc()
+            raise
+    JSON_PARSE_RESULTS.labels(call_type, "repaired" if repaired else "ok").inc()
+    return value
+
+
+def _hedge_gate(prompt):
+    """
+    Take a limiter slot and Gemini budget for a hedged duplicate call
+
+    A hedge never queues: if no slot is free or the budget is spent, it is
+    skipped and the original call is left to finish.
+
+    Returns:
+        callable or None: Releases the slot, or None to skip the hedge
+    """
+    if not outbound_limiter.try_acquire():
+        return None
+    try:
+        admission_control.charge_model_call(prompt)
+    except RateLimitedError:
+        outbound_limiter.release()
+        return None
+    return outbound_limiter.release
 
-# Get the model
-model = genai.GenerativeModel('gemini-pro')
 
 class GeminiService:
     @staticmethod
-    def analyze_quiz_responses(responses):
+    def _generate(prompt, call_type="chat", schema=None):
         """
-        Analyze quiz responses to determine travel persona
+        Send a single prompt to the model and return its text
+
+        Args:
+            prompt (str): Prompt for the model
+            call_type (str): Kind of call, used to pick the model (chat, follow_up, quiz)
+            schema (dict): Response schema of a structured reply, if any
+
+        Returns:
+            str: Generated text
+        """
+        kwargs = GeminiService._structured_kwargs(schema)
         
+        def call():
+            PROMPT_CHARS.labels(call_type).observe(len(prompt))
+            try:
+                timeout = time_remaining()
+                with outbound_limiter.leased_slot(min(outbound_limiter.queue_timeout, timeout)) as lease:
+                    gemini_breaker.allow()
+                    try:
+                        with stage("model_call", call_type):
+                            text = model_router.generate(
+                                call_type, prompt, timeout=time_remaining(timeout),
+                                hedge_gate=lambda: _hedge_gate(prompt), lease=lease, **kwargs
+                            ).text
+                    except DeadlineExceededError:
+                        GeminiService._settle_timeout()
+                        raise
+                    except Exception:
+                        gemini_breaker.record(False)
+                        raise
+                    gemini_breaker.record(True)
+            except Exception as e:
+                GEMINI_ERRORS.labels(call_type, type(e).__name__).inc()
+                raise
+            RESPONSE_CHARS.labels(call_type).observe(len(text))
+            return text
+        
+        # The Gemini budget is charged in the lane of the caller starting the call,
+        # so a rate-limited caller fails alone; every caller waits until its own deadline
+        return inflight_calls.do(hash_payload(prompt), call, timeout=time_remaining(),
+                                 admit=lambda: GeminiService._admit(prompt, call_type))
+
+    @staticmethod
+    async def _generate_async(prompt, call_type="chat", schema=None):
+        """
+        Send a single prompt to the model without blocking the event loop
+
         Args:
-            responses (dict): User's quiz responses
-            
+            prompt (str): Prompt for the model
+            call_type (str): Kind of call, used to pick the model (chat, follow_up, quiz)
+            schema (dict): Response schema of a structured reply, if any
+
         Returns:
-            dict: Travel persona analysis
+            str: Generated text
         """
+        kwargs = GeminiService._structured_kwargs(schema)
+        
+        async def call():
+            PROMPT_CHARS.labels(call_type).observe(len(prompt))
+            try:
+                timeout = time_remaining()
+                async with outbound_limiter.async_slot(min(outbound_limiter.queue_timeout, timeout)):
+                    gemini_breaker.allow()
+                    try:
+                        with stage("model_call", call_type):
+                            response = await model_router.generate_async(
+                                call_type, prompt, timeout=time_remaining(timeout),
+                                hedge_gate=lambda: _hedge_gate(prompt), **kwargs
+                            )
+                    except asyncio.CancelledError:
+                        gemini_breaker.cancel()
+                        raise
+                    except DeadlineExceededError:
+                        GeminiService._settle_timeout()
+                        raise
+                    except Exception:
+                        gemini_breaker.record(False)
+                        raise
+                    gemini_breaker.record(True)
+            except Exception as e:
+                GEMINI_ERRORS.labels(call_type, type(e).__name__).inc()
+                raise
+            RESPONSE_CHARS.labels(call_type).observe(len(response.text))
+            return response.text
+        
+        return await inflight_calls.do_async(hash_payload(prompt), call, timeout=time_remaining(),
+                                             admit=lambda: GeminiService._admit(prompt, call_type))
+
+    @staticmethod
+    def _admit(prompt, call_type):
+        """Charge a model call about to start to the Gemini budget, in the current request's lane"""
         try:
-            # Create prompt with the quiz responses
-            prompt = f"""
+            admission_control.charge_model_call(prompt)
+        except RateLimitedError as e:
+            GEMINI_ERRORS.labels(call_type, type(e).__name__).inc()
+            raise
+
+    @staticmethod
+    def _settle_timeout():
+        """
+        Report a timed-out model call to the breaker
+
+        The caller's own deadline running out is not a sign Gemini is
+        failing; the call hitting the GEMINI_CALL_TIMEOUT cap with time
+        still left is, so a stalled Gemini trips the breaker.
+        """
+        if deadline_passed():
+            gemini_breaker.cancel()
+        else:
+            gemini_breaker.record(False)
+
+    @staticmethod
+    def _structured_kwargs(schema):
+        """generate_content arguments constraining the reply to a schema, where supported"""
+        if schema is None or not structured_output_supported():
+            return {}
+        return {
+            "generation_config": {
+                "response_mime_type": "application/json",
+                "response_schema": schema
+            }
+        }
+
+    @staticmethod
+    def quiz_cache_key(responses):
+        """
+        Store key for a set of quiz responses
+
+        Multi-select answers are order-independent, and a single answer is
+        equivalent to a one-element list.
+
+        Args:
+            responses (dict): User's quiz responses
+
+        Returns:
+            str: Store key
+        """
+        canonical = {
+            question_id: sorted(str(a) for a in (answers if isinstance(answers, list) else [answers]))
+            for question_id, answers in responses.items()
+        }
+        return f"quiz:{hash_payload(canonical)}"
+    
+    @staticmethod
+    @timed_stage("prompt_build", "quiz")
+    def _build_quiz_prompt(responses):
+        """Build the persona analysis prompt for a set of quiz responses"""
+        return f"""
             Based on the following travel quiz responses, determine the user's travel persona.
             Analyze their preferences and categorize them into one of these personas:
             1. Foodie - Prioritizes culinary experiences
@@ -46,139 +434,768 @@ class GeminiService:
             5. Preferred activities
             6. Travel pace preference (fast, moderate, slow)
             
-            Format the response as JSON.
+            {_schema_instruction(QUIZ_ANALYSIS_SCHEMA)}
             """
+    
+    @staticmethod
+    def _stored_quiz_analysis(store_key):
+        """Previously stored analysis for these responses, if any"""
+        if response_store is None:
+            return None
+        stored = response_store.get(store_key)
+        if stored is None:
+            return None
+        return {
+            "success": True,
+            "analysis": stored
+        }
+    
+    @staticmethod
+    def _quiz_analysis_result(store_key, text):
+        """Parse the model output into an analysis and store it"""
+        try:
+            analysis = _parse_model_json(text, "quiz", QUIZ_ANALYSIS_SCHEMA)
+        except ValueError:
+            # The paid call produced nothing usable; the fallback analysis is served
+            WASTED_MODEL_CALLS.labels("quiz").inc()
+            raise
+        
+        if response_store is not None:
+            response_store.set(store_key, analysis)
+        
+        return {
+            "success": True,
+            "analysis": analysis
+        }
+    
+    @staticmethod
+    def _quiz_analysis_failure(e):
+        """Fallback analysis returned when the model call or parsing fails"""
+        print(f"Error analyzing quiz responses: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "analysis": {
+                "primaryPersona": "Cultural Explorer",  # Default fallback
+                "secondaryPersona": "Foodie",
+                "budgetSensitivity": "medium",
+                "interests": ["sightseeing", "local cuisine"],
+                "preferredActivities": ["visiting landmarks", "trying local food"],
+                "travelPace": "moderate"
+            }
+        }
+    
+    @staticmethod
+    def analyze_quiz_responses(responses):
+        """
+        Analyze quiz responses to determine travel persona
+        
+        Args:
+            responses (dict): User's quiz responses
             
-            # Generate response
-            response = model.generate_content(prompt)
+        Returns:
+            dict: Travel persona analysis
+        """
+        store_key = GeminiService.quiz_cache_key(responses)
+        stored = GeminiService._stored_quiz_analysis(store_key)
+        if stored is not None:
+            return stored
+        
+        try:
+            text = GeminiService._generate(GeminiService._build_quiz_prompt(responses), "quiz", QUIZ_ANALYSIS_SCHEMA)
+            return GeminiService._quiz_analysis_result(store_key, text)
+        except Exception as e:
+            return GeminiService._quiz_analysis_failure(e)
+    
+    @staticmethod
+    async def analyze_quiz_responses_async(responses):
+        """
+        Async variant of analyze_quiz_responses for the ASGI serving path
+        
+        Args:
+            responses (dict): User's quiz responses
             
-            # Parse the response text to extract JSON
-            response_text = response.text
+        Returns:
+            dict: Travel persona analysis
+        """
+        store_key = GeminiService.quiz_cache_key(responses)
+        stored = await GeminiService._off_loop(GeminiService._stored_quiz_analysis, store_key)
+        if stored is not None:
+            return stored
+        
+        try:
+            text = await GeminiService._generate_async(GeminiService._build_quiz_prompt(responses), "quiz", QUIZ_ANALYSIS_SCHEMA)
+            return await GeminiService._off_loop(GeminiService._quiz_analysis_result, store_key, text)
+        except Exception as e:
+            return GeminiService._quiz_analysis_failure(e)
+    
+    @staticmethod
+    @timed_stage("prompt_build", "chat")
+    def _build_chatbot_prompt(query, context=None, compacted=None):
+        """
+        Build the chatbot prompt for a question
+
+        Args:
+            query (str): User's question
+            context (dict): Additional context (itinerary, location, etc.)
+            compacted (dict): Already compacted context (see compact_context),
+                to skip compacting again
+
+        Returns:
+            str: Prompt for the model
+        """
+        if context:
+            location = context.get('location', '')
             
-            # Extract JSON from the response (handling potential markdown code blocks)
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].split("```")[0].strip()
+            if CHATBOT_CONTEXT_COMPACTION:
+                compacted = compacted or compact_context(query, context)
+                user_preferences = compacted["preferences"]
+                itinerary = compacted["itinerary"]
             else:
-                json_str = response_text
+                user_preferences = json.dumps(context.get('userPreferences', {}), indent=2)
+                itinerary = json.dumps(context['itinerary'], indent=2) if context.get('itinerary') else None
+            
+            return f"""
+            You are Ghoomo, an AI travel assistant for India and international destinations.
+            Be helpful, friendly, and use a conversational tone with occasional Hindi phrases.
+            
+            User's current location/interest: {location}
+            User's preferences: {user_preferences}
+            
+            If itinerary information is available, refer to it in your answers:
+            {itinerary or 'No itinerary available'}
+            
+            User's question: {query}
             
-            # Parse JSON
-            analysis = json.loads(json_str)
+            Provide a helpful, accurate response. If suggesting places, include brief descriptions.
+            For food recommendations, mention local specialties. For safety tips, be honest but reassuring.
+            If you don't know something specific, suggest general advice instead of making up facts.
+            """
+        
+        return f"""
+            You are Ghoomo, an AI travel assistant for India and international destinations.
+            Be helpful, friendly, and use a conversational tone with occasional Hindi phrases.
+            
+            User's question: {query}
+            
+            Provide a helpful, accurate response. If suggesting places, include brief descriptions.
+            For food recommendations, mention local specialties. For safety tips, be honest but reassuring.
+            If you don't know something specific, suggest general advice instead of making up facts.
+            """
+    
+    @staticmethod
+    @timed_stage("prompt_build", "follow_up")
+    def _build_follow_up_prompt(query):
+        """Build the prompt asking for follow-up questions"""
+        return f"""
+            Based on the user's question "{query}" and your response, suggest 3 short follow-up questions the user might want to ask.
+            Keep each question under 60 characters.
+            {_schema_instruction(FOLLOW_UP_SCHEMA)}
+            """
+    
+    @staticmethod
+    @timed_stage("prompt_build", "fused")
+    def _build_fused_prompt(query, context=None, compacted=None):
+        """Extend the chatbot prompt so one call returns answer and suggestions"""
+        return GeminiService._build_chatbot_prompt(query, context, compacted) + f"""
+            Also suggest 3 short follow-up questions the user might want to ask next,
+            each under 60 characters.
             
-            return {
+            Put your answer in "response" and the questions in "suggestions".
+            {_schema_instruction(FUSED_REPLY_SCHEMA)}
+            """
+    
+    @staticmethod
+    def _fallback_suggestions():
+        """Default suggestions served when the model's suggestions are unusable"""
+        FALLBACKS.labels("default_suggestions").inc()
+        return list(DEFAULT_SUGGESTIONS)
+    
+    @staticmethod
+    def _parse_suggestions(text):
+        """Parse follow-up suggestions, falling back to defaults on bad output"""
+        try:
+            suggestions = _parse_model_json(text, "follow_up", FOLLOW_UP_SCHEMA)
+        except ValueError:
+            WASTED_MODEL_CALLS.labels("follow_up").inc()
+            return GeminiService._fallback_suggestions()
+        
+        suggestions = [s for s in suggestions if s.strip()]
+        if not suggestions:
+            WASTED_MODEL_CALLS.labels("follow_up").inc()
+            return GeminiService._fallback_suggestions()
+        return suggestions[:3]
+    
+    @staticmethod
+    def _answer_sequential(query, context, compacted=None):
+        """Answer first, then ask for follow-up suggestions"""
+        answer = GeminiService._generate(GeminiService._build_chatbot_prompt(query, context, compacted))
+        follow_up_text = GeminiService._generate(GeminiService._build_follow_up_prompt(query), "follow_up", FOLLOW_UP_SCHEMA)
+        return answer, GeminiService._parse_suggestions(follow_up_text)
+    
+    @staticmethod
+    def _answer_concurrent(query, context, compacted=None):
+        """Issue the answer and follow-up calls in parallel"""
+        # The follow-up prompt only depends on the question, so both calls can run at once:
+        # the follow-up on the pool, the answer on this thread instead of idling on a future
+        # bind_context carries the caller's deadline onto the pool thread
+        follow_up_future = _executor.submit(
+            bind_context(GeminiService._generate), GeminiService._build_follow_up_prompt(query), "follow_up", FOLLOW_UP_SCHEMA
+        )
+        try:
+            answer = GeminiService._generate(GeminiService._build_chatbot_prompt(query, context, compacted))
+        except Exception:
+            follow_up_future.cancel()
+            raise
+        
+        try:
+            suggestions = GeminiService._parse_suggestions(follow_up_future.result())
+        except Exception as e:
+            print(f"Error getting follow-up suggestions: {str(e)}")
+            suggestions = GeminiService._fallback_suggestions()
+        return answer, suggestions
+    
+    @staticmethod
+    def _local_suggestions(query, context):
+        """Follow-up suggestions from the local engine, no model call"""
+        return suggestion_engine.suggest(query, context) or list(DEFAULT_SUGGESTIONS)
+    
+    @staticmethod
+    def _answer_local(query, context, compacted=None):
+        """One model call for the answer; suggestions are generated locally"""
+        answer = GeminiService._generate(GeminiService._build_chatbot_prompt(query, context, compacted))
+        return answer, GeminiService._local_suggestions(query, context)
+    
+    @staticmethod
+    def _answer_fused(query, context, compacted=None):
+        """Get answer and suggestions from a single structured call"""
+        text = GeminiService._generate(GeminiService._build_fused_prompt(query, context, compacted), "chat", FUSED_REPLY_SCHEMA)
+        return GeminiService._parse_fused(text)
+    
+    @staticmethod
+    def _parse_fused(text):
+        """
+        Split a fused reply into answer and suggestions
+        
+        Raises:
+            ValueError: If the reply is JSON that doesn't match the schema
+                (e.g. cut off), which is not fit to show or cache
+        """
+        try:
+            payload = _parse_model_json(text, "fused", FUSED_REPLY_SCHEMA)
+        except ValueError:
+            if text.lstrip().startswith(("{", "```")):
+                WASTED_MODEL_CALLS.labels("fused").inc()
+                raise ValueError("Unusable structured chatbot reply")
+            # The model ignored the format and answered in prose: still a usable answer
+            FALLBACKS.labels("unparsed_fused_reply").inc()
+            return text, list(DEFAULT_SUGGESTIONS)
+        
+        suggestions = [s for s in payload["suggestions"] if s.strip()][:3]
+        return payload["response"], suggestions or GeminiService._fallback_suggestions()
+    
+    @staticmethod
+    def chatbot_cache_key(query, context=None, compacted=None):
+        """
+        Cache key for a chatbot question
+
+        Only the context fields that end up in the prompt take part in the key,
+        with the day the question is about ("today", "tomorrow"), since the
+        compacted itinerary kept for it changes with the date.
+
+        Args:
+            query (str): User's question
+            context (dict): Additional context (itinerary, location, etc.)
+            compacted (dict): Context compacted ahead of the question (batch
+                answers), whose prompt differs from a single question's
+
+        Returns:
+            str: Cache key
+        """
+        context = context or {}
+        if compacted is not None:
+            context_hash = hash_payload({
+                "location": context.get('location', ''),
+                "compacted": [compacted["preferences"], compacted["itinerary"]]
+            })
+            return f"chat:batch:{normalize_query(query)}:{context_hash}"
+        context_hash = hash_payload({
+            "location": context.get('location', ''),
+            "itinerary": context.get('itinerary', {}),
+            "userPreferences": context.get('userPreferences', {}),
+            "focusDay": detect_focus(query)["day"] if context.get('itinerary') else None
+        })
+        return f"chat:{normalize_query(query)}:{context_hash}"
+    
+    @staticmethod
+    def _answer_without_model(query, context, cache_key, use_cache):
+        """
+        Answer from the cache or the approved-answer index, if possible
+        
+        Args:
+            query (str): User's question
+            context (dict): Additional context (itinerary, location, etc.)
+            cache_key (str): Cache key of the question
+            use_cache (bool): Whether cached and indexed answers may be served
+            
+        Returns:
+            dict or None: Chatbot response, or None if the model is needed
+        """
+        if not use_cache:
+            return None
+        
+        cached = GeminiService._lookup_cached(cache_key)
+        if cached is not None:
+            return dict(cached, suggestions=list(cached["suggestions"]), cached=True)
+        
+        if answer_index is None:
+            return None
+        
+        context = context or {}
+        # Questions about a specific day of the user's own trip can't have a shared answer
+        if context.get('itinerary') and detect_focus(query)["day"] is not None:
+            return None
+        
+        match = answer_index.search(query, context.get('location', ''))
+        if match is None:
+            return None
+        
+        return {
+            "success": True,
+            "response": match["answer"],
+            "suggestions": match["suggestions"] or list(DEFAULT_SUGGESTIONS),
+            "source": "index",
+            "similarity": match["similarity"]
+        }
+    
+    @staticmethod
+    def _lookup_cached(cache_key):
+        """Find a cached chatbot answer in this worker's cache, then the shared store"""
+        cached = chatbot_cache.get(cache_key)
+        if cached is None and response_store is not None:
+            # Another worker (or a previous deploy) may have answered this already
+            cached = response_store.get(cache_key)
+            if cached is not None:
+                chatbot_cache.set(cache_key, cached)
+        return cached
+    
+    @staticmethod
+    async def _off_loop(fn, *args):
+        """
+        Run cache, store or index work from the event loop
+
+        The shared store and the answer index do blocking I/O (SQLite,
+        Redis), so with either configured the work goes to a thread; the
+        in-process cache alone is run inline.
+        """
+        if response_store is None and answer_index is None:
+            return fn(*args)
+        return await run_blocking(fn, *args)
+    
+    @staticmethod
+    def _remember(cache_key, result):
+        """Store a successful chatbot answer in the cache and the shared store"""
+        chatbot_cache.set(cache_key, result)
+        if response_store is not None:
+            response_store.set(cache_key, result)
+    
+    @staticmethod
+    def get_chatbot_response(query, context=None, mode=None, use_cache=True, compacted=None):
+        """
+        Get a response from the chatbot
+        
+        Args:
+            query (str): User's question
+            context (dict): Additional context (itinerary, location, etc.)
+            mode (str): Call mode override (sequential, concurrent, fused or
+                local); defaults to CHATBOT_CALL_MODE
+            use_cache (bool): Serve from and store into the response cache
+            compacted (dict): Already compacted context (see compact_context)
+            
+        Returns:
+            dict: Chatbot response
+        """
+        cache_key = GeminiService.chatbot_cache_key(query, context, compacted)
+        local_answer = GeminiService._answer_without_model(query, context, cache_key, use_cache)
+        if local_answer is not None:
+            return local_answer
+        
+        mode = mode or CHATBOT_CALL_MODE
+        answer_fn = {
+            "sequential": GeminiService._answer_sequential,
+            "concurrent": GeminiService._answer_concurrent,
+            "fused": GeminiService._answer_fused,
+            "local": GeminiService._answer_local
+        }.get(mode, GeminiService._answer_concurrent)
+        
+        try:
+            answer, suggestions = answer_fn(query, context, compacted)
+            
+            result = {
                 "success": True,
-                "analysis": analysis
+                "response": answer,
+                "suggestions": suggestions
             }
+            # Cache even when bypassed, so the fresh answer serves later requests
+            GeminiService._remember(cache_key, result)
+            return dict(result, suggestions=list(suggestions))
+        
+        except OverloadedError:
+            # Let the route shed the request (503, or 429 when rate limited)
+            raise
             
         except Exception as e:
-            print(f"Error analyzing quiz responses: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e),
-                "analysis": {
-                    "primaryPersona": "Cultural Explorer",  # Default fallback
-                    "secondaryPersona": "Foodie",
-                    "budgetSensitivity": "medium",
-                    "interests": ["sightseeing", "local cuisine"],
-                    "preferredActivities": ["visiting landmarks", "trying local food"],
-                    "travelPace": "moderate"
-                }
-            }
+            return GeminiService._chatbot_failure(e)
     
     @staticmethod
-    def get_chatbot_response(query, context=None):
+    def _chatbot_failure(e):
+        """Fallback reply returned when the model call fails"""
+        print(f"Error getting chatbot response: {str(e)}")
+        FALLBACKS.labels("chatbot_error_reply").inc()
+        return {
+            "success": False,
+            "error": str(e),
+            "response": "I'm having trouble processing your request right now. Please try again later.",
+            "suggestions": list(ERROR_SUGGESTIONS)
+        }
+    
+    @staticmethod
+    async def get_chatbot_response_async(query, context=None, mode=None, use_cache=True, compacted=None):
         """
-        Get a response from the chatbot
+        Async variant of get_chatbot_response for the ASGI serving path
         
         Args:
             query (str): User's question
             context (dict): Additional context (itinerary, location, etc.)
+            mode (str): Call mode override (sequential, concurrent, fused or
+                local); defaults to CHATBOT_CALL_MODE
+            use_cache (bool): Serve from and store into the response cache
+            compacted (dict): Already compacted context (see compact_context)
             
         Returns:
             dict: Chatbot response
         """
+        cache_key = GeminiService.chatbot_cache_key(query, context, compacted)
+        local_answer = await GeminiService._off_loop(
+            GeminiService._answer_without_model, query, context, cache_key, use_cache
+        )
+        if local_answer is not None:
+            return local_answer
+        
+        mode = mode or CHATBOT_CALL_MODE
+        
         try:
-            # Create the prompt with context if available
-            if context:
-                location = context.get('location', '')
-                itinerary = context.get('itinerary', {})
-                user_preferences = context.get('userPreferences', {})
-                
-                prompt = f"""
-                You are Ghoomo, an AI travel assistant for India and international destinations.
-                Be helpful, friendly, and use a conversational tone with occasional Hindi phrases.
-                
-                User's current location/interest: {location}
-                User's preferences: {json.dumps(user_preferences, indent=2)}
-                
-                If itinerary information is available, refer to it in your answers:
-                {json.dumps(itinerary, indent=2) if itinerary else 'No itinerary available'}
-                
-                User's question: {query}
-                
-                Provide a helpful, accurate response. If suggesting places, include brief descriptions.
-                For food recommendations, mention local specialties. For safety tips, be honest but reassuring.
-                If you don't know something specific, suggest general advice instead of making up facts.
-                """
+            if mode == "fused":
+                text = await GeminiService._generate_async(GeminiService._build_fused_prompt(query, context, compacted), "chat", FUSED_REPLY_SCHEMA)
+                answer, suggestions = GeminiService._parse_fused(text)
+            elif mode == "local":
+                answer = await GeminiService._generate_async(GeminiService._build_chatbot_prompt(query, context, compacted))
+                suggestions = GeminiService._local_suggestions(query, context)
             else:
-                prompt = f"""
-                You are Ghoomo, an AI travel assistant for India and international destinations.
-                Be helpful, friendly, and use a conversational tone with occasional Hindi phrases.
+                answer_prompt = GeminiService._build_chatbot_prompt(query, context, compacted)
+                follow_up_prompt = GeminiService._build_follow_up_prompt(query)
                 
-                User's question: {query}
-                
-                Provide a helpful, accurate response. If suggesting places, include brief descriptions.
-                For food recommendations, mention local specialties. For safety tips, be honest but reassuring.
-                If you don't know something specific, suggest general advice instead of making up facts.
-                """
+                if mode == "sequential":
+                    answer = await GeminiService._generate_async(answer_prompt)
+                    suggestions = GeminiService._parse_suggestions(await GeminiService._generate_async(follow_up_prompt, "follow_up", FOLLOW_UP_SCHEMA))
+                else:
+                    answer, follow_up_text = await asyncio.gather(
+                        GeminiService._generate_async(answer_prompt),
+                        GeminiService._generate_async(follow_up_prompt, "follow_up", FOLLOW_UP_SCHEMA),
+                        return_exceptions=True
+                    )
+                    if isinstance(answer, BaseException):
+                        raise answer
+                    if isinstance(follow_up_text, BaseException):
+                        print(f"Error getting follow-up suggestions: {str(follow_up_text)}")
+                        suggestions = GeminiService._fallback_suggestions()
+                    else:
+                        suggestions = GeminiService._parse_suggestions(follow_up_text)
             
-            # Generate response
-            response = model.generate_content(prompt)
+            result = {
+                "success": True,
+                "response": answer,
+                "suggestions": suggestions
+            }
+            await GeminiService._off_loop(GeminiService._remember, cache_key, result)
+            return dict(result, suggestions=list(suggestions))
+        
+        except OverloadedError:
+            raise
+        
+        except Exception as e:
+            return GeminiService._chatbot_failure(e)
+    
+    @staticmethod
+    def _batch_context(context):
+        """
+        Compact a context shared by several questions once, for all of them
+        
+        The itinerary is compacted without a question focus (every day kept
+        while the budget allows), so it serves any question of the batch.
+        """
+        if not context or not CHATBOT_CONTEXT_COMPACTION:
+            return None
+        return compact_context(None, context)
+    
+    @staticmethod
+    def _batch_item_failure(e):
+        """Result of a batch question that could not be answered at all"""
+        result = {
+            "success": False,
+            "error": str(e)
+        }
+        if isinstance(e, OverloadedError):
+            result["retryAfter"] = e.retry_after
+        return result
+    
+    @staticmethod
+    def _model_calls(query, context, mode, compacted=None):
+        """
+        _generate arguments of the calls answering a question in a mode
+        
+        Returns:
+            tuple: (answer call, follow-up call or None), each a
+            (prompt, call type, schema) tuple
+        """
+        if mode == "fused":
+            return (GeminiService._build_fused_prompt(query, context, compacted), "chat", FUSED_REPLY_SCHEMA), None
+        answer_call = (GeminiService._build_chatbot_prompt(query, context, compacted), "chat", None)
+        if mode == "local":
+            return answer_call, None
+        return answer_call, (GeminiService._build_follow_up_prompt(query), "follow_up", FOLLOW_UP_SCHEMA)
+    
+    @staticmethod
+    def _collect_answer(query, context, mode, answer_future, follow_up_future):
+        """Answer and suggestions of a question from its model call futures"""
+        try:
+            text = answer_future.result()
+        except Exception:
+            if follow_up_future is not None:
+                follow_up_future.cancel()
+            raise
+        if mode == "fused":
+            return GeminiService._parse_fused(text)
+        if follow_up_future is None:
+            return text, GeminiService._local_suggestions(query, context)
+        try:
+            suggestions = GeminiService._parse_suggestions(follow_up_future.result())
+        except Exception as e:
+            print(f"Error getting follow-up suggestions: {str(e)}")
+            suggestions = GeminiService._fallback_suggestions()
+        return text, suggestions
+    
+    @staticmethod
+    def get_chatbot_responses(queries, context=None, mode=None, use_cache=True):
+        """
+        Answer several independent questions that share one context
+        
+        The context is compacted once, and the model calls of all questions
+        go straight onto the shared pool, so the batch takes about as long
+        as its slowest answer. The two calls of sequential mode are issued
+        together here too, as nothing in a batch waits on the answer.
+        
+        Args:
+            queries (list): User's questions
+            context (dict): Additional context shared by all questions
+            mode (str): Call mode override (see get_chatbot_response)
+            use_cache (bool): Serve from and store into the response cache
             
-            # Process suggestions for follow-up questions
-            follow_up_prompt = f"""
-            Based on the user's question "{query}" and your response, suggest 3 short follow-up questions the user might want to ask.
-            Format as a JSON array of strings. Keep each question under 60 characters.
-            """
+        Returns:
+            list: One chatbot response per question, in order; a question
+            shed by the limiter gets success False and retryAfter
+        """
+        compacted = GeminiService._batch_context(context)
+        mode = mode or CHATBOT_CALL_MODE
+        
+        results = []
+        pending = []
+        for query in queries:
+            cache_key = GeminiService.chatbot_cache_key(query, context, compacted)
+            local_answer = GeminiService._answer_without_model(query, context, cache_key, use_cache)
+            results.append(local_answer)
+            if local_answer is not None:
+                continue
+            answer_call, follow_up_call = GeminiService._model_calls(query, context, mode, compacted)
+            pending.append((
+                len(results) - 1, query, cache_key,
+                _executor.submit(bind_context(GeminiService._generate), *answer_call),
+                _executor.submit(bind_context(GeminiService._generate), *follow_up_call) if follow_up_call else None
+            ))
+        
+        for index, query, cache_key, answer_future, follow_up_future in pending:
+            try:
+                answer, suggestions = GeminiService._collect_answer(query, context, mode, answer_future, follow_up_future)
+            except OverloadedError as e:
+                results[index] = GeminiService._batch_item_failure(e)
+                continue
+            except Exception as e:
+                results[index] = GeminiService._chatbot_failure(e)
+                continue
+            result = {
+                "success": True,
+                "response": answer,
+                "suggestions": suggestions
+            }
+            GeminiService._remember(cache_key, result)
+            results[index] = dict(result, suggestions=list(suggestions))
+        return results
+    
+    @staticmethod
+    async def get_chatbot_responses_async(queries, context=None, mode=None, use_cache=True):
+        """
+        Async variant of get_chatbot_responses for the ASGI serving path
+        
+        Args:
+            queries (list): User's questions
+            context (dict): Additional context shared by all questions
+            mode (str): Call mode override (see get_chatbot_response)
+            use_cache (bool): Serve from and store into the response cache
             
-            follow_up_response = model.generate_content(follow_up_prompt)
+        Returns:
+            list: One chatbot response per question, in order
+        """
+        compacted = GeminiService._batch_context(context)
+        results = await asyncio.gather(
+            *(GeminiService.get_chatbot_response_async(query, context, mode, use_cache, compacted) for query in queries),
+            return_exceptions=True
+        )
+        return [
+            GeminiService._batch_item_failure(result) if isinstance(result, BaseException) else result
+            for result in results
+        ]
+    
+    @staticmethod
+    def stream_chatbot_response(query, context=None, use_cache=True):
+        """
+        Stream a chatbot answer as it is generated
+        
+        The follow-up suggestions call is started alongside the answer, so the
+        suggestions are usually ready by the time the last token arrives (in
+        local mode they are generated without a model call).
+        The answer stream goes through the model router, limiter, deadline
+        and circuit breaker like any other call; until its first token it is
+        hedged and failed over as well. Closing the generator (client
+        disconnected) stops the model stream and drops the pending
+        suggestions call.
+        
+        The answer call is charged to the Gemini budget before this returns,
+        so a rate-limited request is refused before any event is sent.
+        
+        Args:
+            query (str): User's question
+            context (dict): Additional context (itinerary, location, etc.)
+            use_cache (bool): Serve from and store into the response cache
             
-            # Parse follow-up questions
-            follow_up_text = follow_up_response.text
+        Returns:
+            generator: (event, payload) tuples with event one of token,
+            suggestions, done or error
             
-            # Extract JSON from the response
-            if "```json" in follow_up_text:
-                json_str = follow_up_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in follow_up_text:
-                json_str = follow_up_text.split("```")[1].split("```")[0].strip()
+        Raises:
+            RateLimitedError: If the answer call doesn't fit in the Gemini budget
+        """
+        cache_key = GeminiService.chatbot_cache_key(query, context)
+        local_answer = GeminiService._answer_without_model(query, context, cache_key, use_cache)
+        if local_answer is not None:
+            return GeminiService._stream_local_answer(local_answer)
+        
+        prompt = GeminiService._build_chatbot_prompt(query, context)
+        admission_control.charge_model_call(prompt)
+        return GeminiService._stream_model_answer(query, context, cache_key, prompt)
+    
+    @staticmethod
+    def _stream_local_answer(local_answer):
+        """Events of an answer served from the cache or the answer index"""
+        yield "token", {"text": local_answer["response"]}
+        yield "suggestions", {"suggestions": local_answer["suggestions"]}
+        yield "done", {"success": True, "cached": local_answer.get("cached", False),
+                       "source": local_answer.get("source", "cache")}
+    
+    @staticmethod
+    def _stream_model_answer(query, context, cache_key, prompt):
+        """Events of an answer streamed from the model (see stream_chatbot_response)"""
+        if CHATBOT_CALL_MODE == "local":
+            follow_up_future = None
+        else:
+            follow_up_future = _executor.submit(
+                bind_context(GeminiService._generate), GeminiService._build_follow_up_prompt(query), "follow_up", FOLLOW_UP_SCHEMA
+            )
+        stream = None
+        completed = False
+        lease = None
+        # Whether the breaker allowed the call and still waits for its outcome
+        allowed = False
+        
+        try:
+            PROMPT_CHARS.labels("chat_stream").observe(len(prompt))
+            timeout = time_remaining()
+            # The slot is held for the whole stream, not just until the first chunk,
+            # and by abandoned attempts until they return
+            outbound_limiter.acquire(min(outbound_limiter.queue_timeout, timeout))
+            lease = SlotLease(outbound_limiter)
+            gemini_breaker.allow()
+            allowed = True
+            started = time.monotonic()
+            stream = model_router.stream("chat", prompt, timeout=time_remaining(timeout),
+                                         hedge_gate=lambda: _hedge_gate(prompt), lease=lease)
+            
+            chunks = []
+            for chunk in stream:
+                text = chunk.text
+                if text:
+                    chunks.append(text)
+                    yield "token", {"text": text}
+            gemini_breaker.record(True)
+            allowed = False
+            STAGE_LATENCY.labels("model_call", "chat_stream").observe(time.monotonic() - started)
+            RESPONSE_CHARS.labels("chat_stream").observe(sum(len(text) for text in chunks))
+            
+            if follow_up_future is None:
+                suggestions = GeminiService._local_suggestions(query, context)
             else:
-                json_str = follow_up_text
+                try:
+                    suggestions = GeminiService._parse_suggestions(follow_up_future.result())
+                except Exception as e:
+                    print(f"Error getting follow-up suggestions: {str(e)}")
+                    suggestions = GeminiService._fallback_suggestions()
+            yield "suggestions", {"suggestions": suggestions}
             
-            try:
-                suggestions = json.loads(json_str)
-            except:
-                suggestions = [
-                    "What are the best times to visit?",
-                    "How's the local transportation?",
-                    "Any safety tips I should know?"
-                ]
-            
-            return {
+            GeminiService._remember(cache_key, {
                 "success": True,
-                "response": response.text,
+                "response": "".join(chunks),
                 "suggestions": suggestions
-            }
-            
+            })
+            completed = True
+            yield "done", {"success": True}
+        
         except Exception as e:
-            print(f"Error getting chatbot response: {str(e)}")
-            return {
+            print(f"Error streaming chatbot response: {str(e)}")
+            GEMINI_ERRORS.labels("chat_stream", type(e).__name__).inc()
+            FALLBACKS.labels("chatbot_error_reply").inc()
+            if allowed:
+                if isinstance(e, DeadlineExceededError):
+                    GeminiService._settle_timeout()
+                else:
+                    gemini_breaker.record(False)
+                allowed = False
+            completed = True
+            yield "error", {
                 "success": False,
                 "error": str(e),
                 "response": "I'm having trouble processing your request right now. Please try again later.",
-                "suggestions": [
-                    "What are popular destinations in India?",
-                    "How can I plan a budget trip?",
-                    "What should I pack for my trip?"
-                ]
-            }
\ No newline at end of file
+                "suggestions": list(ERROR_SUGGESTIONS)
+            }
+        
+        finally:
+            if stream is not None:
+                # Stops the model stream if it is still running (e.g. the client went away)
+                stream.close()
+            if lease is not None:
+                lease.release()
+            if not completed:
+                # Nobody is listening any more: free the worker instead of generating on
+                print("Chatbot stream cancelled by client")
+                if follow_up_future is not None:
+                    follow_up_future.cancel()
+                if allowed:
+                    gemini_breaker.cancel()
@@ -0,0 +1,263 @@
+"""
+Background job queue for deferred work (e.g. Gemini enrichment)
+
+Jobs run on a bounded thread pool in the process that accepted them; job
+state lives in a backend so any worker can answer a poll:
+    - in-process dict (default, single worker)
+    - Redis-compatible server (Redis, Valkey, KeyDB...) when JOB_QUEUE_URL is set
+
+Finished jobs can be POSTed to a callback URL, but only to the hosts listed
+in JOB_CALLBACK_HOSTS (comma-separated host or host:port); callbacks are
+refused when it is empty, so a request can't make the service call
+internal addresses.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+CALLBACK_SCHEMES = {"http", "https"}
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+class CallbackNotAllowedError(ValueError):
+    """Raised when a callback URL is not on the allowlist"""
+
+
+class InMemoryJobBackend:
+    """Job records in a dict, expired lazily"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        now = time.time()
+        with self._lock:
+            self._jobs[job["id"]] = (now + self.ttl, dict(job))
+            expired = [job_id for job_id, (expires_at, _) in self._jobs.items() if expires_at <= now]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def load(self, job_id):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return dict(entry[1])
+
+
+class RedisJobBackend:
+    """Job records as JSON strings with a TTL on a Redis-compatible server"""
+
+    KEY_PREFIX = "ghoomo:job:"
+
+    def __init__(self, url, ttl=3600):
+        # Optional dependency: only needed when a shared backend is configured
+        import redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def save(self, job):
+        self._client.set(self.KEY_PREFIX + job["id"], json.dumps(job), ex=int(self.ttl))
+
+    def load(self, job_id):
+        raw = self._client.get(self.KEY_PREFIX + job_id)
+        return json.loads(raw) if raw else None
+
+
+class JobQueue:
+    """Bounded pool of workers running jobs whose state is kept in a backend"""
+
+    def __init__(self, backend, max_workers=4, max_pending=256, callback_hosts=()):
+        """
+        Args:
+            backend: InMemoryJobBackend or RedisJobBackend
+            max_workers (int): Jobs run concurrently
+            max_pending (int): Queued plus running jobs accepted before
+                submit() raises QueueFullError
+            callback_hosts (iterable): Hosts (or host:port) callbacks may be
+                sent to; empty disables callbacks
+        """
+        self.backend = backend
+        self.callback_hosts = {host.strip().lower() for host in callback_hosts if host.strip()}
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, callback_url=None):
+        """
+        Queue a job
+
+        Args:
+            fn (callable): Work to run; its return value must be JSON-serializable
+            *args: Arguments for fn
+            callback_url (str): Optional URL the finished job record is POSTed to
+
+        Returns:
+            str: Job id
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running
+            CallbackNotAllowedError: If callback_url is not on the allowlist
+        """
+        if callback_url:
+            self.check_callback_url(callback_url)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+            self._pending += 1
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "createdAt": time.time(),
+            "finishedAt": None
+        }
+        try:
+            self.backend.save(job)
+            self._executor.submit(self._run, job, fn, args, callback_url)
+        except Exception:
+            # The job never started: give its place back
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        with self._lock:
+            self.submitted += 1
+        return job["id"]
+
+    def check_callback_url(self, url):
+        """
+        Check a callback URL against the allowed schemes and hosts
+
+        Args:
+            url (str): Callback URL
+
+        Raises:
+            CallbackNotAllowedError: If callbacks to it are not allowed
+        """
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            raise CallbackNotAllowedError("Invalid callback URL")
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in CALLBACK_SCHEMES or not host:
+            raise CallbackNotAllowedError("Callback URL must be an http(s) URL")
+        if host not in self.callback_hosts and f"{host}:{port}" not in self.callback_hosts:
+            raise CallbackNotAllowedError(f"Callbacks to {host} are not allowed")
+
+    def get(self, job_id):
+        """
+        Get a job record
+
+        Args:
+            job_id (str): Job id
+
+        Returns:
+            dict or None: Job record, or None if unknown or expired
+        """
+        return self.backend.load(job_id)
+
+    def _run(self, job, fn, args, callback_url):
+        try:
+            job["status"] = "running"
+            self.backend.save(job)
+
+            try:
+                job["result"] = fn(*args)
+                job["status"] = "done"
+                succeeded = True
+            except Exception as e:
+                print(f"Error running job {job['id']}: {str(e)}")
+                job["error"] = str(e)
+                job["status"] = "failed"
+                succeeded = False
+
+            job["finishedAt"] = time.time()
+            self.backend.save(job)
+
+            with self._lock:
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+            if callback_url:
+                self._notify(callback_url, job)
+        except Exception as e:
+            print(f"Error finishing job {job['id']}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _notify(self, callback_url, job):
+        """POST the finished job record to the caller's callback URL"""
+        try:
+            self.check_callback_url(callback_url)
+            # A redirect could point anywhere: don't follow it
+            requests.post(callback_url, json=job, timeout=5, allow_redirects=False)
+        except (CallbackNotAllowedError, requests.RequestException) as e:
+            print(f"Error delivering job {job['id']} to callback: {str(e)}")
+
+    def stats(self):
+        """
+        Get queue counters (per process)
+
+        Returns:
+            dict: Pending jobs, limits and outcome counters
+        """
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "maxPending": self.max_pending,
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+
+
+def create_job_queue(prefix):
+    """
+    Build a job queue from the environment
+
+    Args:
+        prefix (str): Environment prefix for pool sizing, e.g. QUIZ_ENRICH
+            reads QUIZ_ENRICH_WORKERS and QUIZ_ENRICH_MAX_PENDING
+
+    Returns:
+        JobQueue
+    """
+    ttl = float(os.environ.get("JOB_TTL", 3600))
+    url = os.environ.get("JOB_QUEUE_URL")
+    backend = RedisJobBackend(url, ttl=ttl) if url else InMemoryJobBackend(ttl=ttl)
+
+    return JobQueue(
+        backend,
+        max_workers=int(os.environ.get(f"{prefix}_WORKERS", 4)),
+        max_pending=int(os.environ.get(f"{prefix}_MAX_PENDING", 256)),
+        callback_hosts=os.environ.get("JOB_CALLBACK_HOSTS", "").split(",")
+    )
@@ -0,0 +1,569 @@
+"""
+Latency-aware routing of model calls
+
+Each call type (chat answer, follow-up suggestions, quiz summary...) is
+mapped by a config table to an ordered list of models, optionally split by
+prompt size. The router keeps a rolling window of latency and errors per
+model and moves a model behind its alternatives while it is slow or
+erroring; if a call fails, it is retried on the next model.
+
+Calls are bounded by a timeout. When a call is still running after the
+GEMINI_HEDGE_PERCENTILE latency of its call type, one duplicate is sent
+(to the next model, if there is one) and the first reply wins; a call
+that keeps failing fails over to the next model until the time is up.
+A hedge is extra upstream load, so the caller can make it wait for a
+free slot (hedge_gate) and skip it when there is none. If the model
+client takes a timeout (client_timeout), each call is also given the
+time left, so a call abandoned at the deadline doesn't keep a pool
+thread busy until the model gives up on its own. Without one, an
+abandoned call runs on until the model replies; a caller-supplied lease
+keeps the caller's concurrency slot taken until then.
+
+Streams (stream()) are hedged and failed over the same way until their
+first chunk arrives; after that they stay on the model that answered.
+
+The table can be replaced with GEMINI_MODEL_ROUTES (JSON, same shape as
+DEFAULT_ROUTES). Models are created through a factory, so the routing
+policy can be exercised against stub models.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from services.resilience import DeadlineExceededError
+
+# Two different models by default, so calls have somewhere to fail over and
+# hedge to; setting both to the same name turns failover off (hedges then go
+# to the same model again)
+FAST_MODEL = os.environ.get("GEMINI_FAST_MODEL", "gemini-1.5-flash")
+LARGE_MODEL = os.environ.get("GEMINI_LARGE_MODEL", "gemini-pro")
+
+# call type -> rules checked in order; the first whose maxPromptChars fits
+# the prompt (None = any size) gives the model preference order
+DEFAULT_ROUTES = {
+    "follow_up": [
+        {"maxPromptChars": None, "models": [FAST_MODEL, LARGE_MODEL]}
+    ],
+    "quiz": [
+        {"maxPromptChars": None, "models": [FAST_MODEL, LARGE_MODEL]}
+    ],
+    "chat": [
+        {"maxPromptChars": 2500, "models": [FAST_MODEL, LARGE_MODEL]},
+        {"maxPromptChars": None, "models": [LARGE_MODEL, FAST_MODEL]}
+    ]
+}
+
+# Seconds a call may take (rolling p90) before its model counts as slow
+DEFAULT_LATENCY_BUDGETS = {
+    "follow_up": 3.0,
+    "quiz": 6.0,
+    "chat": 8.0
+}
+
+# Latency percentile of a call type after which a duplicate request is sent (0 disables hedging)
+HEDGE_PERCENTILE = float(os.environ.get("GEMINI_HEDGE_PERCENTILE", 0.95))
+
+
+class ModelHealth:
+    """Rolling latency and error record of one model"""
+
+    def __init__(self, window=50):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Sample count, error rate and p50/p90 latency of successful calls
+        """
+        with self._lock:
+            samples = list(self._samples)
+
+        latencies = sorted(latency for latency, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+
+        return {
+            "samples": len(samples),
+            "errorRate": round(errors / len(samples), 4) if samples else 0.0,
+            "p50": self._percentile(latencies, 0.5),
+            "p90": self._percentile(latencies, 0.9)
+        }
+
+    def percentile(self, p):
+        """Latency of successful calls at percentile p (0-1), or None without samples"""
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._samples if ok)
+        return self._percentile(latencies, p)
+
+    @staticmethod
+    def _percentile(latencies, p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+
+class ModelRouter:
+    """Picks a model per call and fails over between models"""
+
+    def __init__(self, model_factory, routes=None, latency_budgets=None,
+                 max_error_rate=0.3, min_samples=5, window=50,
+                 hedge_percentile=HEDGE_PERCENTILE, max_workers=32, client_timeout=False):
+        """
+        Args:
+            model_factory (callable): Model name -> model object with
+                generate_content / generate_content_async
+            routes (dict): Call type -> routing rules (see DEFAULT_ROUTES)
+            latency_budgets (dict): Call type -> p90 seconds before a model is slow
+            max_error_rate (float): Error rate above which a model is unhealthy
+            min_samples (int): Samples needed before health is judged
+            window (int): Calls kept per model for the rolling figures
+            hedge_percentile (float): Call-type latency percentile after which
+                a duplicate call is sent; 0 disables hedging
+            max_workers (int): Threads running blocking model calls
+            client_timeout (bool or callable): Pass the time left to each call as
+                request_options={"timeout": seconds}; a callable is asked
+                once, when the first model is created
+        """
+        self.model_factory = model_factory
+        self.routes = routes or DEFAULT_ROUTES
+        self.latency_budgets = latency_budgets or DEFAULT_LATENCY_BUDGETS
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.hedge_percentile = hedge_percentile
+        self.client_timeout = client_timeout
+        self._models = {}
+        self._health = {}
+        self._call_latency = {}
+        self._lock = threading.Lock()
+        # Blocking calls run here so the caller can stop waiting at its timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-call")
+        self.failovers = 0
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.timeouts = 0
+
+    def model(self, name):
+        """Model object for a name, created on first use"""
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = self.model_factory(name)
+                if callable(self.client_timeout):
+                    self.client_timeout = bool(self.client_timeout())
+            return model
+
+    def health(self, name):
+        """Rolling health record for a model"""
+        with self._lock:
+            health = self._health.get(name)
+            if health is None:
+                health = self._health[name] = ModelHealth(self.window)
+            return health
+
+    def _healthy(self, name, call_type):
+        snapshot = self.health(name).snapshot()
+        if snapshot["samples"] < self.min_samples:
+            return True
+        if snapshot["errorRate"] > self.max_error_rate:
+            return False
+        budget = self.latency_budgets.get(call_type)
+        return budget is None or snapshot["p90"] is None or snapshot["p90"] <= budget
+
+    def candidates(self, call_type, prompt):
+        """
+        Models to try for a call, best first
+
+        Args:
+            call_type (str): Kind of call (chat, follow_up, quiz...)
+            prompt (str): Prompt to send
+
+        Returns:
+            list: Model names; configured order, with unhealthy models moved last
+        """
+        rules = self.routes.get(call_type) or self.routes["chat"]
+        models = rules[-1]["models"]
+        for rule in rules:
+            if rule.get("maxPromptChars") is None or len(prompt) <= rule["maxPromptChars"]:
+                models = rule["models"]
+                break
+
+        # Deduplicate while keeping order (fast and large may be the same model)
+        models = list(dict.fromkeys(models))
+        healthy = [m for m in models if self._healthy(m, call_type)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def record(self, name, latency, ok, call_type=None):
+        """Record the outcome of a call (also used for calls made outside generate())"""
+        self.health(name).record(latency, ok)
+        if call_type is not None:
+            with self._lock:
+                history = self._call_latency.get(call_type)
+                if history is None:
+                    history = self._call_latency[call_type] = ModelHealth(self.window)
+            history.record(latency, ok)
+
+    def hedge_delay(self, call_type):
+        """
+        Seconds to wait before hedging a call
+
+        Args:
+            call_type (str): Kind of call
+
+        Returns:
+            float or None: Latency percentile of the call type, or None if
+            hedging is off or there is not enough history yet
+        """
+        if not self.hedge_percentile:
+            return None
+        with self._lock:
+            history = self._call_latency.get(call_type)
+        if history is None or history.snapshot()["samples"] < self.min_samples:
+            return None
+        return history.percentile(self.hedge_percentile)
+
+    def _call_kwargs(self, kwargs, deadline):
+        """generate_content arguments of a call launched now, with the client timeout if enabled"""
+        if not self.client_timeout or deadline is None:
+            return kwargs
+        return dict(kwargs, request_options={"timeout": max(0.001, deadline - time.monotonic())})
+
+    def _failed(self, name, call_type, start, deadline, error):
+        # A call cut off by the caller's deadline says the model was slow, not broken
+        ok = deadline is not None and time.monotonic() >= deadline
+        self.record(name, time.monotonic() - start, ok, call_type)
+        if not ok:
+            print(f"Model {name} failed for {call_type} call: {str(error)}")
+
+    def _call(self, name, call_type, prompt, kwargs, deadline=None):
+        start = time.monotonic()
+        try:
+            response = self.model(name).generate_content(prompt, **self._call_kwargs(kwargs, deadline))
+        except Exception as e:
+            self._failed(name, call_type, start, deadline, e)
+            raise
+        self.record(name, time.monotonic() - start, True, call_type)
+        return response
+
+    async def _call_async(self, name, call_type, prompt, kwargs, deadline=None):
+        start = time.monotonic()
+        try:
+            response = await self.model(name).generate_content_async(prompt, **self._call_kwargs(kwargs, deadline))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failed(name, call_type, start, deadline, e)
+            raise
+        self.record(name, time.monotonic() - start, True, call_type)
+        return response
+
+    def _next_wait(self, started, deadline, hedge_after):
+        """Seconds until the next event: the hedge point (if still pending) or the deadline"""
+        now = time.monotonic()
+        waits = []
+        if deadline is not None:
+            waits.append(deadline - now)
+        if hedge_after is not None:
+            waits.append(started + hedge_after - now)
+        return max(0.0, min(waits)) if waits else None
+
+    def _timed_out(self, call_type, timeout):
+        self.timeouts += 1
+        return DeadlineExceededError(f"Model call for {call_type} timed out after {timeout:.2f}s")
+
+    def _hedge(self, hedge_gate):
+        """
+        Decide whether to send a hedge
+
+        Returns:
+            tuple: (send the hedge, callable releasing what the gate took or None)
+        """
+        release = hedge_gate() if hedge_gate is not None else None
+        if hedge_gate is not None and release is None:
+            self.hedges_skipped += 1
+            return False, None
+        self.hedges += 1
+        return True, release
+
+    def generate(self, call_type, prompt, timeout=None, hedge_gate=None, lease=None, **kwargs):
+        """
+        Run generate_content on the best model, with hedging, failover and a timeout
+
+        Args:
+            call_type (str): Kind of call
+            prompt (str): Prompt to send
+            timeout (float): Seconds to wait for a reply, or None to wait indefinitely
+            hedge_gate (callable): Called before a hedge; returns a callable
+                to run when the hedged call ends, or None to skip the hedge
+            lease: Object with retain()/release() held by every non-hedge
+                call until it ends, even after the caller stopped waiting
+            **kwargs: Passed to generate_content
+
+        Returns:
+            Model response
+
+        Raises:
+            DeadlineExceededError: If no model replied within the timeout
+        """
+        return self._race(
+            call_type, self.candidates(call_type, prompt), timeout, self.hedge_delay(call_type), hedge_gate,
+            lambda name, deadline: self._call(name, call_type, prompt, kwargs, deadline), lease=lease
+        )
+
+    def _race(self, call_type, names, timeout, hedge_after, hedge_gate, call, discard=None, lease=None):
+        """
+        Run call(name, deadline) on the pool until one succeeds
+
+        The first model is called; the next one is hedged in after
+        hedge_after seconds, or failed over to when a call fails.
+
+        Args:
+            call_type (str): Kind of call
+            names (list): Candidate models, best first
+            timeout (float): Seconds to wait, or None to wait indefinitely
+            hedge_after (float): Seconds before a hedge, or None for no hedge
+            hedge_gate (callable): See generate
+            call (callable): Runs one call on the pool
+            discard (callable): Called with the result of a call that
+                succeeds after another one won (e.g. to close a stream)
+            lease: See generate
+
+        Returns:
+            Result of the first successful call
+        """
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        pending = {}
+        launched = 0
+        last_error = None
+
+        def launch(release=None):
+            nonlocal launched
+            # A hedge with a single candidate goes to the same model again
+            name = names[launched % len(names)]
+            launched += 1
+            if release is None and lease is not None:
+                lease.retain()
+                release = lease.release
+            try:
+                future = self._executor.submit(call, name, deadline)
+            except Exception:
+                if release is not None:
+                    release()
+                raise
+            if release is not None:
+                # Runs once the call ends, however it ends (cancelled before starting included)
+                future.add_done_callback(lambda _: release())
+            pending[future] = name
+
+        def abandon():
+            # Calls already running finish on the pool, still feeding the health figures
+            # and holding their slot (lease or hedge gate) until they return
+            for future in pending:
+                if not future.cancel() and discard is not None:
+                    future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=self._next_wait(started, deadline, hedge_after),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                if deadline is not None and time.monotonic() >= deadline:
+                    abandon()
+                    raise self._timed_out(call_type, timeout)
+                hedge_after = None
+                send, release = self._hedge(hedge_gate)
+                if send:
+                    launch(release)
+                continue
+
+            for future in done:
+                pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                abandon()
+                return result
+
+            if not pending and deadline is not None and time.monotonic() >= deadline:
+                # Cut off by the client timeout at the deadline
+                raise self._timed_out(call_type, timeout)
+            if not pending and launched < len(names):
+                self.failovers += 1
+                launch()
+        raise last_error
+
+    def _open_stream(self, name, stream_type, prompt, kwargs, deadline=None):
+        """Start a streaming call and wait for its first chunk; returns (name, response, chunk iterator, first chunk)"""
+        start = time.monotonic()
+        try:
+            response = self.model(name).generate_content(prompt, stream=True, **self._call_kwargs(kwargs, deadline))
+            chunks = iter(response)
+            first = next(chunks, None)
+        except Exception as e:
+            self._failed(name, stream_type, start, deadline, e)
+            raise
+        self.record(name, time.monotonic() - start, True, stream_type)
+        return name, response, chunks, first
+
+    @staticmethod
+    def _close_stream(response, chunks):
+        """
+        Stop a streaming call nobody reads any more
+
+        Closes the chunk iterator and the response where they can be
+        closed (the stub's can). A Gemini stream has no public cancel: its
+        gRPC call is cancelled once the response is no longer referenced,
+        and the client timeout bounds it in any case.
+        """
+        for source in (chunks, response):
+            close = getattr(source, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"Error closing model stream: {str(e)}")
+
+    def stream(self, call_type, prompt, timeout=None, hedge_gate=None, lease=None, **kwargs):
+        """
+        Stream generate_content from the best model, with hedging, failover and a timeout
+
+        Until its first chunk arrives a stream is treated like a generate
+        call: hedged after the time-to-first-chunk percentile of its call
+        type ("<call type>_stream"), failed over when it fails. After that
+        it stays on the model that answered; the timeout still ends it
+        between chunks. Closing the generator stops the stream.
+
+        Args:
+            call_type (str): Kind of call
+            prompt (str): Prompt to send
+            timeout (float): Seconds the whole stream may take, or None
+            hedge_gate (callable): See generate
+            lease: See generate; held until the first chunk
+            **kwargs: Passed to generate_content
+
+        Yields:
+            Response chunks
+
+        Raises:
+            DeadlineExceededError: If the stream did not finish within the timeout
+        """
+        stream_type = f"{call_type}_stream"
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        name, response, chunks, first = self._race(
+            call_type, self.candidates(call_type, prompt), timeout, self.hedge_delay(stream_type), hedge_gate,
+            lambda name, call_deadline: self._open_stream(name, stream_type, prompt, kwargs, call_deadline),
+            discard=lambda opened: self._close_stream(opened[1], opened[2]), lease=lease
+        )
+
+        start = time.monotonic()
+        finished = False
+        try:
+            if first is not None:
+                yield first
+            for chunk in chunks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise self._timed_out(call_type, timeout)
+                yield chunk
+            finished = True
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            # Failed part way: too late to fail over, but it counts against the model
+            self._failed(name, stream_type, start, deadline, e)
+            if deadline is not None and time.monotonic() >= deadline:
+                # Cut off by the client timeout at the deadline
+                raise self._timed_out(call_type, timeout) from e
+            raise
+        finally:
+            if not finished:
+                self._close_stream(response, chunks)
+
+    async def generate_async(self, call_type, prompt, timeout=None, hedge_gate=None, **kwargs):
+        """Async variant of generate, using generate_content_async; losing calls are cancelled"""
+        names = self.candidates(call_type, prompt)
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        hedge_after = self.hedge_delay(call_type)
+        pending = set()
+        launched = 0
+        last_error = None
+
+        def launch(release=None):
+            nonlocal launched
+            name = names[launched % len(names)]
+            launched += 1
+            task = asyncio.ensure_future(self._call_async(name, call_type, prompt, kwargs, deadline))
+            if release is not None:
+                task.add_done_callback(lambda _: release())
+            pending.add(task)
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self._next_wait(started, deadline, hedge_after),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise self._timed_out(call_type, timeout)
+                    hedge_after = None
+                    send, release = self._hedge(hedge_gate)
+                    if send:
+                        launch(release)
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        last_error = e
+
+                if not pending and deadline is not None and time.monotonic() >= deadline:
+                    raise self._timed_out(call_type, timeout)
+                if not pending and launched < len(names):
+                    self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """
+        Get per-model health and the failover, hedge and timeout counts
+
+        Returns:
+            dict: Failover, hedge and timeout counts and health per model
+        """
+        with self._lock:
+            names = list(self._health)
+        return {
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedgesSkipped": self.hedges_skipped,
+            "timeouts": self.timeouts,
+            "models": {name: self.health(name).snapshot() for name in names}
+        }
+
+
+def load_routes():
+    """Routing table from GEMINI_MODEL_ROUTES, or the defaults"""
+    raw = os.environ.get("GEMINI_MODEL_ROUTES")
+    if not raw:
+        return DEFAULT_ROUTES
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        print(f"Ignoring invalid GEMINI_MODEL_ROUTES: {str(e)}")
+        return DEFAULT_ROUTES
@@ -0,0 +1,242 @@
+"""
+Process-wide limit on concurrent outbound Gemini calls
+
+Callers beyond max_concurrent wait in a FIFO queue of at most max_queue
+entries; anything past that, or waiting longer than queue_timeout, is
+rejected with OverloadedError so overload sheds quickly instead of piling
+up. Sync (thread) and async (event loop) callers share the same slots.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class OverloadedError(Exception):
+    """Raised when no outbound slot is available"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SlotLease:
+    """
+    A held slot shared by a caller and the calls it starts
+
+    The slot goes back to the limiter when the last holder releases it, so
+    a call the caller stopped waiting for keeps its slot until it returns.
+    """
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def retain(self):
+        """Add a holder (e.g. a call about to start)"""
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        """Drop a holder, freeing the slot once none is left"""
+        with self._lock:
+            self._holders -= 1
+            last = self._holders == 0
+        if last:
+            self._limiter.release()
+
+
+class _SyncWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def grant(self):
+        self.event.set()
+
+
+class _AsyncWaiter:
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class OutboundLimiter:
+    """Counting semaphore with a bounded wait queue, usable from threads and coroutines"""
+
+    def __init__(self, max_concurrent=64, max_queue=256, queue_timeout=10.0):
+        """
+        Args:
+            max_concurrent (int): Calls allowed in flight at once
+            max_queue (int): Callers allowed to wait for a slot
+            queue_timeout (float): Seconds a caller waits before being rejected
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _try_enter(self, waiter):
+        """Take a slot or join the queue; returns True when a slot was taken"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise OverloadedError(
+                    f"Too many concurrent model calls ({self._active} active, {len(self._waiters)} queued)"
+                )
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter):
+        """Leave the queue after a timeout; returns True if a slot was granted meanwhile"""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                # Already handed a slot by release()
+                return True
+            self.timed_out += 1
+            return False
+
+    def release(self):
+        """Free a slot, handing it straight to the longest waiter if any"""
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                self.admitted += 1
+            else:
+                self._active -= 1
+                return
+        waiter.grant()
+
+    def try_acquire(self):
+        """
+        Take a slot only if one is free right now, without queueing
+
+        Returns:
+            bool: Whether a slot was taken
+        """
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Take a slot, blocking the current thread while queued
+
+        Args:
+            timeout (float): Maximum wait; defaults to queue_timeout
+
+        Raises:
+            OverloadedError: If the queue is full or the wait times out
+        """
+        waiter = _SyncWaiter()
+        if self._try_enter(waiter):
+            return
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        if not waiter.event.wait(timeout) and not self._abandon(waiter):
+            raise OverloadedError(f"Timed out after {timeout}s waiting for a model call slot")
+
+    async def acquire_async(self, timeout=None):
+        """
+        Take a slot without blocking the event loop
+
+        Args:
+            timeout (float): Maximum wait; defaults to queue_timeout
+
+        Raises:
+            OverloadedError: If the queue is full or the wait times out
+        """
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        if self._try_enter(waiter):
+            return
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if self._abandon(waiter):
+                # Granted just as we gave up: keep the slot only if we still want it
+                if isinstance(e, asyncio.CancelledError):
+                    self.release()
+                    raise
+                return
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise OverloadedError(f"Timed out after {timeout}s waiting for a model call slot")
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Context manager holding a slot for the duration of a sync call"""
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def leased_slot(self, timeout=None):
+        """Like slot, but yields a SlotLease so calls outliving the block keep the slot"""
+        self.acquire(timeout)
+        lease = SlotLease(self)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    @asynccontextmanager
+    async def async_slot(self, timeout=None):
+        """Async context manager holding a slot for the duration of an awaited call"""
+        await self.acquire_async(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        Get limiter counters
+
+        Returns:
+            dict: Active and queued calls, limits and outcome counters
+        """
+        with self._lock:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "maxConcurrent": self.max_concurrent,
+                "maxQueue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timedOut": self.timed_out
+            }
+
+
+def create_outbound_limiter():
+    """Build the limiter from GEMINI_MAX_CONCURRENCY, GEMINI_MAX_QUEUE and GEMINI_QUEUE_TIMEOUT"""
+    return OutboundLimiter(
+        max_concurrent=int(os.environ.get("GEMINI_MAX_CONCURRENCY", 64)),
+        max_queue=int(os.environ.get("GEMINI_MAX_QUEUE", 256)),
+        queue_timeout=float(os.environ.get("GEMINI_QUEUE_TIMEOUT", 10))
+    )
@@ -1,4 +1,17 @@
+import os
 from services.gemini_service import GeminiService
+from services.job_queue import QueueFullError, create_job_queue
+from services.quiz_engine import QuizScoringEngine
+from services.quiz_table import QuizTable
+from utils.metrics import FALLBACKS
+
+# How /api/quiz/analyze produces its analysis:
+#   gemini - local scoring plus a Gemini call (original behaviour)
+#   table  - lookup in the precomputed answer-space table, never calls Gemini
+#   tiered - local analysis when the scores are decisive, Gemini only for
+#            ambiguous profiles (confidence below QUIZ_CONFIDENCE_THRESHOLD)
+QUIZ_ANALYSIS_MODE = os.environ.get("QUIZ_ANALYSIS_MODE", "gemini").lower()
+QUIZ_CONFIDENCE_THRESHOLD = float(os.environ.get("QUIZ_CONFIDENCE_THRESHOLD", 0.5))
 
 class QuizAnalyzer:
     # Quiz questions with weights for different personas
@@ -86,55 +99,59 @@ class QuizAnalyzer:
         
         return public_questions
     
+    # Map persona names to full names
+    PERSONA_NAMES = {
+        "foodie": "Foodie",
+        "adventurer": "Adventurer",
+        "cultural": "Cultural Explorer",
+        "relaxer": "Relaxer",
+        "shopaholic": "Shopaholic"
+    }
+    
+    # Interests based on primary persona
+    PERSONA_INTERESTS = {
+        "foodie": ["local cuisine", "food markets", "cooking classes"],
+        "adventurer": ["outdoor activities", "hiking", "water sports"],
+        "cultural": ["museums", "historical sites", "local traditions"],
+        "relaxer": ["beaches", "spas", "scenic views"],
+        "shopaholic": ["markets", "malls", "local crafts"]
+    }
+    
+    # Preferred activities based on primary persona
+    PERSONA_ACTIVITIES = {
+        "foodie": ["trying local restaurants", "food tours", "visiting markets"],
+        "adventurer": ["hiking", "kayaking", "zip-lining"],
+        "cultural": ["visiting museums", "guided tours", "cultural performances"],
+        "relaxer": ["beach time", "spa treatments", "scenic drives"],
+        "shopaholic": ["shopping at markets", "visiting malls", "buying souvenirs"]
+    }
+    
     @staticmethod
-    def analyze_responses(responses):
+    def score_responses(responses):
         """
-        Analyze quiz responses to determine travel persona
+        Score quiz responses against the question weights
         
         Args:
             responses (dict): User's responses to quiz questions
             
         Returns:
-            dict: Analysis results
+            tuple: (persona_scores dict, budget_votes list, pace_preference or None)
         """
-        # First pass: Calculate weights for each persona
-        persona_scores = {
-            "foodie": 0,
-            "adventurer": 0,
-            "cultural": 0,
-            "relaxer": 0,
-            "shopaholic": 0
-        }
-        
-        budget_votes = []
-        pace_preference = None
+        return scoring_engine.score(responses)
+    
+    @staticmethod
+    def build_local_analysis(persona_scores, budget_votes, pace_preference):
+        """
+        Build the rule-based analysis from local scores
         
-        # Process each response
-        for question_id, answer_ids in responses.items():
-            # Make sure answer_ids is a list
-            if not isinstance(answer_ids, list):
-                answer_ids = [answer_ids]
-            
-            # Find the question
-            question = next((q for q in QuizAnalyzer.QUESTIONS if q["id"] == question_id), None)
-            if not question:
-                continue
+        Args:
+            persona_scores (dict): Score per persona
+            budget_votes (list): Budget levels voted for by the answers
+            pace_preference (str): Travel pace, if answered
             
-            # Process each selected option
-            for answer_id in answer_ids:
-                option = next((o for o in question["options"] if o["id"] == answer_id), None)
-                if not option or "weight" not in option:
-                    continue
-                
-                # Apply weights to personas
-                for persona, weight in option["weight"].items():
-                    if persona == "budget":
-                        budget_votes.append(weight)  # low, medium, high
-                    elif persona == "pace":
-                        pace_preference = weight  # fast, moderate, slow
-                    else:
-                        persona_scores[persona] = persona_scores.get(persona, 0) + weight
-        
+        Returns:
+            dict: Analysis in the same shape as the Gemini analysis
+        """
         # Determine primary and secondary personas
         sorted_personas = sorted(persona_scores.items(), key=lambda x: x[1], reverse=True)
         primary_persona = sorted_personas[0][0] if sorted_personas[0][1] > 0 else "cultural"
@@ -152,50 +169,259 @@ class QuizAnalyzer:
         else:
             budget_sensitivity = "medium"  # Default
         
-        # Get more detailed analysis from Gemini
-        gemini_analysis = GeminiService.analyze_quiz_responses(responses)
+        return {
+            "primaryPersona": QuizAnalyzer.PERSONA_NAMES.get(primary_persona, "Cultural Explorer"),
+            "secondaryPersona": QuizAnalyzer.PERSONA_NAMES.get(secondary_persona, "Foodie") if secondary_persona else None,
+            "budgetSensitivity": budget_sensitivity,
+            "interests": list(QuizAnalyzer.PERSONA_INTERESTS.get(primary_persona, ["sightseeing", "local cuisine"])),
+            "preferredActivities": list(QuizAnalyzer.PERSONA_ACTIVITIES.get(primary_persona, ["visiting landmarks", "trying local food"])),
+            "travelPace": pace_preference or "moderate"
+        }
+    
+    @staticmethod
+    def confidence(persona_scores, budget_votes, pace_preference):
+        """
+        How decisive the local scores are, from 0 (ambiguous) to 1
+        
+        Combines the gap between the primary and secondary persona, how
+        strongly the budget answers agree, and whether a pace was chosen.
+        
+        Args:
+            persona_scores (dict): Score per persona
+            budget_votes (list): Budget levels voted for by the answers
+            pace_preference (str): Travel pace, if answered
+            
+        Returns:
+            dict: Overall score and its components
+        """
+        ranked = sorted(persona_scores.values(), reverse=True)
+        top = ranked[0]
+        runner_up = max(ranked[1], 0) if len(ranked) > 1 else 0
+        persona_margin = (top - runner_up) / top if top > 0 else 0.0
+        
+        if budget_votes:
+            budget_agreement = max(budget_votes.count(level) for level in set(budget_votes)) / len(budget_votes)
+        else:
+            budget_agreement = 0.0
+        
+        pace_answered = 1.0 if pace_preference else 0.0
+        
+        score = 0.6 * persona_margin + 0.25 * budget_agreement + 0.15 * pace_answered
+        return {
+            "score": round(score, 4),
+            "personaMargin": round(persona_margin, 4),
+            "budgetAgreement": round(budget_agreement, 4),
+            "paceAnswered": bool(pace_preference)
+        }
+    
+    @staticmethod
+    def analyze_batch(responses_list):
+        """
+        Rule-based analysis of many response sets at once (no Gemini calls)
+        
+        Args:
+            responses_list (list): List of response dicts
+            
+        Returns:
+            list: One analysis dict per response set
+        """
+        return scoring_engine.analyze_batch(
+            responses_list,
+            QuizAnalyzer.PERSONA_NAMES,
+            QuizAnalyzer.PERSONA_INTERESTS,
+            QuizAnalyzer.PERSONA_ACTIVITIES
+        )
+    
+    @staticmethod
+    def _analyze_locally(responses, mode):
+        """
+        Resolve everything that doesn't need the model
+        
+        Args:
+            responses (dict): User's responses to quiz questions
+            mode (str): Analysis mode
+            
+        Returns:
+            tuple: (final result or None if Gemini is needed, local scores, confidence or None)
+        """
+        if mode == "table":
+            # Precomputed answer space: O(1) lookup, no model call
+            analysis = quiz_table.lookup(responses)
+            if analysis is not None:
+                return {
+                    "success": True,
+                    "analysis": analysis,
+                    "source": "table"
+                }, None, None
+            
+            # Non-canonical responses (duplicates, several answers to a single-choice question)
+            return {
+                "success": True,
+                "analysis": QuizAnalyzer.build_local_analysis(*QuizAnalyzer.score_responses(responses)),
+                "source": "local"
+            }, None, None
+        
+        # First pass: Calculate weights for each persona
+        local_scores = QuizAnalyzer.score_responses(responses)
+        
+        if mode == "tiered":
+            confidence = QuizAnalyzer.confidence(*local_scores)
+            
+            # A clear winner doesn't need the model to tell us what we already know
+            if confidence["score"] >= QUIZ_CONFIDENCE_THRESHOLD:
+                return {
+                    "success": True,
+                    "analysis": QuizAnalyzer.build_local_analysis(*local_scores),
+                    "source": "local",
+                    "confidence": confidence
+                }, local_scores, confidence
+            
+            return None, local_scores, confidence
         
-        # If Gemini analysis is successful, use it; otherwise, use our basic analysis
+        return None, local_scores, None
+    
+    @staticmethod
+    def _merge_gemini_analysis(gemini_analysis, local_scores, confidence):
+        """Use the Gemini analysis if it succeeded, otherwise our basic analysis"""
         if gemini_analysis["success"]:
             analysis = gemini_analysis["analysis"]
+            source = "gemini"
         else:
-            # Map persona names to full names
-            persona_map = {
-                "foodie": "Foodie",
-                "adventurer": "Adventurer",
-                "cultural": "Cultural Explorer",
-                "relaxer": "Relaxer",
-                "shopaholic": "Shopaholic"
-            }
+            FALLBACKS.labels("quiz_local_analysis").inc()
+            analysis = QuizAnalyzer.build_local_analysis(*local_scores)
+            source = "local"
+        
+        result = {
+            "success": True,
+            "analysis": analysis,
+            "source": source
+        }
+        if confidence is not None:
+            result["confidence"] = confidence
+        return result
+    
+    @staticmethod
+    def analyze_responses(responses, mode=None):
+        """
+        Analyze quiz responses to determine travel persona
+        
+        Args:
+            responses (dict): User's responses to quiz questions
+            mode (str): Analysis mode override (gemini, table or tiered);
+                defaults to QUIZ_ANALYSIS_MODE
             
-            # Create interests based on primary persona
-            interests_map = {
-                "foodie": ["local cuisine", "food markets", "cooking classes"],
-                "adventurer": ["outdoor activities", "hiking", "water sports"],
-                "cultural": ["museums", "historical sites", "local traditions"],
-                "relaxer": ["beaches", "spas", "scenic views"],
-                "shopaholic": ["markets", "malls", "local crafts"]
-            }
+        Returns:
+            dict: Analysis results
+        """
+        result, local_scores, confidence = QuizAnalyzer._analyze_locally(responses, mode or QUIZ_ANALYSIS_MODE)
+        if result is not None:
+            return result
+        
+        # Get more detailed analysis from Gemini
+        gemini_analysis = GeminiService.analyze_quiz_responses(responses)
+        return QuizAnalyzer._merge_gemini_analysis(gemini_analysis, local_scores, confidence)
+    
+    @staticmethod
+    async def analyze_responses_async(responses, mode=None):
+        """
+        Async variant of analyze_responses for the ASGI serving path
+        
+        Args:
+            responses (dict): User's responses to quiz questions
+            mode (str): Analysis mode override (gemini, table or tiered);
+                defaults to QUIZ_ANALYSIS_MODE
+            
+        Returns:
+            dict: Analysis results
+        """
+        result, local_scores, confidence = QuizAnalyzer._analyze_locally(responses, mode or QUIZ_ANALYSIS_MODE)
+        if result is not None:
+            return result
+        
+        gemini_analysis = await GeminiService.analyze_quiz_responses_async(responses)
+        return QuizAnalyzer._merge_gemini_analysis(gemini_analysis, local_scores, confidence)
+    
+    @staticmethod
+    def analyze_deferred(responses, callback_url=None, mode=None):
+        """
+        Return the local analysis now and queue the Gemini enrichment
+        
+        In table mode, and in tiered mode when the local scores are
+        decisive, the local result is final and nothing is queued.
+        
+        Args:
+            responses (dict): User's responses to quiz questions
+            callback_url (str): Optional URL the finished job is POSTed to
+                (must be on the job queue's callback allowlist)
+            mode (str): Analysis mode override (gemini, table or tiered);
+                defaults to QUIZ_ANALYSIS_MODE
             
-            # Create preferred activities based on primary persona
-            activities_map = {
-                "foodie": ["trying local restaurants", "food tours", "visiting markets"],
-                "adventurer": ["hiking", "kayaking", "zip-lining"],
-                "cultural": ["visiting museums", "guided tours", "cultural performances"],
-                "relaxer": ["beach time", "spa treatments", "scenic drives"],
-                "shopaholic": ["shopping at markets", "visiting malls", "buying souvenirs"]
-            }
+        Returns:
+            dict: Local analysis plus the job id to poll (None if no
+            enrichment was queued)
             
-            analysis = {
-                "primaryPersona": persona_map.get(primary_persona, "Cultural Explorer"),
-                "secondaryPersona": persona_map.get(secondary_persona, "Foodie") if secondary_persona else None,
-                "budgetSensitivity": budget_sensitivity,
-                "interests": interests_map.get(primary_persona, ["sightseeing", "local cuisine"]),
-                "preferredActivities": activities_map.get(primary_persona, ["visiting landmarks", "trying local food"]),
-                "travelPace": pace_preference or "moderate"
-            }
+        Raises:
+            CallbackNotAllowedError: If callback_url is not allowed
+        """
+        if callback_url:
+            enrichment_queue.check_callback_url(callback_url)
         
-        return {
+        final, local_scores, confidence = QuizAnalyzer._analyze_locally(responses, mode or QUIZ_ANALYSIS_MODE)
+        if final is not None:
+            return dict(final, jobId=None)
+        
+        result = {
             "success": True,
-            "analysis": analysis
-        }
\ No newline at end of file
+            "analysis": QuizAnalyzer.build_local_analysis(*local_scores),
+            "source": "local",
+            "jobId": None
+        }
+        if confidence is not None:
+            result["confidence"] = confidence
+        
+        try:
+            result["jobId"] = enrichment_queue.submit(
+                QuizAnalyzer._enrich, responses, callback_url=callback_url
+            )
+        except QueueFullError as e:
+            print(f"Skipping quiz enrichment: {str(e)}")
+        except Exception as e:
+            # Job backend unavailable: the local persona is still a good answer
+            print(f"Error queueing quiz enrichment: {str(e)}")
+        
+        return result
+    
+    @staticmethod
+    def _enrich(responses):
+        """Job body: Gemini analysis, failing the job if Gemini fails"""
+        gemini_analysis = GeminiService.analyze_quiz_responses(responses)
+        if not gemini_analysis["success"]:
+            raise RuntimeError(gemini_analysis.get("error", "Gemini analysis failed"))
+        
+        return {
+            "analysis": gemini_analysis["analysis"],
+            "source": "gemini"
+        }
+
+
+# Weights compiled into matrices once, at import
+scoring_engine = QuizScoringEngine(QuizAnalyzer.QUESTIONS)
+
+# Precomputed answer-space table, built at deploy time by scripts/build_quiz_table.py
+quiz_table = QuizTable(QuizAnalyzer)
+
+
+def load_quiz_table():
+    """
+    Load the answer-space table at startup when table mode is on,
+    rebuilding it (unenriched) if it is missing or stale
+
+    Raises:
+        QuizTableError: If the table can't be built, so the worker fails to
+            start instead of failing its first quiz
+    """
+    if QUIZ_ANALYSIS_MODE == "table":
+        quiz_table.load_or_build()
+
+# Background workers for deferred Gemini enrichment
+enrichment_queue = create_job_queue("QUIZ_ENRICH")
\ No newline at end of file
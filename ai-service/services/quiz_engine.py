@@ -0,0 +1,176 @@
+"""
+Compiled quiz scoring engine
+
+The question weights are compiled once into matrices indexed by option:
+a persona weight matrix, a budget vote matrix and a pace code per option.
+A set of responses becomes a one-hot count vector over options, so scoring
+is a dot product, and a batch of responses is a single matrix product.
+"""
+import numpy as np
+
+PERSONAS = ["foodie", "adventurer", "cultural", "relaxer", "shopaholic"]
+BUDGET_LEVELS = ["low", "medium", "high"]
+PACES = ["fast", "moderate", "slow"]
+
+# Must match QuizAnalyzer.build_local_analysis
+DEFAULT_PERSONA = PERSONAS.index("cultural")
+DEFAULT_BUDGET = "medium"
+DEFAULT_PACE = "moderate"
+
+
+class QuizScoringEngine:
+    """Option-by-persona weight matrix compiled from quiz questions"""
+
+    def __init__(self, questions):
+        """
+        Args:
+            questions (list): QuizAnalyzer.QUESTIONS
+        """
+        self.option_index = {}
+        persona_rows = []
+        budget_rows = []
+        pace_codes = []
+
+        for question in questions:
+            columns = self.option_index.setdefault(question["id"], {})
+            for option in question["options"]:
+                columns[option["id"]] = len(persona_rows)
+                weight = option.get("weight", {})
+
+                persona_rows.append([weight.get(p, 0) for p in PERSONAS])
+                budget_rows.append([1 if weight.get("budget") == b else 0 for b in BUDGET_LEVELS])
+                pace_codes.append(PACES.index(weight["pace"]) if "pace" in weight else -1)
+
+        self.persona_weights = np.array(persona_rows, dtype=np.int64)
+        self.budget_weights = np.array(budget_rows, dtype=np.int64)
+        self.pace_codes = np.array(pace_codes, dtype=np.int64)
+        self._pace_list = pace_codes
+        self.num_options = len(persona_rows)
+
+    def columns(self, responses):
+        """
+        Option columns selected by a set of responses
+
+        Unknown questions and options are skipped; repeated answers appear
+        once per occurrence, as in the original scoring loop.
+
+        Args:
+            responses (dict): User's responses to quiz questions
+
+        Returns:
+            tuple: (list of columns, pace code of the last pace answer or -1)
+        """
+        selected = []
+        pace = -1
+
+        for question_id, answer_ids in responses.items():
+            columns = self.option_index.get(question_id)
+            if columns is None:
+                continue
+            if not isinstance(answer_ids, list):
+                answer_ids = [answer_ids]
+
+            for answer_id in answer_ids:
+                column = columns.get(answer_id) if isinstance(answer_id, str) else None
+                if column is None:
+                    continue
+                selected.append(column)
+                if self._pace_list[column] >= 0:
+                    pace = self._pace_list[column]
+
+        return selected, pace
+
+    def score(self, responses):
+        """
+        Score one set of responses
+
+        Args:
+            responses (dict): User's responses to quiz questions
+
+        Returns:
+            tuple: (persona_scores dict, budget_votes list, pace_preference or None)
+        """
+        selected, pace = self.columns(responses)
+        counts = np.bincount(selected, minlength=self.num_options) if selected else np.zeros(self.num_options, dtype=np.int64)
+        persona_scores = counts @ self.persona_weights
+        budget_counts = counts @ self.budget_weights
+
+        budget_votes = []
+        for level, count in zip(BUDGET_LEVELS, budget_counts.tolist()):
+            budget_votes.extend([level] * count)
+
+        return (
+            dict(zip(PERSONAS, persona_scores.tolist())),
+            budget_votes,
+            PACES[pace] if pace >= 0 else None
+        )
+
+    def score_batch(self, responses_list):
+        """
+        Score many sets of responses with one matrix product
+
+        Args:
+            responses_list (list): List of response dicts
+
+        Returns:
+            tuple: (persona scores (n, personas), budget counts (n, levels),
+                pace codes (n,)) as NumPy arrays
+        """
+        rows = []
+        columns = []
+        paces = np.empty(len(responses_list), dtype=np.int64)
+        for row, responses in enumerate(responses_list):
+            selected, paces[row] = self.columns(responses)
+            rows.extend([row] * len(selected))
+            columns.extend(selected)
+
+        # Scatter all selections into the count matrix in one call
+        counts = np.zeros((len(responses_list), self.num_options), dtype=np.int64)
+        np.add.at(counts, (rows, columns), 1)
+
+        return counts @ self.persona_weights, counts @ self.budget_weights, paces
+
+    def analyze_batch(self, responses_list, persona_names, interests, activities):
+        """
+        Rule-based analyses for many sets of responses
+
+        Produces the same result as QuizAnalyzer.build_local_analysis per row,
+        with persona ranking and budget votes resolved on whole arrays.
+
+        Args:
+            responses_list (list): List of response dicts
+            persona_names (dict): Persona key to display name
+            interests (dict): Persona key to interests
+            activities (dict): Persona key to preferred activities
+
+        Returns:
+            list: One analysis dict per input row
+        """
+        if not responses_list:
+            return []
+
+        scores, budget_counts, paces = self.score_batch(responses_list)
+        rows = np.arange(len(responses_list))
+
+        # Stable sort keeps PERSONAS order between equal scores, like sorted()
+        ranking = np.argsort(-scores, axis=1, kind="stable")
+        primary = np.where(scores[rows, ranking[:, 0]] > 0, ranking[:, 0], DEFAULT_PERSONA)
+        secondary = np.where(scores[rows, ranking[:, 1]] > 0, ranking[:, 1], -1)
+
+        # argmax returns the first maximum, matching max() over low/medium/high
+        has_budget = budget_counts.sum(axis=1) > 0
+        budget = np.argmax(budget_counts, axis=1)
+
+        analyses = []
+        for p, s, b, voted, pace in zip(primary.tolist(), secondary.tolist(), budget.tolist(),
+                                        has_budget.tolist(), paces.tolist()):
+            primary_key = PERSONAS[p]
+            analyses.append({
+                "primaryPersona": persona_names[primary_key],
+                "secondaryPersona": persona_names[PERSONAS[s]] if s >= 0 else None,
+                "budgetSensitivity": BUDGET_LEVELS[b] if voted else DEFAULT_BUDGET,
+                "interests": list(interests[primary_key]),
+                "preferredActivities": list(activities[primary_key]),
+                "travelPace": PACES[pace] if pace >= 0 else DEFAULT_PACE
+            })
+        return analyses
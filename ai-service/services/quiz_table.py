@@ -0,0 +1,361 @@
+"""
+Precomputed lookup table over the whole quiz answer space
+
+Every canonical combination of answers to QuizAnalyzer.QUESTIONS is given a
+mixed-radix index: a multi-select question contributes a bitmask of its
+options, a single-select question contributes 0 (unanswered) or 1 + the
+option position. The table stores, per index, the local persona scores and
+the id of its analysis profile. Profiles are the distinct analyses
+(primary/secondary persona, budget, pace); there are only a few hundred,
+so each can be enriched with one Gemini call at build time.
+
+File layout:
+    MAGIC | uint32 header length | JSON header | records
+where each record is RECORD_FORMAT (profile id + one score per persona).
+
+The table is a build artifact: scripts/build_quiz_table.py writes it at
+deploy time (with --enrich, including the Gemini analyses). A worker in
+table mode that finds it missing or built for other weights rebuilds it
+at startup, without enrichment (load_or_build); workers starting together
+build it once, under a file lock.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b"GHQT1\n"
+RECORD_FORMAT = "<H5b"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+# Value ranges of the record fields (uint16 profile id, int8 scores)
+MAX_PROFILES = 1 << 16
+SCORE_RANGE = (-128, 127)
+PERSONAS = ["foodie", "adventurer", "cultural", "relaxer", "shopaholic"]
+
+DEFAULT_TABLE_PATH = os.environ.get(
+    "QUIZ_TABLE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "quiz_table.bin")
+)
+
+
+def weights_signature(questions):
+    """
+    Hash of the question ids, options and weights
+
+    Args:
+        questions (list): QuizAnalyzer.QUESTIONS
+
+    Returns:
+        str: Hex digest that changes whenever the table would change
+    """
+    shape = [
+        [q["id"], bool(q.get("allowMultiple")), [[o["id"], o.get("weight", {})] for o in q["options"]]]
+        for q in questions
+    ]
+    encoded = json.dumps(shape, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class QuizTableError(Exception):
+    """The table file is missing, malformed, built for other weights, or can't hold the scores"""
+
+
+class QuizTable:
+    """Answer-space table for a quiz analyzer class"""
+
+    def __init__(self, analyzer, path=None):
+        """
+        Args:
+            analyzer: Class providing QUESTIONS, score_responses and build_local_analysis
+            path (str): Table file; defaults to QUIZ_TABLE_PATH
+        """
+        self.analyzer = analyzer
+        self.path = path or DEFAULT_TABLE_PATH
+        self._lock = threading.Lock()
+        self._header = None
+        self._records = None
+
+    # -- indexing -----------------------------------------------------------
+
+    def _radices(self):
+        """Radix of each question's digit in the table index"""
+        return [
+            (1 << len(q["options"])) if q.get("allowMultiple") else len(q["options"]) + 1
+            for q in self.analyzer.QUESTIONS
+        ]
+
+    def size(self):
+        """Number of canonical answer combinations"""
+        total = 1
+        for radix in self._radices():
+            total *= radix
+        return total
+
+    def index_of(self, responses):
+        """
+        Table index of a set of responses
+
+        Args:
+            responses (dict): User's responses to quiz questions
+
+        Returns:
+            int or None: Index, or None if the responses are not canonical
+            (duplicate answers, several answers to a single-choice question).
+            Unknown questions and options are ignored, as in scoring.
+        """
+        index = 0
+        for question, radix in zip(self.analyzer.QUESTIONS, self._radices()):
+            answer_ids = responses.get(question["id"], [])
+            if not isinstance(answer_ids, list):
+                answer_ids = [answer_ids]
+
+            positions = {o["id"]: i for i, o in enumerate(question["options"])}
+            selected = [positions[a] for a in answer_ids if a in positions]
+
+            if question.get("allowMultiple"):
+                digit = 0
+                for position in selected:
+                    if digit & (1 << position):
+                        return None
+                    digit |= 1 << position
+            else:
+                if len(selected) > 1:
+                    return None
+                digit = selected[0] + 1 if selected else 0
+
+            index = index * radix + digit
+        return index
+
+    def responses_at(self, index):
+        """
+        Canonical responses for a table index (inverse of index_of)
+
+        Args:
+            index (int): Table index
+
+        Returns:
+            dict: Responses, with unanswered questions omitted
+        """
+        digits = []
+        for radix in reversed(self._radices()):
+            index, digit = divmod(index, radix)
+            digits.append(digit)
+        digits.reverse()
+
+        responses = {}
+        for question, digit in zip(self.analyzer.QUESTIONS, digits):
+            options = question["options"]
+            if question.get("allowMultiple"):
+                selected = [o["id"] for i, o in enumerate(options) if digit & (1 << i)]
+                if selected:
+                    responses[question["id"]] = selected
+            elif digit:
+                responses[question["id"]] = options[digit - 1]["id"]
+        return responses
+
+    # -- build --------------------------------------------------------------
+
+    def build(self, enrich=None):
+        """
+        Enumerate the answer space and write the table file
+
+        Args:
+            enrich (callable): Optional function taking representative
+                responses and returning an enriched analysis dict (or None
+                to keep the local one); called once per profile
+
+        Returns:
+            dict: Build summary
+
+        Raises:
+            QuizTableError: If a score or the profile count doesn't fit the
+                record format (the weights need a wider RECORD_FORMAT)
+        """
+        records = bytearray(self.size() * RECORD_SIZE)
+        profiles = []
+        profile_ids = {}
+        representatives = []
+
+        for index in range(self.size()):
+            responses = self.responses_at(index)
+            persona_scores, budget_votes, pace = self.analyzer.score_responses(responses)
+            analysis = self.analyzer.build_local_analysis(persona_scores, budget_votes, pace)
+
+            profile_key = (analysis["primaryPersona"], analysis["secondaryPersona"],
+                           analysis["budgetSensitivity"], analysis["travelPace"])
+            profile_id = profile_ids.get(profile_key)
+            if profile_id is None:
+                profile_id = profile_ids[profile_key] = len(profiles)
+                if profile_id >= MAX_PROFILES:
+                    raise QuizTableError(f"More than {MAX_PROFILES} analysis profiles don't fit the table record")
+                profiles.append(analysis)
+                representatives.append(responses)
+
+            for persona in PERSONAS:
+                if not SCORE_RANGE[0] <= persona_scores[persona] <= SCORE_RANGE[1]:
+                    raise QuizTableError(
+                        f"Score {persona_scores[persona]} for {persona} (responses {responses}) is outside "
+                        f"{SCORE_RANGE[0]}..{SCORE_RANGE[1]}; widen RECORD_FORMAT for these weights"
+                    )
+            struct.pack_into(RECORD_FORMAT, records, index * RECORD_SIZE,
+                             profile_id, *(persona_scores[p] for p in PERSONAS))
+
+        enriched = 0
+        if enrich is not None:
+            for profile_id, responses in enumerate(representatives):
+                analysis = enrich(responses)
+                if analysis:
+                    profiles[profile_id] = analysis
+                    enriched += 1
+
+        header = {
+            "signature": weights_signature(self.analyzer.QUESTIONS),
+            "radices": self._radices(),
+            "personas": PERSONAS,
+            "profiles": profiles
+        }
+        self._write(header, records)
+
+        return {
+            "path": self.path,
+            "combinations": self.size(),
+            "profiles": len(profiles),
+            "enriched": enriched,
+            "bytes": os.path.getsize(self.path)
+        }
+
+    def _write(self, header, records):
+        """Write the table atomically so concurrent readers never see a partial file"""
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(encoded)))
+            f.write(encoded)
+            f.write(records)
+        os.replace(tmp_path, self.path)
+
+    # -- load / lookup ------------------------------------------------------
+
+    def _read(self):
+        """Map the table file; returns (header, records) or None if missing or malformed"""
+        try:
+            with open(self.path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if data[:len(MAGIC)] != MAGIC:
+            return None
+        offset = len(MAGIC)
+        try:
+            (header_length,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            header = json.loads(data[offset:offset + header_length])
+        except (struct.error, ValueError):
+            return None
+        records = memoryview(data)[offset + header_length:]
+        return header, records
+
+    def load(self):
+        """
+        Load the table built by scripts/build_quiz_table.py
+
+        Raises:
+            QuizTableError: If the file is missing, malformed or built for
+                other weights
+        """
+        with self._lock:
+            if self._header is not None:
+                return
+
+            loaded = self._read()
+            if loaded is None:
+                raise QuizTableError(
+                    f"Quiz table {self.path} is missing or malformed; build it with scripts/build_quiz_table.py"
+                )
+            if loaded[0].get("signature") != weights_signature(self.analyzer.QUESTIONS):
+                raise QuizTableError(
+                    f"Quiz table {self.path} was built for other quiz weights; rebuild it with scripts/build_quiz_table.py"
+                )
+            if len(loaded[1]) != self.size() * RECORD_SIZE:
+                raise QuizTableError(f"Quiz table {self.path} has the wrong number of records; rebuild it")
+
+            self._header, self._records = loaded
+
+    def load_or_build(self):
+        """
+        Load the table, rebuilding it first if it is missing or stale
+
+        The rebuild uses local scoring only: run scripts/build_quiz_table.py
+        --enrich to get the Gemini analyses back. The first worker to get
+        the lock on <path>.lock builds; the others wait for it and load
+        its table.
+
+        Raises:
+            QuizTableError: If the weights don't fit the record format
+        """
+        try:
+            self.load()
+            return
+        except QuizTableError as e:
+            print(f"Rebuilding the quiz table without Gemini enrichment: {str(e)}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    # Another worker may have rebuilt it while we waited
+                    self.load()
+                    return
+                except QuizTableError:
+                    pass
+                summary = self.build()
+                print(f"Rebuilt quiz table {self.path}: {summary['combinations']} combinations, {summary['profiles']} profiles")
+                self.load()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def lookup(self, responses):
+        """
+        Analysis for a set of responses
+
+        Args:
+            responses (dict): User's responses to quiz questions
+
+        Returns:
+            dict or None: Analysis, or None for non-canonical responses
+
+        Raises:
+            QuizTableError: If the table can't be loaded
+        """
+        index = self.index_of(responses)
+        if index is None:
+            return None
+
+        self.load()
+        profile_id = struct.unpack_from(RECORD_FORMAT, self._records, index * RECORD_SIZE)[0]
+        return json.loads(json.dumps(self._header["profiles"][profile_id]))
+
+    def scores(self, responses):
+        """
+        Precomputed persona scores for a set of responses
+
+        Args:
+            responses (dict): User's responses to quiz questions
+
+        Returns:
+            dict or None: Score per persona, or None for non-canonical responses
+        """
+        index = self.index_of(responses)
+        if index is None:
+            return None
+
+        self.load()
+        values = struct.unpack_from(RECORD_FORMAT, self._records, index * RECORD_SIZE)[1:]
+        return dict(zip(self._header["personas"], values))
@@ -0,0 +1,256 @@
+"""
+Deadlines and circuit breaking for model calls
+
+A caller can send its remaining patience in the X-Request-Timeout-Ms
+header; the deadline is kept in a context variable for the rest of the
+request, so every model call made on its behalf (including calls handed
+to worker threads through bind_context) stops waiting once it has passed.
+Without a header each call gets GEMINI_CALL_TIMEOUT seconds.
+
+The circuit breaker watches the outcome of recent model calls; when the
+error rate spikes it opens and calls fail fast with CircuitOpenError, so
+callers go straight to their local fallback instead of waiting out a
+degraded upstream. After reset_timeout one probe call is let through and
+its outcome closes or re-opens the circuit.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# Longest any single model call is waited for, deadline or not
+DEFAULT_CALL_TIMEOUT = float(os.environ.get("GEMINI_CALL_TIMEOUT", 9.0))
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the caller's deadline has passed"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls are short-circuited by an open breaker"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_timeout_header(value):
+    """
+    Parse a timeout header value
+
+    Args:
+        value (str): Milliseconds, as sent in X-Request-Timeout-Ms
+
+    Returns:
+        float or None: Seconds, or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        milliseconds = float(value)
+    except ValueError:
+        return None
+    return milliseconds / 1000 if milliseconds > 0 else None
+
+
+def set_deadline(seconds):
+    """
+    Start a deadline for the current context
+
+    An enclosing deadline that expires sooner is kept.
+
+    Args:
+        seconds (float): Time allowed from now, or None for no deadline
+
+    Returns:
+        Token to pass to reset_deadline
+    """
+    deadline = _deadline.get()
+    if seconds is not None:
+        requested = time.monotonic() + seconds
+        deadline = requested if deadline is None else min(deadline, requested)
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    """Restore the deadline that was in place before set_deadline"""
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Run a block under a deadline of the given number of seconds"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def time_remaining(limit=None):
+    """
+    Time a model call may take
+
+    Args:
+        limit (float): Upper bound; defaults to DEFAULT_CALL_TIMEOUT
+
+    Returns:
+        float: Seconds until the deadline, capped at the limit
+
+    Raises:
+        DeadlineExceededError: If the deadline has already passed
+    """
+    limit = DEFAULT_CALL_TIMEOUT if limit is None else limit
+    deadline = _deadline.get()
+    if deadline is None:
+        return limit
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededError("Request deadline exceeded before the model call")
+    return min(remaining, limit)
+
+
+def deadline_passed():
+    """Whether the current request has a deadline and it has run out"""
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def bind_context(fn):
+    """Wrap fn to run in a copy of the current context (deadline included), e.g. on a pool thread"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+async def run_blocking(fn, *args):
+    """Run a blocking call (session store, job backend, SQLite) on a worker thread, off the event loop"""
+    return await sync_to_async(fn, thread_sensitive=False)(*args)
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker with a single half-open probe"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, max_error_rate=0.5, min_calls=10, window=20, reset_timeout=30.0):
+        """
+        Args:
+            name (str): Name used in errors and stats
+            max_error_rate (float): Error rate over the window that opens the circuit
+            min_calls (int): Calls needed in the window before it can open
+            window (int): Most recent calls considered
+            reset_timeout (float): Seconds the circuit stays open before a probe
+        """
+        self.name = name
+        self.max_error_rate = max_error_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.short_circuited = 0
+
+    def allow(self):
+        """
+        Check that a call may go ahead
+
+        Raises:
+            CircuitOpenError: If the circuit is open (or a probe is already running)
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            wait = self._opened_at + self.reset_timeout - time.monotonic()
+            if self._state == self.OPEN and wait <= 0:
+                self._state = self.HALF_OPEN
+
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+
+            self.short_circuited += 1
+            raise CircuitOpenError(
+                f"Circuit {self.name} is open after repeated failures",
+                retry_after=max(1, int(wait + 0.999))
+            )
+
+    def record(self, ok):
+        """Record the outcome of an allowed call"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+
+            self._outcomes.append(ok)
+            errors = sum(1 for outcome in self._outcomes if not outcome)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and errors / len(self._outcomes) > self.max_error_rate):
+                self._trip()
+
+    def cancel(self):
+        """Forget an allowed call that ended without an outcome (e.g. the caller went away)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._opened_at + self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def stats(self):
+        """
+        Get breaker state and counters
+
+        Returns:
+            dict: State, recent error rate and trip/short-circuit counts
+        """
+        state = self.state
+        with self._lock:
+            outcomes = list(self._outcomes)
+        errors = sum(1 for outcome in outcomes if not outcome)
+        return {
+            "state": state,
+            "recentCalls": len(outcomes),
+            "errorRate": round(errors / len(outcomes), 4) if outcomes else 0.0,
+            "opened": self.opened,
+            "shortCircuited": self.short_circuited
+        }
+
+
+def create_circuit_breaker(name):
+    """Build a breaker from GEMINI_BREAKER_ERROR_RATE, GEMINI_BREAKER_MIN_CALLS and GEMINI_BREAKER_RESET"""
+    return CircuitBreaker(
+        name,
+        max_error_rate=float(os.environ.get("GEMINI_BREAKER_ERROR_RATE", 0.5)),
+        min_calls=int(os.environ.get("GEMINI_BREAKER_MIN_CALLS", 10)),
+        reset_timeout=float(os.environ.get("GEMINI_BREAKER_RESET", 30))
+    )
@@ -0,0 +1,195 @@
+"""
+Offline stand-in for the Gemini model
+
+Selected with GEMINI_BACKEND=stub. Replies are canned per prompt kind
+(quiz analysis, chat answer, follow-up suggestions, fused JSON), so every
+parsing path of GeminiService is exercised, while latency, error rate and
+streaming are configurable:
+
+    GEMINI_STUB_LATENCY     fixed:0.8 | uniform:0.3:1.2 | lognormal:0.8:0.4
+                            (seconds; lognormal takes the median and sigma)
+    GEMINI_STUB_ERROR_RATE  fraction of calls that fail (0-1)
+    GEMINI_STUB_CHUNKS      chunks a streamed answer is split into
+    GEMINI_STUB_SEED        seed of the latency/error draws
+
+Like the Gemini client, a call given request_options={"timeout": s}
+fails once s seconds have passed instead of running to the end.
+
+Draws come from one seeded generator, so a single-threaded run is fully
+reproducible and concurrent runs reproduce the same distribution.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+
+QUIZ_REPLY = """```json
+{
+  "primaryPersona": "Foodie",
+  "secondaryPersona": "Cultural Explorer",
+  "interests": ["street food", "cooking classes", "local markets"],
+  "budgetSensitivity": "medium",
+  "preferredActivities": ["food tours", "heritage walks"],
+  "travelPace": "moderate"
+}
+```"""
+
+CHAT_REPLY = (
+    "Namaste! October to March is the best time to visit Goa, when the weather is "
+    "pleasant and the beaches are at their liveliest. North Goa (Baga, Anjuna) is "
+    "great for nightlife and shacks, while South Goa (Palolem, Agonda) is calmer. "
+    "Do try a fish thali and bebinca, and rent a scooter to explore at your own pace. "
+    "Monsoon (June to September) is lush and quiet, with lower prices but rough seas."
+)
+
+SUGGESTIONS = ["Where should I stay?", "What should I eat?", "Is it safe at night?"]
+
+
+class StubModelError(Exception):
+    """Injected model failure"""
+
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec
+
+    Args:
+        spec (str): fixed:<s>, uniform:<low>:<high> or lognormal:<median>:<sigma>
+
+    Returns:
+        callable: random.Random -> latency in seconds
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(":") if v]
+
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubStream:
+    """Iterable of reply chunks, delivered at the model's pace"""
+
+    def __init__(self, text, chunks, latency, fail, timeout=None):
+        size = max(1, math.ceil(len(text) / chunks))
+        self._chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self._delay = latency / len(self._chunks)
+        self._fail = fail
+        self._timeout = timeout
+        self.closed = False
+
+    def close(self):
+        """Stop delivering chunks"""
+        self.closed = True
+
+    def __iter__(self):
+        started = time.monotonic()
+        for index, chunk in enumerate(self._chunks):
+            if self.closed:
+                return
+            if self._timeout is not None and time.monotonic() - started + self._delay > self._timeout:
+                time.sleep(max(0.0, started + self._timeout - time.monotonic()))
+                raise StubModelError(f"Stub model stream timed out after {self._timeout:.2f}s")
+            time.sleep(self._delay)
+            if self._fail and index == len(self._chunks) // 2:
+                raise StubModelError("Stub model stream interrupted")
+            yield _Reply(chunk)
+
+
+class StubModel:
+    """Model object with the generate_content surface GeminiService uses"""
+
+    def __init__(self, name="stub", latency="fixed:0.8", error_rate=0.0, chunks=8, seed=0):
+        """
+        Args:
+            name (str): Model name (reported only)
+            latency (str or callable): Distribution spec (see parse_latency)
+                or a callable returning seconds
+            error_rate (float): Fraction of calls that raise StubModelError
+            chunks (int): Chunks per streamed reply
+            seed (int): Seed of the latency and error draws
+        """
+        self.name = name
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.chunks = chunks
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @staticmethod
+    def reply_for(prompt):
+        """Canned reply matching the kind of prompt"""
+        if "travel persona" in prompt:
+            return QUIZ_REPLY
+        if '"suggestions"' in prompt:
+            return json.dumps({"response": CHAT_REPLY, "suggestions": SUGGESTIONS})
+        if "follow-up questions" in prompt:
+            return json.dumps(SUGGESTIONS)
+        return CHAT_REPLY
+
+    def _draw(self):
+        """Latency and failure of the next call"""
+        with self._lock:
+            self.calls += 1
+            latency = max(0.0, self.latency(self._rng))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return latency, fail
+
+    @staticmethod
+    def _timeout(request_options):
+        return (request_options or {}).get("timeout")
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        latency, fail = self._draw()
+        timeout = self._timeout(request_options)
+        if stream:
+            return StubStream(self.reply_for(prompt), self.chunks, latency, fail, timeout)
+
+        if timeout is not None and timeout < latency:
+            time.sleep(timeout)
+            raise StubModelError(f"Stub model call timed out after {timeout:.2f}s")
+        time.sleep(latency)
+        if fail:
+            raise StubModelError("Stub model call failed")
+        return _Reply(self.reply_for(prompt))
+
+    async def generate_content_async(self, prompt, request_options=None, **kwargs):
+        latency, fail = self._draw()
+        timeout = self._timeout(request_options)
+        if timeout is not None and timeout < latency:
+            await asyncio.sleep(timeout)
+            raise StubModelError(f"Stub model call timed out after {timeout:.2f}s")
+        await asyncio.sleep(latency)
+        if fail:
+            raise StubModelError("Stub model call failed")
+        return _Reply(self.reply_for(prompt))
+
+
+def create_stub_factory():
+    """Model factory building StubModels from the GEMINI_STUB_* settings"""
+    latency = os.environ.get("GEMINI_STUB_LATENCY", "lognormal:0.8:0.4")
+    error_rate = float(os.environ.get("GEMINI_STUB_ERROR_RATE", 0))
+    chunks = int(os.environ.get("GEMINI_STUB_CHUNKS", 8))
+    seed = int(os.environ.get("GEMINI_STUB_SEED", 0))
+
+    def factory(name):
+        return StubModel(name, latency=latency, error_rate=error_rate, chunks=chunks, seed=seed)
+
+    return factory
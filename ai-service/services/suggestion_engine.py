@@ -0,0 +1,202 @@
+"""
+Local follow-up suggestion engine
+
+Proposes the follow-up questions shown under a chatbot answer without a
+model call. The question's intent (food, safety, transport...) and
+destination are detected with keyword rules; the next likely intents are
+ranked with intent co-occurrence statistics mined from chat logs (see
+scripts/mine_suggestion_stats.py), falling back to built-in priors; each
+chosen intent is rendered from a curated template bank.
+"""
+import json
+import os
+import re
+
+from services.answer_index import content_tokens, similarity
+from utils.cache import normalize_query
+
+# Keywords (single words or phrases) signalling each intent
+INTENT_KEYWORDS = {
+    "food": ["eat", "food", "foods", "restaurant", "restaurants", "cuisine", "dish", "dishes", "lunch",
+             "dinner", "breakfast", "street food", "vegetarian", "veg", "snacks", "cafe", "cafes"],
+    "safety": ["safe", "safety", "scam", "scams", "crime", "danger", "dangerous", "solo", "women", "night"],
+    "transport": ["bus", "train", "metro", "taxi", "cab", "auto", "rickshaw", "flight", "airport",
+                  "get around", "transport", "travel from", "reach", "commute", "drive", "scooter"],
+    "budget": ["cost", "costs", "budget", "cheap", "price", "prices", "money", "expensive", "afford", "spend"],
+    "weather": ["weather", "season", "best time", "rain", "monsoon", "winter", "summer", "hot", "cold"],
+    "packing": ["pack", "packing", "wear", "clothes", "carry", "luggage"],
+    "stay": ["hotel", "hotels", "stay", "hostel", "hostels", "homestay", "resort", "accommodation"],
+    "destination": ["visit", "places", "see", "attractions", "sightseeing", "things to do", "explore",
+                    "itinerary", "days", "trip", "beach", "beaches", "temple", "temples", "fort", "forts"]
+}
+
+# Follow-up templates per intent; {destination} is filled when known
+TEMPLATES = {
+    "food": ["What dishes is {destination} famous for?", "Where can I find good street food?",
+             "Any vegetarian-friendly places to eat?"],
+    "safety": ["Is {destination} safe for solo travelers?", "Any common scams to watch out for?",
+               "Is it safe to go out at night?"],
+    "transport": ["How do I get around {destination}?", "Are taxis or autos better here?",
+                  "How do I get there from the airport?"],
+    "budget": ["How much should I budget per day?", "How can I save money in {destination}?",
+               "Are there any free things to do?"],
+    "weather": ["What's the best time to visit {destination}?", "What's the weather like this month?",
+                "Do I need to plan around the monsoon?"],
+    "packing": ["What should I pack for {destination}?", "Is there a dress code for temples?",
+                "What shoes should I bring?"],
+    "stay": ["Which area is best to stay in {destination}?", "Are homestays a good option here?",
+             "Any budget hotels you'd recommend?"],
+    "destination": ["What are the must-see places in {destination}?", "Any hidden gems nearby?",
+                    "How many days should I spend in {destination}?"]
+}
+
+# Used when no mined statistics are available: P(next intent | current intent) up to scale
+PRIOR_TRANSITIONS = {
+    "food": {"destination": 3, "budget": 2, "safety": 1, "transport": 1},
+    "safety": {"transport": 3, "stay": 2, "destination": 1},
+    "transport": {"budget": 2, "safety": 2, "destination": 2, "stay": 1},
+    "budget": {"stay": 3, "food": 2, "transport": 2},
+    "weather": {"packing": 3, "destination": 2, "stay": 1},
+    "packing": {"weather": 3, "safety": 1, "destination": 1},
+    "stay": {"budget": 3, "transport": 2, "food": 1},
+    "destination": {"food": 3, "transport": 2, "weather": 2, "stay": 1},
+    "general": {"destination": 3, "weather": 2, "budget": 2, "food": 1}
+}
+
+MAX_SUGGESTION_LENGTH = 60
+
+# Destinations recognised when a question names one and the context has none.
+# Free-text guesses ("in Hindi", "Is Thanks safe?") are not trusted, so a
+# name outside this list is only used when it comes from the context.
+KNOWN_DESTINATIONS = [
+    "Agra", "Ahmedabad", "Alleppey", "Amritsar", "Andaman", "Bangalore", "Bengaluru", "Bhubaneswar",
+    "Bikaner", "Chennai", "Coorg", "Darjeeling", "Delhi", "Dharamshala", "Gangtok", "Goa", "Gokarna",
+    "Hampi", "Haridwar", "Hyderabad", "Jaipur", "Jaisalmer", "Jodhpur", "Kashmir", "Kerala", "Khajuraho",
+    "Kochi", "Kolkata", "Ladakh", "Leh", "Lucknow", "Madurai", "Manali", "Mumbai", "Munnar", "Mussoorie",
+    "Mysore", "Nainital", "New Delhi", "Ooty", "Pondicherry", "Puducherry", "Pune", "Pushkar",
+    "Rajasthan", "Ranthambore", "Rishikesh", "Shillong", "Shimla", "Sikkim", "Spiti", "Udaipur",
+    "Varanasi", "Wayanad"
+]
+
+_DESTINATION_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(KNOWN_DESTINATIONS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+_CANONICAL_DESTINATIONS = {name.lower(): name for name in KNOWN_DESTINATIONS}
+
+DEFAULT_STATS_PATH = os.environ.get(
+    "CHATBOT_SUGGESTION_STATS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "suggestion_stats.json")
+)
+
+
+def detect_intents(query):
+    """
+    Intents mentioned in a question, strongest first
+
+    Args:
+        query (str): User's question
+
+    Returns:
+        list: Intent names (empty if none matched)
+    """
+    text = f" {normalize_query(query)} "
+    scores = {}
+    for intent, keywords in INTENT_KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if f" {keyword} " in text)
+        if hits:
+            scores[intent] = hits
+    return sorted(scores, key=lambda intent: -scores[intent])
+
+
+def detect_destination(query, context=None):
+    """
+    Destination a question is about: the context location or itinerary
+    destination, else a KNOWN_DESTINATIONS name in the question
+
+    Args:
+        query (str): User's question
+        context (dict): Chatbot context
+
+    Returns:
+        str or None: Destination name
+    """
+    context = context if isinstance(context, dict) else {}
+    itinerary = context.get("itinerary")
+    for location in (context.get("location"), itinerary.get("destination") if isinstance(itinerary, dict) else None):
+        if isinstance(location, str) and location.strip():
+            return location.strip()
+
+    match = _DESTINATION_PATTERN.search(query)
+    if match:
+        return _CANONICAL_DESTINATIONS[match.group(1).lower()]
+    return None
+
+
+class SuggestionEngine:
+    """Ranks follow-up intents and renders them as suggestions"""
+
+    def __init__(self, transitions=None):
+        """
+        Args:
+            transitions (dict): Intent to {next intent: count}; defaults to PRIOR_TRANSITIONS
+        """
+        self.transitions = transitions or PRIOR_TRANSITIONS
+
+    @classmethod
+    def from_stats_file(cls, path=None):
+        """Load mined transition counts, falling back to the priors if the file is missing"""
+        path = path or DEFAULT_STATS_PATH
+        try:
+            with open(path) as f:
+                transitions = json.load(f).get("transitions")
+        except (OSError, ValueError):
+            transitions = None
+        return cls(transitions)
+
+    def suggest(self, query, context=None, count=3):
+        """
+        Follow-up suggestions for a question
+
+        Args:
+            query (str): User's question
+            context (dict): Chatbot context
+            count (int): Number of suggestions
+
+        Returns:
+            list: Suggestions, each under MAX_SUGGESTION_LENGTH characters
+        """
+        intents = detect_intents(query)
+        destination = detect_destination(query, context)
+        current = intents[0] if intents else "general"
+
+        # Rank next intents by how often they follow the current one
+        ranked = sorted(
+            self.transitions.get(current, PRIOR_TRANSITIONS["general"]).items(),
+            key=lambda item: -item[1]
+        )
+        next_intents = [intent for intent, _ in ranked if intent in TEMPLATES]
+        # Deepening the current topic is always a reasonable follow-up
+        if current in TEMPLATES:
+            next_intents.insert(1 if next_intents else 0, current)
+
+        asked = content_tokens(query)
+        suggestions = []
+        for intent in next_intents:
+            for template in TEMPLATES[intent]:
+                if "{destination}" in template and not destination:
+                    continue
+                suggestion = template.format(destination=destination or "")
+                # Too long, or just a rephrasing of what was asked
+                if len(suggestion) >= MAX_SUGGESTION_LENGTH or similarity(asked, content_tokens(suggestion)) >= 0.7:
+                    continue
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+                    break
+            if len(suggestions) == count:
+                break
+
+        return suggestions
+
+
+suggestion_engine = SuggestionEngine.from_stats_file()
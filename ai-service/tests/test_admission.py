@@ -0,0 +1,47 @@
+"""
+Admission control: the Gemini quota split over worker processes, lane reserves
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.admission import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, AdmissionController, RateLimitedError, create_admission_controller,
+    reset_priority, set_priority
+)
+
+
+def test_gemini_quota_is_split_over_workers(monkeypatch):
+    monkeypatch.setenv("GEMINI_QPS", "8")
+    monkeypatch.setenv("GEMINI_TPM", "60000")
+    monkeypatch.delenv("GEMINI_BUDGET_WORKERS", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+
+    controller = create_admission_controller()
+    assert controller.gemini_calls.rate == 2
+    assert controller.gemini_tokens.capacity == 15000
+
+    monkeypatch.setenv("GEMINI_BUDGET_WORKERS", "8")
+    assert create_admission_controller().gemini_calls.rate == 1
+
+
+def test_background_lane_leaves_the_reserve_to_interactive_calls():
+    controller = AdmissionController(gemini_qps=4)
+    token = set_priority(PRIORITY_BACKGROUND)
+    try:
+        controller.charge_model_call("a")
+        controller.charge_model_call("b")
+        with pytest.raises(RateLimitedError) as raised:
+            controller.charge_model_call("c")
+    finally:
+        reset_priority(token)
+    assert raised.value.retry_after >= 1
+
+    token = set_priority(PRIORITY_INTERACTIVE)
+    try:
+        controller.charge_model_call("d")
+    finally:
+        reset_priority(token)
@@ -0,0 +1,28 @@
+"""
+Chatbot streaming route: refusals before the event stream starts
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import app
+from services import gemini_service
+from services.admission import AdmissionController
+
+
+def test_stream_over_the_gemini_budget_is_a_429(monkeypatch):
+    # One call per second, already spent
+    controller = AdmissionController(gemini_qps=1)
+    controller.charge_model_call("earlier question")
+    monkeypatch.setattr(gemini_service, "admission_control", controller)
+
+    response = app.test_client().post('/api/chatbot/stream', json={
+        'query': 'What should I see in Jaipur?',
+        'noCache': True
+    })
+
+    assert response.status_code == 429
+    assert response.mimetype == 'application/json'
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['success'] is False
@@ -0,0 +1,89 @@
+"""
+Context compaction against the payload the Node server actually sends
+(server/src/controllers/chatbotController.js)
+"""
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.context_compactor import _shrink_steps, compact_context, detect_focus
+
+TODAY = datetime.date(2026, 3, 10)
+
+# Shape built by getChatbotResponse: no day numbers, no timeSlots
+NODE_CONTEXT = {
+    "location": "Jaipur",
+    "userPreferences": {"travelPersona": "Cultural Explorer", "preferences": {"budget": "medium"}},
+    "itinerary": {
+        "destination": "Jaipur",
+        "startDate": "2026-03-09",
+        "endDate": "2026-03-11",
+        "dailyItineraries": [
+            {"date": "2026-03-09", "activities": ["Amber Fort", "Panna Meena ka Kund"]},
+            {"date": "2026-03-10", "activities": ["City Palace", "Jantar Mantar", "Hawa Mahal"]},
+            {"date": "2026-03-11", "activities": ["Nahargarh Fort", "Chokhi Dhani dinner"]}
+        ]
+    }
+}
+
+
+def itinerary_of(compacted):
+    return json.loads(compacted["itinerary"])
+
+
+def test_node_payload_keeps_every_days_activities():
+    compacted = compact_context("what should I wear?", NODE_CONTEXT, today=TODAY)
+    days = itinerary_of(compacted)["dailyItineraries"]
+
+    assert [day["day"] for day in days] == [1, 2, 3]
+    assert all(day["activities"] for day in days)
+
+
+def test_day_number_falls_back_to_position():
+    compacted = compact_context("what time should I reach day 2 first stop?", NODE_CONTEXT, today=TODAY)
+    days = itinerary_of(compacted)["dailyItineraries"]
+
+    focused = next(day for day in days if day["day"] == 2)
+    assert focused["activities"] == ["City Palace", "Jantar Mantar", "Hawa Mahal"]
+    # Other days are outlined, not emptied
+    assert next(day for day in days if day["day"] == 1)["activities"] == ["Amber Fort", "Panna Meena ka Kund"]
+
+
+def test_outlines_only_step_keeps_focused_activities():
+    focus = detect_focus("what is on day 2?", TODAY)
+    steps = list(_shrink_steps(NODE_CONTEXT["itinerary"], focus))
+    outlines_only = steps[-2]["dailyItineraries"]
+
+    assert outlines_only == [{"day": 2, "date": "2026-03-10", "activities": ["City Palace", "Jantar Mantar", "Hawa Mahal"]}]
+
+
+def test_non_dict_itineraries_are_compacted_not_rejected():
+    text = compact_context("day 1?", {"itinerary": "Day 1: Amber Fort. Day 2: City Palace."}, today=TODAY)
+    assert "Amber Fort" in text["itinerary"]
+
+    days = compact_context("day 2?", {"itinerary": [{"activities": ["A"]}, {"activities": ["B"]}]}, today=TODAY)
+    assert itinerary_of(days)["dailyItineraries"][1] == {"activities": ["B"], "day": 2}
+
+    long_text = compact_context(None, {"itinerary": "word " * 2000}, token_budget=100)
+    assert long_text["itinerary"].endswith("...(truncated)")
+
+
+def test_chatbot_prompt_builds_for_string_itinerary():
+    os.environ.setdefault("GEMINI_BACKEND", "stub")
+    from services.gemini_service import GeminiService
+
+    prompt = GeminiService._build_chatbot_prompt("day 1?", {"location": "Goa", "itinerary": "Beach day"})
+    assert "Beach day" in prompt
+
+
+def test_oversized_preferences_are_cut_to_their_share():
+    context = dict(NODE_CONTEXT, userPreferences={"notes": ["likes " + "very " * 50 + "spicy food"] * 40})
+
+    compacted = compact_context("What's the plan today?", context, token_budget=400, today=TODAY)
+
+    assert compacted["preferences"].endswith("...(truncated)")
+    assert compacted["tokens"] <= 400 + 10
+    assert "City Palace" in compacted["itinerary"]
@@ -0,0 +1,126 @@
+"""
+GeminiService against stub models: timed-out calls and the circuit breaker,
+limiter slots, shared calls, and the chat cache key
+"""
+import datetime
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services import gemini_service, resilience
+from services.admission import AdmissionController, RateLimitedError
+from services.gemini_service import GeminiService
+from services.model_router import ModelRouter
+from services.outbound_limiter import OutboundLimiter
+from services.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceededError, deadline_scope
+from services.stub_model import StubModel
+from utils.context_compactor import detect_focus
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Point GeminiService at a fresh breaker, limiter and budget; returns a function installing a router"""
+    breaker = CircuitBreaker("gemini", max_error_rate=0.5, min_calls=3, reset_timeout=60)
+    limiter = OutboundLimiter(max_concurrent=1, max_queue=4, queue_timeout=5)
+    monkeypatch.setattr(gemini_service, "gemini_breaker", breaker)
+    monkeypatch.setattr(gemini_service, "outbound_limiter", limiter)
+    monkeypatch.setattr(gemini_service, "admission_control", AdmissionController())
+
+    def install(latency, client_timeout=True):
+        router = ModelRouter(lambda name: StubModel(name, latency=latency), hedge_percentile=0,
+                             client_timeout=client_timeout)
+        monkeypatch.setattr(gemini_service, "model_router", router)
+        return breaker, limiter
+
+    return install
+
+
+def test_call_timeout_cap_opens_the_breaker(service, monkeypatch):
+    # A stalled Gemini: every call runs into GEMINI_CALL_TIMEOUT with no request deadline set
+    breaker, _ = service("fixed:3")
+    monkeypatch.setattr(resilience, "DEFAULT_CALL_TIMEOUT", 0.1)
+
+    for i in range(3):
+        with pytest.raises(DeadlineExceededError):
+            GeminiService._generate(f"stalled question {i}")
+    time.sleep(0.2)
+
+    assert breaker.stats()["recentCalls"] == 3
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        GeminiService._generate("another question")
+
+
+def test_caller_deadline_is_not_a_gemini_failure(service):
+    # The caller gives up, the shared call runs on and succeeds
+    breaker, _ = service("fixed:0.3")
+
+    with deadline_scope(0.1):
+        with pytest.raises(DeadlineExceededError):
+            GeminiService._generate("impatient question")
+    time.sleep(0.5)
+
+    assert breaker.stats()["recentCalls"] == 1
+    assert breaker.stats()["errorRate"] == 0.0
+
+
+def test_abandoned_call_keeps_its_slot_until_it_returns(service, monkeypatch):
+    # Without a client timeout the call the router abandons at the cap runs on
+    _, limiter = service("fixed:0.5", client_timeout=False)
+    monkeypatch.setattr(resilience, "DEFAULT_CALL_TIMEOUT", 0.1)
+
+    with pytest.raises(DeadlineExceededError):
+        GeminiService._generate("slow question")
+    assert limiter.stats()["active"] == 1
+
+    time.sleep(0.6)
+    assert limiter.stats()["active"] == 0
+
+
+def test_followers_wait_until_their_own_deadline(service):
+    service("fixed:0.4")
+    outcomes = {}
+
+    def ask(name, seconds):
+        with deadline_scope(seconds):
+            try:
+                outcomes[name] = GeminiService._generate("shared question")
+            except DeadlineExceededError as e:
+                outcomes[name] = e
+
+    leader = threading.Thread(target=ask, args=("leader", 0.1))
+    leader.start()
+    time.sleep(0.02)
+    ask("follower", 5)
+    leader.join()
+
+    assert isinstance(outcomes["leader"], DeadlineExceededError)
+    assert isinstance(outcomes["follower"], str)
+    assert gemini_service.inflight_calls.stats()["coalesced"] >= 1
+
+
+def test_rate_limited_caller_fails_alone(service, monkeypatch):
+    service("fixed:0.2")
+    monkeypatch.setattr(gemini_service, "admission_control", AdmissionController(gemini_qps=1))
+
+    first = GeminiService._generate("budget question one")
+    with pytest.raises(RateLimitedError):
+        GeminiService._generate("budget question two")
+    assert isinstance(first, str)
+
+
+def test_chat_cache_key_changes_with_the_day_asked_about(monkeypatch):
+    context = {"location": "Jaipur", "itinerary": {"dailyItineraries": [{"date": "2026-03-10"}]}}
+    keys = []
+    for today in (datetime.date(2026, 3, 10), datetime.date(2026, 3, 11)):
+        monkeypatch.setattr(gemini_service, "detect_focus", lambda query, today=today: detect_focus(query, today))
+        keys.append((GeminiService.chatbot_cache_key("What's on today?", context),
+                     GeminiService.chatbot_cache_key("Is Amber Fort worth it?", context)))
+
+    assert keys[0][0] != keys[1][0]
+    assert keys[0][1] == keys[1][1]
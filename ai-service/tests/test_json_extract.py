@@ -0,0 +1,78 @@
+"""
+Extraction of schema-shaped JSON from model output
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.gemini_service import FOLLOW_UP_SCHEMA, QUIZ_ANALYSIS_SCHEMA
+from utils.json_extract import JsonExtractor, extract_json, matches_schema
+
+ANALYSIS = (
+    '{"primaryPersona": "Foodie", "secondaryPersona": "Cultural Explorer", "budgetSensitivity": "medium",'
+    ' "interests": ["food"], "preferredActivities": ["cooking class"], "travelPace": "slow"}'
+)
+
+
+def test_fenced_reply_with_prose_and_trailing_comma():
+    text = 'Here you go:\n```json\n' + ANALYSIS[:-1] + ',}\n```\nEnjoy!'
+
+    value, repaired = extract_json(text, QUIZ_ANALYSIS_SCHEMA)
+
+    assert value["primaryPersona"] == "Foodie"
+    assert repaired
+
+
+def test_value_not_matching_the_schema_is_rejected():
+    missing_required = '{"primaryPersona": "Foodie"}'
+    wrong_type = ANALYSIS.replace('["food"]', '"food"')
+    unknown_enum = ANALYSIS.replace('"medium"', '"lavish"')
+
+    for text in (missing_required, wrong_type, unknown_enum):
+        with pytest.raises(ValueError):
+            extract_json(text, QUIZ_ANALYSIS_SCHEMA)
+
+
+def test_schema_skips_earlier_values_of_the_wrong_shape():
+    text = 'See [1] and {"note": "not it"} then ' + ANALYSIS
+
+    value, _ = extract_json(text, QUIZ_ANALYSIS_SCHEMA)
+
+    assert value["travelPace"] == "slow"
+
+
+def test_enum_values_come_back_in_schema_spelling():
+    text = ANALYSIS.replace('"medium"', '"MEDIUM"').replace('"slow"', '"Slow"')
+
+    value, _ = extract_json(text, QUIZ_ANALYSIS_SCHEMA)
+
+    assert value["budgetSensitivity"] == "medium"
+    assert value["travelPace"] == "slow"
+
+
+def test_cut_off_reply_is_only_repaired_when_allowed():
+    text = '["Where to eat?", "How to get around?", "Best ti'
+
+    with pytest.raises(ValueError):
+        extract_json(text, FOLLOW_UP_SCHEMA)
+    value, repaired = extract_json(text, FOLLOW_UP_SCHEMA, allow_partial=True)
+    assert value[:2] == ["Where to eat?", "How to get around?"]
+    assert repaired
+
+
+def test_streamed_chunks_are_scanned_once():
+    extractor = JsonExtractor("array")
+    chunks = ['Sure! ["Where', ' to eat?", "Is it', ' safe?"] trailing text']
+
+    done = [extractor.feed(chunk) for chunk in chunks]
+
+    assert done == [False, False, True]
+    assert extractor.value == ["Where to eat?", "Is it safe?"]
+
+
+def test_integer_schema_rejects_booleans():
+    assert not matches_schema(True, {"type": "INTEGER"})
+    assert matches_schema(3, {"type": "integer"})
@@ -0,0 +1,91 @@
+"""
+Model routing against stub models: candidate order, failover and hedging
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.model_router import DEFAULT_ROUTES, FAST_MODEL, LARGE_MODEL, ModelRouter
+from services.resilience import DeadlineExceededError
+from services.stub_model import StubModel, StubModelError
+
+ROUTES = {
+    "chat": [
+        {"maxPromptChars": 20, "models": ["fast", "large"]},
+        {"maxPromptChars": None, "models": ["large", "fast"]}
+    ]
+}
+
+
+def make_router(models, **kwargs):
+    """Router over named StubModels"""
+    kwargs.setdefault("hedge_percentile", 0)
+    return ModelRouter(lambda name: models[name], routes=ROUTES, min_samples=3, **kwargs)
+
+
+def test_default_routes_have_two_models():
+    assert FAST_MODEL != LARGE_MODEL
+    assert len(set(DEFAULT_ROUTES["chat"][0]["models"])) == 2
+
+
+def test_candidates_follow_prompt_size_and_health():
+    router = make_router({})
+
+    assert router.candidates("chat", "short") == ["fast", "large"]
+    assert router.candidates("chat", "a much longer prompt than twenty characters") == ["large", "fast"]
+
+    for _ in range(3):
+        router.record("fast", 0.1, False, "chat")
+    assert router.candidates("chat", "short") == ["large", "fast"]
+
+
+def test_failover_to_the_next_model_on_error():
+    models = {"fast": StubModel("fast", latency="fixed:0", error_rate=1.0),
+              "large": StubModel("large", latency="fixed:0")}
+    router = make_router(models)
+
+    assert router.generate("chat", "short", timeout=2).text
+    assert models["fast"].errors == 1
+    assert models["large"].calls == 1
+    assert router.failovers == 1
+
+
+def test_every_model_failing_raises_the_last_error():
+    models = {name: StubModel(name, latency="fixed:0", error_rate=1.0) for name in ("fast", "large")}
+    router = make_router(models)
+
+    with pytest.raises(StubModelError):
+        router.generate("chat", "short", timeout=2)
+
+
+def test_hedge_fires_after_the_latency_percentile():
+    models = {"fast": StubModel("fast", latency="fixed:1"), "large": StubModel("large", latency="fixed:0.05")}
+    router = make_router(models, hedge_percentile=0.9)
+    for _ in range(3):
+        router.record("fast", 0.1, True, "chat")
+
+    assert router.generate("chat", "short", timeout=2).text
+    assert router.hedges == 1
+    assert models["large"].calls == 1
+
+
+def test_hedge_gate_can_skip_the_hedge():
+    models = {"fast": StubModel("fast", latency="fixed:0.3"), "large": StubModel("large", latency="fixed:0")}
+    router = make_router(models, hedge_percentile=0.9)
+    for _ in range(3):
+        router.record("fast", 0.05, True, "chat")
+
+    assert router.generate("chat", "short", timeout=2, hedge_gate=lambda: None).text
+    assert router.hedges_skipped == 1
+    assert models["large"].calls == 0
+
+
+def test_timeout_raises_deadline_exceeded():
+    router = make_router({"fast": StubModel("fast", latency="fixed:1"), "large": StubModel("large", latency="fixed:1")})
+
+    with pytest.raises(DeadlineExceededError):
+        router.generate("chat", "short", timeout=0.1)
+    assert router.timeouts == 1
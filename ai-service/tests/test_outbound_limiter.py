@@ -0,0 +1,68 @@
+"""
+Outbound call limiter: bounded queue, timeouts and shared slots
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.outbound_limiter import OutboundLimiter, OverloadedError, SlotLease
+
+
+def test_queue_overflow_is_rejected():
+    limiter = OutboundLimiter(max_concurrent=1, max_queue=1, queue_timeout=5)
+    limiter.acquire()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), limiter.release()))
+    waiter.start()
+    while limiter.stats()["queued"] == 0:
+        time.sleep(0.005)
+
+    with pytest.raises(OverloadedError):
+        limiter.acquire()
+    assert limiter.stats()["rejected"] == 1
+
+    limiter.release()
+    waiter.join()
+    assert limiter.stats()["active"] == 0
+
+
+def test_queue_timeout_is_rejected():
+    limiter = OutboundLimiter(max_concurrent=1, max_queue=4)
+    limiter.acquire()
+
+    with pytest.raises(OverloadedError):
+        limiter.acquire(timeout=0.05)
+    assert limiter.stats()["timedOut"] == 1
+    assert limiter.stats()["queued"] == 0
+
+
+def test_async_and_sync_callers_share_slots():
+    limiter = OutboundLimiter(max_concurrent=1, max_queue=4)
+    limiter.acquire()
+
+    async def wait_for_slot():
+        async with limiter.async_slot(timeout=0.05):
+            pass
+
+    with pytest.raises(OverloadedError):
+        asyncio.run(wait_for_slot())
+    limiter.release()
+    asyncio.run(wait_for_slot())
+    assert limiter.stats()["active"] == 0
+
+
+def test_lease_frees_the_slot_with_its_last_holder():
+    limiter = OutboundLimiter(max_concurrent=1, max_queue=0)
+    with limiter.leased_slot() as lease:
+        lease.retain()
+    assert limiter.stats()["active"] == 1
+    assert not limiter.try_acquire()
+
+    lease.release()
+    assert limiter.stats()["active"] == 0
+    assert isinstance(lease, SlotLease)
@@ -0,0 +1,57 @@
+"""
+Quiz answer-space table: rebuilt at startup when missing or stale
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.quiz_analyzer import QuizAnalyzer
+from services.quiz_table import QuizTable, weights_signature
+
+RESPONSES = {"preferred_activities": ["food_tasting"]}
+
+
+def test_missing_table_is_built_at_startup(tmp_path):
+    table = QuizTable(QuizAnalyzer, path=str(tmp_path / "quiz_table.bin"))
+
+    table.load_or_build()
+
+    assert os.path.exists(table.path)
+    assert table.lookup(RESPONSES) == QuizAnalyzer.build_local_analysis(*QuizAnalyzer.score_responses(RESPONSES))
+
+
+def test_stale_table_is_rebuilt(tmp_path):
+    class Reweighted(QuizAnalyzer):
+        QUESTIONS = [dict(QuizAnalyzer.QUESTIONS[0], id="renamed")] + QuizAnalyzer.QUESTIONS[1:]
+
+    path = str(tmp_path / "quiz_table.bin")
+    QuizTable(Reweighted, path=path).build()
+
+    table = QuizTable(QuizAnalyzer, path=path)
+    table.load_or_build()
+
+    assert table._header["signature"] == weights_signature(QuizAnalyzer.QUESTIONS)
+    assert table.scores(RESPONSES) is not None
+
+
+def test_workers_starting_together_build_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "quiz_table.bin")
+    builds = []
+    original_build = QuizTable.build
+
+    def counted_build(self, enrich=None):
+        builds.append(self)
+        return original_build(self, enrich)
+
+    monkeypatch.setattr(QuizTable, "build", counted_build)
+    tables = [QuizTable(QuizAnalyzer, path=path) for _ in range(4)]
+    workers = [threading.Thread(target=table.load_or_build) for table in tables]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(builds) == 1
+    assert all(table.lookup(RESPONSES) for table in tables)
@@ -0,0 +1,49 @@
+"""
+Offline quiz re-analysis CLI (scripts/reanalyze_quizzes.py), run on a small file
+"""
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'reanalyze_quizzes.py')
+
+SUBMISSIONS = [
+    {"id": "user-1", "responses": {"preferred_activities": ["food_tasting"]}},
+    "not json",
+    {"id": "user-2", "responses": {}},
+    {"userId": "user-3", "responses": {"preferred_activities": ["outdoor_adventure"]}},
+]
+
+
+def run(tmp_path, *extra):
+    submissions = tmp_path / "submissions.jsonl"
+    submissions.write_text("\n".join(
+        line if isinstance(line, str) else json.dumps(line) for line in SUBMISSIONS
+    ) + "\n")
+    results = tmp_path / "results.jsonl"
+    subprocess.run(
+        [sys.executable, SCRIPT, str(submissions), str(results), "--workers", "2", "--chunk-size", "1", *extra],
+        check=True, capture_output=True
+    )
+    return [json.loads(line) for line in results.read_text().splitlines()]
+
+
+def test_results_keep_input_order_and_report_bad_lines(tmp_path):
+    results = run(tmp_path)
+
+    assert [result["line"] for result in results] == [1, 2, 3, 4]
+    assert [result["id"] for result in results] == ["user-1", None, None, "user-3"]
+    assert results[1]["error"] == "Invalid JSON"
+    assert results[2]["error"] == "No responses"
+    assert results[0]["source"] == "local"
+    assert results[0]["analysis"]["primaryPersona"]
+
+
+def test_finished_checkpoint_run_writes_nothing_again(tmp_path):
+    checkpoint = str(tmp_path / "results.ckpt")
+    first = run(tmp_path, "--checkpoint", checkpoint)
+    with open(checkpoint) as f:
+        assert json.load(f)["linesDone"] == 4
+
+    assert run(tmp_path, "--checkpoint", checkpoint) == first
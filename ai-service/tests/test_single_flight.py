@@ -0,0 +1,89 @@
+"""
+Coalescing of identical calls: each caller keeps its own timeout and
+caller-specific failures stay with that caller
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.single_flight import SingleFlight
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def slow(value, seconds=0.3):
+    def fn():
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+def test_follower_outlives_a_leader_that_gave_up():
+    flight = SingleFlight(executor=ThreadPoolExecutor(max_workers=2))
+    outcomes = {}
+
+    def ask(name, timeout):
+        try:
+            outcomes[name] = flight.do("key", slow("answer"), timeout=timeout)
+        except TimeoutError as e:
+            outcomes[name] = e
+
+    leader = threading.Thread(target=ask, args=("leader", 0.05))
+    leader.start()
+    time.sleep(0.01)
+    ask("follower", 2)
+    leader.join()
+
+    assert isinstance(outcomes["leader"], TimeoutError)
+    assert outcomes["follower"] == "answer"
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["timedOut"] == 1
+
+
+def test_rejected_admission_starts_no_shared_call():
+    flight = SingleFlight(executor=ThreadPoolExecutor(max_workers=1))
+
+    def refuse():
+        raise PermissionError("over budget")
+
+    with pytest.raises(PermissionError):
+        flight.do("key", slow("answer", 0), admit=refuse)
+    assert flight.stats()["inFlight"] == 0
+    assert flight.do("key", slow("answer", 0), admit=lambda: None) == "answer"
+
+
+def test_shared_call_does_not_see_the_caller_context():
+    flight = SingleFlight(executor=ThreadPoolExecutor(max_workers=1))
+    request_id.set("caller")
+
+    async def read():
+        return request_id.get()
+
+    assert flight.do("sync", request_id.get) is None
+    assert asyncio.run(flight.do_async("async", read)) is None
+
+
+def test_async_follower_outlives_a_leader_that_gave_up():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.3)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", call, timeout=0.05))
+        await asyncio.sleep(0.01)
+        follower = await flight.do_async("key", call, timeout=2)
+        with pytest.raises(TimeoutError):
+            await leader
+        return follower
+
+    assert asyncio.run(main()) == "answer"
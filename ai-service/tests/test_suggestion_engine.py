@@ -0,0 +1,27 @@
+"""
+Destination detection for the local follow-up suggestions
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.suggestion_engine import detect_destination, suggestion_engine
+
+
+def test_context_location_comes_before_the_question():
+    assert detect_destination("Is Goa safe?", {"location": "Jaipur"}) == "Jaipur"
+    assert detect_destination("Where should I eat?", {"itinerary": {"destination": "Udaipur"}}) == "Udaipur"
+
+
+def test_only_known_destinations_are_taken_from_the_question():
+    assert detect_destination("Is goa safe at night?") == "Goa"
+    assert detect_destination("Where can I eat good Biryani?") is None
+    assert detect_destination("Where to find biryani in Hyderabad?") == "Hyderabad"
+    for query in ("Where to eat in Biryani?", "Is Thanks safe", "Can you answer in Hindi?"):
+        assert detect_destination(query) is None
+
+
+def test_suggestions_never_name_a_non_destination():
+    for suggestion in suggestion_engine.suggest("Can you answer in Hindi?"):
+        assert "Hindi" not in suggestion
@@ -0,0 +1,139 @@
+"""
+In-process response caching
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a fixed time-to-live.
+
+    Thread-safe, so a single instance can be shared by all request threads
+    of a worker process.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        """
+        Args:
+            maxsize (int): Maximum number of entries kept before evicting
+                the least recently used one
+            ttl (float): Seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Look up a key, counting the hit or miss
+
+        Args:
+            key (str): Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Cached value or default
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if full
+
+        Args:
+            key (str): Cache key
+            value: Value to cache
+        """
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        """
+        Remove a key
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bool: True if a live entry was removed
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Size, capacity, hits, misses, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def normalize_query(query):
+    """
+    Canonical form of a user question: case, punctuation and spacing removed
+
+    Args:
+        query (str): User's question
+
+    Returns:
+        str: Normalized question
+    """
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+def hash_payload(payload):
+    """
+    Stable hash of a JSON-serializable value (dict key order does not matter)
+
+    Args:
+        payload: JSON-serializable value
+
+    Returns:
+        str: Hex digest
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
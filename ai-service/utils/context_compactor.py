@@ -0,0 +1,274 @@
+"""
+Compact, token-budgeted serialization of chatbot context
+
+Turns the itinerary and user preferences sent with a chatbot question into
+minified JSON that keeps only what the question needs:
+    - fields that never help an answer (map ids, coordinates, icons) are dropped
+    - the question's focus (a specific day, costs, weather) selects which
+      parts of the itinerary are kept
+    - the result is shrunk step by step until it fits a token budget
+Compacted contexts are cached per itinerary hash and focus, so the same
+trip is not re-processed on every turn.
+"""
+import datetime
+import json
+import os
+import re
+
+from utils.cache import TTLCache, hash_payload
+
+# Maximum estimated tokens for the serialized context
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATBOT_CONTEXT_TOKEN_BUDGET", 800))
+
+# Share of the budget the preferences may take; the itinerary gets the rest
+PREFERENCES_SHARE = 0.5
+
+# Never useful in a prompt
+DROPPED_FIELDS = {"xid", "lat", "lon", "weatherIcon", "details", "id", "userId", "createdAt", "updatedAt"}
+
+DAY_WORDS = {"today", "tonight", "tomorrow", "morning", "afternoon", "evening",
+             "breakfast", "lunch", "dinner", "now", "next"}
+COST_WORDS = {"cost", "costs", "budget", "expensive", "cheap", "price", "prices", "spend", "money", "afford"}
+WEATHER_WORDS = {"weather", "rain", "raining", "hot", "cold", "temperature", "umbrella", "sunny", "wear"}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_compacted_cache = TTLCache(
+    maxsize=int(os.environ.get("CHATBOT_CONTEXT_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("CHATBOT_CONTEXT_CACHE_TTL", 3600))
+)
+
+
+def count_tokens(text):
+    """
+    Estimate the number of model tokens in a text
+
+    Counts words and punctuation marks, with long words counted as one
+    token per four characters, which tracks SentencePiece-style tokenizers
+    closely enough for budgeting.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return sum(max(1, (len(token) + 3) // 4) for token in _TOKEN_PATTERN.findall(text))
+
+
+def minify(value):
+    """Serialize without whitespace"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def detect_focus(query, today=None):
+    """
+    Work out which part of the itinerary a question is about
+
+    Args:
+        query (str): User's question
+        today (datetime.date): Current date (defaults to today)
+
+    Returns:
+        dict: {"day": day number, ISO date string or None, "costs": bool, "weather": bool}
+    """
+    words = set(re.findall(r"[a-z]+", query.lower()))
+    today = today or datetime.date.today()
+
+    day = None
+    match = re.search(r"\bday\s*(\d+)\b", query.lower())
+    if match:
+        day = int(match.group(1))
+    elif "tomorrow" in words:
+        day = (today + datetime.timedelta(days=1)).isoformat()
+    elif words & DAY_WORDS:
+        day = today.isoformat()
+
+    return {
+        "day": day,
+        "costs": bool(words & COST_WORDS),
+        "weather": bool(words & WEATHER_WORDS)
+    }
+
+
+def _strip(value):
+    """Recursively drop unhelpful fields and empty values"""
+    if isinstance(value, dict):
+        stripped = {k: _strip(v) for k, v in value.items() if k not in DROPPED_FIELDS}
+        return {k: v for k, v in stripped.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+
+def _number_days(days):
+    """
+    Days as dicts with a day number
+
+    The Node server sends {date, activities: [names]} without a day number,
+    so a day's position in the trip stands in for it.
+    """
+    numbered = []
+    for index, day in enumerate(days, start=1):
+        if not isinstance(day, dict):
+            day = {"plan": day}
+        if not isinstance(day.get("day"), int):
+            day = dict(day, day=index)
+        numbered.append(day)
+    return numbered
+
+
+def _activity_names(day):
+    """Activity names of a day, from timeSlots or a plain activities list"""
+    names = []
+    for slot in day.get("timeSlots") or []:
+        activity = slot.get("activity") if isinstance(slot, dict) else None
+        names.append(activity.get("name") if isinstance(activity, dict) else None)
+    for activity in day.get("activities") or []:
+        names.append(activity.get("name") if isinstance(activity, dict) else activity)
+    return [name for name in names if name]
+
+
+def _select_days(days, focus_day):
+    """Days to keep in full: the focused day if it is in the trip, otherwise all"""
+    if focus_day is None:
+        return days
+
+    if isinstance(focus_day, int):
+        selected = [d for d in days if d.get("day") == focus_day]
+    else:
+        selected = [d for d in days if str(d.get("date", ""))[:10] == focus_day]
+        if not selected and days:
+            # Trip hasn't started yet (or is over): the first day is the best guess
+            first = str(days[0].get("date", ""))[:10]
+            if first and focus_day < first:
+                selected = days[:1]
+    return selected or days
+
+
+def _outline(day):
+    """One-line summary of a day: its activity names only"""
+    outline = {"day": day.get("day"), "date": day.get("date"), "activities": _activity_names(day)}
+    return {k: v for k, v in outline.items() if v not in (None, "", [])}
+
+
+def _shrink_steps(itinerary, focus):
+    """
+    Candidate itineraries from most to least detailed
+
+    Yields progressively smaller versions; the caller keeps the first one
+    that fits the budget.
+    """
+    days = itinerary.get("dailyItineraries") or []
+    days = _number_days(days if isinstance(days, list) else [days])
+    summary = {k: v for k, v in itinerary.items() if k != "dailyItineraries"}
+
+    def with_days(full_days, outlined_days, keep_costs, keep_weather, keep_descriptions):
+        rendered = []
+        for day in full_days:
+            day = dict(day)
+            if not keep_costs:
+                day.pop("dailyCost", None)
+            if not keep_weather:
+                day.pop("weather", None)
+            if not keep_descriptions and isinstance(day.get("timeSlots"), list):
+                day["timeSlots"] = [
+                    dict(slot, activity={k: v for k, v in slot["activity"].items() if k != "description"})
+                    if isinstance(slot, dict) and isinstance(slot.get("activity"), dict) else slot
+                    for slot in day["timeSlots"]
+                ]
+            rendered.append(day)
+        rendered.extend(_outline(day) for day in outlined_days)
+        rendered.sort(key=lambda d: d.get("day") or 0)
+        return dict(summary, dailyItineraries=rendered) if rendered else dict(summary)
+
+    focused = _select_days(days, focus["day"])
+    others = [d for d in days if d not in focused] if focus["day"] is not None else []
+
+    # Everything relevant to the question, other days as outlines
+    yield with_days(focused, others, True, True, True)
+    # Only the fields the question is about
+    yield with_days(focused, others, focus["costs"], focus["weather"], True)
+    # Without activity descriptions
+    yield with_days(focused, others, focus["costs"], focus["weather"], False)
+    # Focused days only
+    yield with_days(focused, [], focus["costs"], focus["weather"], False)
+    # Outlines only (activity names of the focused days included)
+    yield with_days([], focused, False, False, False)
+    # Trip summary only
+    yield dict(summary)
+
+
+def _hard_cut(text, token_budget):
+    """Cut text at the character level until it fits the budget"""
+    while text and count_tokens(text) > token_budget:
+        text = text[:int(len(text) * 0.8)]
+    return (text or "") + "...(truncated)"
+
+
+def compact_context(query, context, token_budget=None, today=None):
+    """
+    Compact the itinerary and preferences of a chatbot context
+
+    Preferences are cut to PREFERENCES_SHARE of the budget, the itinerary
+    to what is left. The budget is approximate: token counts are estimates
+    (see count_tokens), and a cut adds a short truncation marker.
+
+    Args:
+        query (str): User's question (drives pruning); None keeps all days
+        context (dict): Chatbot context (location, itinerary, userPreferences)
+        token_budget (int): Maximum estimated tokens (defaults to CONTEXT_TOKEN_BUDGET)
+        today (datetime.date): Current date (defaults to today)
+
+    Returns:
+        dict: {"preferences": str, "itinerary": str or None, "tokens": int,
+        "originalTokens": int}
+    """
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    itinerary = context.get("itinerary") or {}
+    preferences = context.get("userPreferences") or {}
+    if isinstance(itinerary, list):
+        # A bare list of days
+        itinerary = {"dailyItineraries": itinerary}
+    focus = detect_focus(query, today) if query else {"day": None, "costs": True, "weather": True}
+
+    cache_key = f"{hash_payload([itinerary, preferences])}:{token_budget}:{minify(focus)}"
+    compacted = _compacted_cache.get(cache_key)
+    if compacted is not None:
+        return compacted
+
+    preferences_text = minify(_strip(preferences))
+    preferences_budget = int(token_budget * PREFERENCES_SHARE)
+    if count_tokens(preferences_text) > preferences_budget:
+        preferences_text = _hard_cut(preferences_text, preferences_budget)
+    budget_left = token_budget - count_tokens(preferences_text)
+
+    itinerary_text = None
+    if itinerary and not isinstance(itinerary, dict):
+        # Free text: nothing to prune
+        itinerary_text = minify(itinerary)
+        if count_tokens(itinerary_text) > budget_left:
+            itinerary_text = _hard_cut(itinerary_text, budget_left)
+    elif itinerary:
+        for candidate in _shrink_steps(_strip(itinerary), focus):
+            itinerary_text = minify(candidate)
+            if count_tokens(itinerary_text) <= budget_left:
+                break
+        else:
+            # Even the summary is too big
+            itinerary_text = _hard_cut(itinerary_text, budget_left)
+
+    original = json.dumps(preferences, indent=2) + (json.dumps(itinerary, indent=2) if itinerary else "")
+    compacted = {
+        "preferences": preferences_text,
+        "itinerary": itinerary_text,
+        "tokens": count_tokens(preferences_text) + (count_tokens(itinerary_text) if itinerary_text else 0),
+        "originalTokens": count_tokens(original)
+    }
+    _compacted_cache.set(cache_key, compacted)
+    return compacted
+
+
+def compaction_stats():
+    """Counters of the compacted-context cache"""
+    return _compacted_cache.stats()
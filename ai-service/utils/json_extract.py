@@ -0,0 +1,265 @@
+"""
+Tolerant, incremental extraction of JSON from model output
+
+Model replies wrap JSON in markdown fences, add a sentence before or
+after it, leave trailing commas, or stop mid-value when the output is cut
+off. JsonExtractor scans the text once, character by character, and can
+be fed a streamed reply chunk by chunk without rescanning:
+
+- everything before the first { or [ (of the expected kind) is skipped,
+  fences and prose included
+- trailing commas before } and ] are dropped as they are seen
+- once the outermost value closes it is parsed and, if it is accepted
+  (e.g. matches the expected schema), the rest is ignored; otherwise
+  scanning goes on to the next candidate
+- partial() repairs an unfinished value: an open string is closed, and
+  if that doesn't parse the value is cut back to its last complete
+  element, then all open brackets are closed. This is meant for a reply
+  that is still streaming in: a finished reply that needs it was cut off,
+  and extract_json rejects it unless asked otherwise.
+"""
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+_SCHEMA_TYPES = {
+    "OBJECT": dict,
+    "ARRAY": list,
+    "STRING": str,
+    "BOOLEAN": bool,
+    "INTEGER": int,
+    "NUMBER": (int, float)
+}
+
+
+def matches_schema(value, schema):
+    """
+    Check a value against a response schema (the OpenAPI subset Gemini uses)
+
+    Checks types, required properties, array items and string enums
+    (case-insensitively); other keywords are ignored.
+
+    Args:
+        value: Parsed JSON value
+        schema (dict): Schema with an upper- or lower-case "type"
+
+    Returns:
+        bool: Whether the value matches
+    """
+    kind = schema.get("type", "").upper()
+    expected = _SCHEMA_TYPES.get(kind)
+    if expected is not None:
+        if not isinstance(value, expected) or (kind in ("INTEGER", "NUMBER") and isinstance(value, bool)):
+            return False
+
+    if kind == "OBJECT":
+        if any(key not in value for key in schema.get("required", [])):
+            return False
+        properties = schema.get("properties", {})
+        return all(
+            matches_schema(value[key], properties[key])
+            for key in value if key in properties and value[key] is not None
+        )
+    if kind == "ARRAY" and "items" in schema:
+        return all(matches_schema(item, schema["items"]) for item in value)
+    if kind == "STRING" and "enum" in schema:
+        return value.lower() in {option.lower() for option in schema["enum"]}
+    return True
+
+
+def normalize_enums(value, schema):
+    """
+    Replace string enum values with their spelling in the schema
+
+    matches_schema accepts enums case-insensitively ("HIGH" for "high");
+    this returns a copy of a matching value with the canonical spelling.
+
+    Args:
+        value: Parsed JSON value that matches the schema
+        schema (dict): Schema the value was checked against
+
+    Returns:
+        The value with enum strings normalized
+    """
+    kind = schema.get("type", "").upper()
+    if kind == "OBJECT" and isinstance(value, dict):
+        properties = schema.get("properties", {})
+        return {
+            key: normalize_enums(item, properties[key]) if key in properties and item is not None else item
+            for key, item in value.items()
+        }
+    if kind == "ARRAY" and isinstance(value, list) and "items" in schema:
+        return [normalize_enums(item, schema["items"]) for item in value]
+    if kind == "STRING" and isinstance(value, str) and "enum" in schema:
+        canonical = {option.lower(): option for option in schema["enum"]}
+        return canonical.get(value.lower(), value)
+    return value
+
+
+class JsonExtractor:
+    """Single-pass scanner that pulls the first JSON object or array out of text"""
+
+    def __init__(self, expect=None, accept=None):
+        """
+        Args:
+            expect (str): "object" or "array" to only accept that kind of
+                value, or None for either
+            accept (callable): Predicate a parsed value must pass, or None
+        """
+        self.openers = {"object": "{", "array": "["}.get(expect, "{[")
+        self.accept = accept
+        self.value = None
+        self.done = False
+        self.repaired = False
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        # (buffer length, open brackets) after the last complete element
+        self._safe_point = None
+
+    def feed(self, chunk):
+        """
+        Scan the next piece of text
+
+        Args:
+            chunk (str): Text following what was already fed
+
+        Returns:
+            True once a complete value has been parsed (see .value)
+        """
+        for char in chunk:
+            if self.done:
+                break
+            self._scan(char)
+        return self.done
+
+    def _scan(self, char):
+        if not self._stack:
+            # Outside any value: wait for an opening bracket
+            if char in self.openers:
+                self._buffer = [char]
+                self._stack = [char]
+                self._safe_point = (1, [char])
+            return
+
+        self._buffer.append(char)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return
+
+        if char == '"':
+            self._in_string = True
+        elif char in _CLOSERS:
+            self._stack.append(char)
+            self._safe_point = (len(self._buffer), list(self._stack))
+        elif char in "}]":
+            self._buffer.pop()
+            self._drop_trailing_comma()
+            self._buffer.append(char)
+            self._stack.pop()
+            if not self._stack:
+                self._close()
+            else:
+                self._safe_point = (len(self._buffer), list(self._stack))
+        elif char == ",":
+            self._safe_point = (len(self._buffer) - 1, list(self._stack))
+
+    def _drop_trailing_comma(self):
+        index = len(self._buffer) - 1
+        while index >= 0 and self._buffer[index].isspace():
+            index -= 1
+        if index >= 0 and self._buffer[index] == ",":
+            del self._buffer[index]
+            self.repaired = True
+
+    def _close(self):
+        """The outermost value closed: parse it, or keep scanning for the next one"""
+        try:
+            value = json.loads("".join(self._buffer))
+        except ValueError:
+            value = None
+        else:
+            if self.accept is None or self.accept(value):
+                self.value = value
+                self.done = True
+                return
+        # Not the value we want (e.g. [link] or [3] in prose): look further on
+        self._buffer = []
+        self._safe_point = None
+
+    def partial(self):
+        """
+        Best-effort value from an unfinished scan
+
+        Returns:
+            The complete value if there is one, otherwise the repaired
+            unfinished value, or None if nothing usable was seen
+        """
+        if self.done:
+            return self.value
+        if not self._stack:
+            return None
+
+        text = "".join(self._buffer)
+        if self._escape:
+            text = text[:-1]
+        if self._in_string:
+            text += '"'
+        candidates = [text + self._closing(self._stack)]
+        if self._safe_point is not None:
+            length, stack = self._safe_point
+            candidates.append("".join(self._buffer[:length]) + self._closing(stack))
+
+        for candidate in candidates:
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                continue
+            if self.accept is not None and not self.accept(value):
+                continue
+            self.repaired = True
+            return value
+        return None
+
+    @staticmethod
+    def _closing(stack):
+        return "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def extract_json(text, schema=None, allow_partial=False):
+    """
+    Extract a JSON value from model output
+
+    Args:
+        text (str): Raw model output
+        schema (dict): Response schema the value must match, or None to
+            take the first object or array
+        allow_partial (bool): Repair a value cut off before its end (for
+            output that is still streaming)
+
+    Returns:
+        tuple: (parsed value, whether it had to be repaired); enum
+        strings come back in their schema spelling
+
+    Raises:
+        ValueError: If no JSON value (matching the schema) was found
+    """
+    if schema is None:
+        extractor = JsonExtractor()
+    else:
+        expect = {"OBJECT": "object", "ARRAY": "array"}.get(schema.get("type", "").upper())
+        extractor = JsonExtractor(expect, accept=lambda value: matches_schema(value, schema))
+    if extractor.feed(text):
+        value, repaired = extractor.value, extractor.repaired
+    else:
+        value = extractor.partial() if allow_partial else None
+        if value is None:
+            raise ValueError("No JSON value matching the expected shape found in model output")
+        repaired = True
+    return (normalize_enums(value, schema) if schema is not None else value), repaired
@@ -0,0 +1,165 @@
+"""
+Prometheus metrics for the AI service
+
+Request latency is recorded per route, and the Gemini path is broken into
+stages (prompt build, model call, JSON extraction) so the hot stage can be
+told apart from the total. Component counters that are already kept as
+stats() dicts (caches, coalescing, queues, limiter...) are exported at
+scrape time through StatsCollector instead of being duplicated.
+
+When PROMETHEUS_MULTIPROC_DIR is set (several gunicorn workers), /metrics
+aggregates the histograms and counters of all workers; component stats
+are those of the worker serving the scrape.
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "ghoomo_request_duration_seconds",
+    "Request latency per route",
+    ["route", "method", "status"]
+)
+
+STAGE_LATENCY = Histogram(
+    "ghoomo_stage_duration_seconds",
+    "Time spent in each stage of a Gemini-backed request",
+    ["stage", "call_type"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+GEMINI_ERRORS = Counter(
+    "ghoomo_gemini_errors_total",
+    "Failed model calls by call type and error",
+    ["call_type", "error"]
+)
+
+FALLBACKS = Counter(
+    "ghoomo_fallbacks_total",
+    "Responses served from a fallback instead of the model output",
+    ["kind"]
+)
+
+_SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+PROMPT_CHARS = Histogram(
+    "ghoomo_prompt_chars",
+    "Prompt size sent to the model",
+    ["call_type"],
+    buckets=_SIZE_BUCKETS
+)
+
+RESPONSE_CHARS = Histogram(
+    "ghoomo_response_chars",
+    "Model output size",
+    ["call_type"],
+    buckets=_SIZE_BUCKETS
+)
+
+JSON_PARSE_RESULTS = Counter(
+    "ghoomo_json_parse_total",
+    "Structured model replies by parse outcome (ok, repaired, failed)",
+    ["call_type", "outcome"]
+)
+
+WASTED_MODEL_CALLS = Counter(
+    "ghoomo_wasted_model_calls_total",
+    "Completed model calls whose output was unusable and discarded",
+    ["call_type"]
+)
+
+# Collectors added by register_stats, re-registered per scrape in multiprocess mode
+_stats_collectors = []
+
+
+@contextmanager
+def stage(name, call_type=""):
+    """Time a block as one stage of request processing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(name, call_type).observe(time.perf_counter() - start)
+
+
+def timed_stage(name, call_type=""):
+    """Decorator form of stage()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name, call_type):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _flatten(prefix, value, out):
+    """Collect the numeric leaves of a nested stats dict as dotted names"""
+    if isinstance(value, (int, float)):
+        out[prefix] = float(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), item, out)
+
+
+class StatsCollector:
+    """Exports the stats() dicts of service components as gauges at scrape time"""
+
+    def __init__(self, sources):
+        """
+        Args:
+            sources (dict): Component name -> callable returning its stats
+                dict (or None when the component is disabled)
+        """
+        self.sources = sources
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "ghoomo_component_stat",
+            "Counters and sizes reported by service components",
+            labels=["component", "stat"]
+        )
+        for component, source in self.sources.items():
+            try:
+                stats = source()
+            except Exception as e:
+                print(f"Error collecting {component} stats: {str(e)}")
+                continue
+            values = {}
+            _flatten("", stats, values)
+            for stat, value in values.items():
+                gauge.add_metric([component, stat], value)
+        yield gauge
+
+
+def register_stats(sources):
+    """Register a StatsCollector for the given components on the default registry"""
+    collector = StatsCollector(sources)
+    REGISTRY.register(collector)
+    _stats_collectors.append(collector)
+    return collector
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _stats_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
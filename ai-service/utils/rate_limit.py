@@ -0,0 +1,78 @@
+"""
+Token-bucket rate limiting
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Refills at a steady rate up to a burst capacity; each call spends tokens.
+
+    Thread-safe, so one bucket can pace all threads of a process.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Most tokens held at once (the allowed burst);
+                defaults to one second's worth
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait(self, tokens, reserve):
+        # A request larger than the burst goes through once the bucket is
+        # full and leaves it in debt, instead of never fitting
+        needed = min(tokens + reserve, self.capacity)
+        self._refill()
+        if self._tokens >= needed:
+            return 0.0
+        return (needed - self._tokens) / self.rate
+
+    def try_acquire(self, tokens=1, reserve=0):
+        """
+        Spend tokens if they are available
+
+        Args:
+            tokens (float): Tokens to spend
+            reserve (float): Tokens that must remain afterwards (kept for
+                higher-priority callers)
+
+        Returns:
+            float: 0 if the tokens were spent, otherwise seconds until they
+            will be available (nothing is spent)
+        """
+        with self._lock:
+            wait = self._wait(tokens, reserve)
+            if not wait:
+                self._tokens -= tokens
+            return wait
+
+    def wait_time(self, tokens=1, reserve=0):
+        """Seconds until try_acquire(tokens, reserve) would succeed, without spending"""
+        with self._lock:
+            return self._wait(tokens, reserve)
+
+    def acquire(self, tokens=1):
+        """Block until the tokens can be spent"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def available(self):
+        """Tokens currently available"""
+        with self._lock:
+            self._refill()
+            return self._tokens
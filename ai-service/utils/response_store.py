@@ -0,0 +1,171 @@
+"""
+Persistent response store shared by all worker processes
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseStore:
+    """
+    On-disk key/value store for model responses backed by SQLite in WAL mode.
+
+    Every gunicorn worker opens the same file, so an answer generated by one
+    worker is a hit for all of them, and the store survives restarts.
+    Entries expire after a TTL and the table is capped at max_entries
+    (oldest entries are pruned first).
+    """
+
+    # Prune expired and surplus rows after this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, max_entries=50000, ttl=7 * 24 * 3600):
+        """
+        Args:
+            path (str): SQLite database file
+            max_entries (int): Maximum number of rows kept
+            ttl (float): Seconds an entry stays valid
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection()
+
+    def _connection(self):
+        """Get this thread's connection (reopened after a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        conn.commit()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        Look up a key
+
+        Args:
+            key (str): Store key
+
+        Returns:
+            Stored value, or None when missing, expired or unreadable
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading response store: {str(e)}")
+            self.errors += 1
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Store a JSON-serializable value
+
+        Args:
+            key (str): Store key
+            value: Value to store
+        """
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now + self.ttl)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing response store: {str(e)}")
+            self.errors += 1
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired rows and the oldest rows beyond max_entries"""
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error pruning response store: {str(e)}")
+            self.errors += 1
+
+    def stats(self):
+        """
+        Get store counters (hits and misses are per process)
+
+        Returns:
+            dict: Row count, limits and counters
+        """
+        try:
+            size = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        return {
+            "path": self.path,
+            "size": size,
+            "maxEntries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+
+def create_response_store():
+    """
+    Build the store from the environment
+
+    Returns:
+        ResponseStore or None when GEMINI_STORE_PATH is not set
+    """
+    path = os.environ.get("GEMINI_STORE_PATH")
+    if not path:
+        return None
+    return ResponseStore(
+        path,
+        max_entries=int(os.environ.get("GEMINI_STORE_MAX_ENTRIES", 50000)),
+        ttl=float(os.environ.get("GEMINI_STORE_TTL", 7 * 24 * 3600))
+    )
@@ -0,0 +1,187 @@
+"""
+Request coalescing: concurrent identical calls share one execution
+"""
+import asyncio
+import contextvars
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.future = None
+        self.waiters = 1
+
+
+class SingleFlight:
+    """
+    While a call for a key is in flight, further callers with the same key
+    wait for it and receive its result (or exception) instead of starting
+    their own. Works for threads (do) and coroutines (do_async).
+
+    The shared call runs outside every caller's context (on the executor,
+    or as its own task), so no caller's deadline or request state decides
+    the outcome the others receive. Each caller, the one that started the
+    call included, gives up at its own timeout and leaves the call running
+    for the others. Checks that belong to one caller (e.g. charging its
+    budget) go in admit, run by the caller that starts the call before it
+    starts.
+    """
+
+    def __init__(self, timeout_error=TimeoutError, executor=None):
+        """
+        Args:
+            timeout_error (type): Exception raised to a caller whose wait
+                for an in-flight call timed out
+            executor (Executor): Runs the shared sync calls; without one
+                the first caller runs the call itself and waits until it
+                ends, whatever its timeout
+        """
+        self.timeout_error = timeout_error
+        self.executor = executor
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timed_out = 0
+
+    def _timed_out(self, timeout):
+        with self._lock:
+            self.timed_out += 1
+        return self.timeout_error(f"Gave up after {timeout:.2f}s waiting for the shared call")
+
+    def do(self, key, fn, timeout=None, admit=None):
+        """
+        Run fn once for all threads currently asking for key
+
+        Args:
+            key (str): Identity of the call
+            fn (callable): Work to run if no identical call is in flight
+            timeout (float): Seconds to wait for the result, or None to
+                wait until the call ends
+            admit (callable): Run by the caller about to start the call; if
+                it raises, no call is started and only that caller fails
+
+        Returns:
+            Result of fn
+
+        Raises:
+            timeout_error: If the wait for the call timed out
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                if admit is not None:
+                    admit()
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            if self.executor is None:
+                self._run(key, call, fn)
+            else:
+                try:
+                    call.future = self.executor.submit(self._run, key, call, fn)
+                except Exception as e:
+                    call.error = e
+                    self._finish(key, call)
+
+        if not call.event.wait(timeout):
+            self._leave(key, call)
+            raise self._timed_out(timeout)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            self._finish(key, call)
+
+    def _finish(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+
+    def _leave(self, key, call):
+        """A caller stopped waiting; the last one cancels the call if it has not started"""
+        with self._lock:
+            call.waiters -= 1
+            if call.waiters or call.future is None or not call.future.cancel():
+                return
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    async def do_async(self, key, coro_fn, timeout=None, admit=None):
+        """
+        Await coro_fn() once for all coroutines currently asking for key
+
+        The shared call runs as its own task, in an empty context, so a
+        cancelled (or timed out) caller does not cancel it for the others.
+
+        Args:
+            key (str): Identity of the call
+            coro_fn (callable): Returns the awaitable to run if none is in flight
+            timeout (float): Seconds to wait for the result, or None to wait
+                until the call ends
+            admit (callable): See do
+
+        Returns:
+            Result of the awaitable
+
+        Raises:
+            timeout_error: If the wait timed out
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                if admit is not None:
+                    admit()
+                task = self._tasks[key] = asyncio.get_running_loop().create_task(
+                    coro_fn(), context=contextvars.Context()
+                )
+                task.add_done_callback(lambda _: self._forget_task(key, task))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if task.done():
+                # The call itself raised TimeoutError
+                raise
+            raise self._timed_out(timeout)
+
+    def _forget_task(self, key, task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def stats(self):
+        """
+        Get coalescing counters
+
+        Returns:
+            dict: In-flight calls, upstream calls made and calls coalesced
+        """
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                "inFlight": len(self._calls) + len(self._tasks),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timedOut": self.timed_out,
+                "coalescedRate": round(self.coalesced / total, 4) if total else 0.0
+            }
@@ -0,0 +1,51 @@
+"""
+Pre-serialized JSON responses for endpoints whose payload never changes
+"""
+import gzip
+import hashlib
+import json
+
+from flask import Response
+
+
+class StaticPayload:
+    """
+    A JSON body serialized and gzipped once, served with an ETag
+
+    Clients that send If-None-Match get an empty 304, and clients that
+    accept gzip get the compressed body, so a request costs a header check
+    and a write of prebuilt bytes.
+    """
+
+    def __init__(self, payload, max_age=300):
+        """
+        Args:
+            payload: JSON-serializable response body
+            max_age (int): Seconds clients and proxies may reuse the response
+        """
+        self.body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.max_age = max_age
+
+    def response(self, request):
+        """
+        Build the response for a request
+
+        Args:
+            request: The current Flask request
+
+        Returns:
+            Response: 200 with the (possibly gzipped) body, or 304 if the
+            client's copy is current
+        """
+        gzipped = "gzip" in request.accept_encodings
+        response = Response(self.gzip_body if gzipped else self.body, mimetype="application/json")
+        if gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        # Each encoding is a separate representation, so it gets its own tag
+        response.set_etag(f"{self.etag}-gzip" if gzipped else self.etag)
+        return response.make_conditional(request)
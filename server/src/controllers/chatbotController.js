@@ -54,7 +54,7 @@ exports.getChatbotResponse = async (req, res, next) => {
     }
     
     // Get response from AI service
-    const response = await aiService.getChatbotResponse(query, context);
+    const response = await aiService.getChatbotResponse(query, context, userId);
     
     // Save the conversation to the database
     await saveConversation(userId, query, response.response);
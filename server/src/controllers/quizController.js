@@ -17,6 +17,22 @@ exports.getQuizQuestions = async (req, res, next) => {
   }
 };
 
+/**
+ * Store a travel persona analysis on the user's profile
+ */
+const savePersona = (userId, analysis) => db.collection('users').doc(userId).update({
+  travelPersona: analysis.primaryPersona,
+  secondaryPersona: analysis.secondaryPersona,
+  preferences: {
+    budgetSensitivity: analysis.budgetSensitivity,
+    interests: analysis.interests,
+    preferredActivities: analysis.preferredActivities,
+    travelPace: analysis.travelPace
+  },
+  quizCompleted: true,
+  quizCompletedAt: new Date().toISOString()
+});
+
 /**
  * Submit quiz responses
  */
@@ -31,22 +47,18 @@ exports.submitQuizResponses = async (req, res, next) => {
       });
     }
     
-    // Analyze responses
-    const analysis = await aiService.analyzeQuizResponses(responses);
+    // Analyze responses: the local persona now, the Gemini one later if it was queued
+    const { analysis, jobId } = await aiService.analyzeQuizResponses(responses, userId);
     
     // Update user profile with travel persona
-    await db.collection('users').doc(userId).update({
-      travelPersona: analysis.primaryPersona,
-      secondaryPersona: analysis.secondaryPersona,
-      preferences: {
-        budgetSensitivity: analysis.budgetSensitivity,
-        interests: analysis.interests,
-        preferredActivities: analysis.preferredActivities,
-        travelPace: analysis.travelPace
-      },
-      quizCompleted: true,
-      quizCompletedAt: new Date().toISOString()
-    });
+    await savePersona(userId, analysis);
+    
+    if (jobId) {
+      // Replace the local persona once the enrichment job finishes
+      aiService.waitForQuizAnalysis(jobId)
+        .then((enriched) => enriched && savePersona(userId, enriched))
+        .catch((error) => console.error('Error saving enriched quiz analysis:', error));
+    }
     
     return res.status(200).json({
       message: 'Quiz submitted successfully',
@@ -1,12 +1,34 @@
 const axios = require('axios');
 const config = require('../config/env');
 
-// Create an axios instance for the AI service
+const AI_SERVICE_TIMEOUT_MS = 10000;
+
+// How often, and for how long, a deferred quiz analysis job is polled
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_POLL_TIMEOUT_MS = 60000;
+
+const FALLBACK_ANALYSIS = {
+  primaryPersona: "Cultural Explorer",
+  secondaryPersona: "Foodie",
+  budgetSensitivity: "medium",
+  interests: ["sightseeing", "local cuisine"],
+  preferredActivities: ["visiting landmarks", "trying local food"],
+  travelPace: "moderate"
+};
+
+// Create an axios instance for the AI service. The AI service is told to
+// answer (with its fallback if need be) a little before we give up on it.
 const aiClient = axios.create({
   baseURL: config.AI_SERVICE_URL,
-  timeout: 10000
+  timeout: AI_SERVICE_TIMEOUT_MS,
+  headers: {
+    'X-Request-Timeout-Ms': String(AI_SERVICE_TIMEOUT_MS - 500)
+  }
 });
 
+// The AI service rate limits per end user; all our traffic comes from one address
+const userHeaders = (userId) => (userId ? { headers: { 'X-User-Id': userId } } : {});
+
 /**
  * Get quiz questions
  * @returns {Promise<Array>} - Quiz questions
@@ -23,43 +45,81 @@ const getQuizQuestions = async () => {
 
 /**
  * Analyze quiz responses
+ *
+ * Uses the AI service's deferred mode: the locally scored persona comes
+ * back at once, and the Gemini analysis (if one was queued) is a job to
+ * poll with waitForQuizAnalysis.
  * @param {Object} responses - User's quiz responses
- * @returns {Promise<Object>} - Analysis results
+ * @param {string} userId - User the analysis is for
+ * @returns {Promise<Object>} - { analysis, jobId } (jobId is null if nothing was queued)
  */
-const analyzeQuizResponses = async (responses) => {
+const analyzeQuizResponses = async (responses, userId = null) => {
   try {
     const response = await aiClient.post('/api/quiz/analyze', {
-      responses
-    });
+      responses,
+      async: true
+    }, userHeaders(userId));
     
-    return response.data.analysis;
+    return {
+      analysis: response.data.analysis,
+      jobId: response.data.jobId || null
+    };
   } catch (error) {
     console.error('Error analyzing quiz responses:', error);
     
     // Fallback analysis if the AI service fails
     return {
-      primaryPersona: "Cultural Explorer",
-      secondaryPersona: "Foodie",
-      budgetSensitivity: "medium",
-      interests: ["sightseeing", "local cuisine"],
-      preferredActivities: ["visiting landmarks", "trying local food"],
-      travelPace: "moderate"
+      analysis: { ...FALLBACK_ANALYSIS },
+      jobId: null
     };
   }
 };
 
+/**
+ * Wait for a deferred quiz analysis job to finish
+ * @param {string} jobId - Job id returned by analyzeQuizResponses
+ * @returns {Promise<Object|null>} - Gemini analysis, or null if the job failed, expired or took too long
+ */
+const waitForQuizAnalysis = async (jobId) => {
+  const giveUpAt = Date.now() + JOB_POLL_TIMEOUT_MS;
+  
+  while (Date.now() < giveUpAt) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    try {
+      const response = await aiClient.get(`/api/quiz/analyze/jobs/${encodeURIComponent(jobId)}`);
+      const { job } = response.data;
+      
+      if (job.status === 'done') {
+        return job.result.analysis;
+      }
+      if (job.status === 'failed') {
+        return null;
+      }
+    } catch (error) {
+      if (error.response && error.response.status === 404) {
+        // Expired or never stored: the local persona stays
+        return null;
+      }
+      console.error('Error polling quiz analysis job:', error.message);
+    }
+  }
+  
+  return null;
+};
+
 /**
  * Get chatbot response
  * @param {string} query - User's question
  * @param {Object} context - Additional context
+ * @param {string} userId - User asking
  * @returns {Promise<Object>} - Chatbot response
  */
-const getChatbotResponse = async (query, context = null) => {
+const getChatbotResponse = async (query, context = null, userId = null) => {
   try {
     const response = await aiClient.post('/api/chatbot/ask', {
       query,
       context
-    });
+    }, userHeaders(userId));
     
     return response.data;
   } catch (error) {
@@ -78,8 +138,41 @@ const getChatbotResponse = async (query, context = null) => {
   }
 };
 
+/**
+ * Get chatbot responses for several questions sharing one context
+ * @param {Array<string>} queries - User's questions
+ * @param {Object} context - Additional context shared by all questions
+ * @param {string} userId - User asking
+ * @returns {Promise<Array>} - One chatbot response per question, in order
+ */
+const getChatbotResponses = async (queries, context = null, userId = null) => {
+  try {
+    const response = await aiClient.post('/api/chatbot/ask/batch', {
+      queries,
+      context
+    }, userHeaders(userId));
+    
+    return response.data.results;
+  } catch (error) {
+    console.error('Error getting chatbot responses:', error);
+    
+    // Fallback response for every question if the AI service fails
+    return queries.map(() => ({
+      success: false,
+      response: "I'm having trouble connecting to my knowledge base right now. Please try again later.",
+      suggestions: [
+        "What are popular destinations in India?",
+        "How can I plan a budget trip?",
+        "What should I pack for my trip?"
+      ]
+    }));
+  }
+};
+
 module.exports = {
   getQuizQuestions,
   analyzeQuizResponses,
-  getChatbotResponse
+  waitForQuizAnalysis,
+  getChatbotResponse,
+  getChatbotResponses
 };
\ No newline at end of file